@@ -1,34 +1,85 @@
-from fastapi import APIRouter, Depends, status, WebSocket
+from fastapi import APIRouter, Depends, Query, Request, Response, status, WebSocket
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Dict
+from datetime import date
+from typing import List, Optional
 from uuid import UUID
 from app.api.deps import get_db
-from app.models.user import User
-from app.schemas.chat_session import ChatSessionOut
+from app.core.config import settings
+from app.schemas.user import CurrentUser
+from app.schemas.chat_session import ChatSessionOut, SearchPage
 from app.schemas.message import MessageCreate, MessageOut
 from app.core.security import get_current_user
-from app.crud.chat_session import create_session, get_sessions, get_one_session, get_all_messages, create_messages, websocket_chat
+from app.crud.archive import export_archive, import_archive
+from app.crud.chat_session import create_session, get_sessions, get_one_session, get_messages_page, stream_messages, create_messages, stream_message_events, search_conversations, websocket_chat
 from sqlalchemy.orm import Session
 
 router = APIRouter()
 
 @router.post("/create-chat-session", response_model=ChatSessionOut, status_code=status.HTTP_201_CREATED)
 async def create_chat_session(
-                        current_user: User = Depends(get_current_user),
+                        current_user: CurrentUser = Depends(get_current_user),
                         db: Session = Depends(get_db)):
     """Create a new chat section"""
     return await create_session(current_user, db)
 
 @router.get("/get-chat-sessions", response_model=List[ChatSessionOut], status_code=status.HTTP_200_OK)
 async def get_chat_sessions(
+                            request: Request,
+                            response: Response,
+                            limit: Optional[int] = Query(None, ge=1, le=100, description="Page size; without it and without a cursor every session is returned"),
+                            before: Optional[str] = Query(None, description="Cursor from `X-Next-Before`"),
+                            include_summary: bool = False,
                             db: Session = Depends(get_db),
-                            current_user : User = Depends(get_current_user)):
-    """Retrieve all sessions belong to the current user"""
-    return await get_sessions(db, current_user)
+                            current_user : CurrentUser = Depends(get_current_user)):
+    """
+    Retrieve the sessions belong to the current user, most recently active first.
+
+    Pagination is opt-in: with `limit` (or `before`) one page is returned, and
+    the cursor of the next one comes back in `X-Next-Before` and as `Link` rel="next".
+    """
+    paginate = limit is not None or before is not None
+    page = await get_sessions(db, current_user, (limit or 20) if paginate else None, before, include_summary)
+    if page.next_before:
+        response.headers["X-Next-Before"] = page.next_before
+        next_url = request.url.include_query_params(before=page.next_before)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return page.items
+
+@router.get("/search", response_model=SearchPage, status_code=status.HTTP_200_OK)
+async def search_chat_sessions(
+                            q: str = Query(..., min_length=1, max_length=500, description="Words, \"phrases\", OR and -excluded terms"),
+                            limit: int = Query(20, ge=1, le=100),
+                            before: Optional[str] = Query(None, description="Cursor from `next_before`"),
+                            db: Session = Depends(get_db),
+                            current_user : CurrentUser = Depends(get_current_user)):
+    """Full-text search across the messages and session summaries of the current user"""
+    return await search_conversations(db, current_user, q, limit, before)
+
+@router.get("/export")
+async def export_chat_history(current_user : CurrentUser = Depends(get_current_user)):
+    """Download every session and message of the current user as gzip-compressed NDJSON"""
+    return StreamingResponse(
+        await export_archive(current_user),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="chat-export-{date.today()}.ndjson.gz"'}
+    )
+
+@router.post("/import", status_code=status.HTTP_200_OK)
+async def import_chat_history(
+                            request: Request,
+                            batch_size: int = Query(5000, ge=100, le=50000),
+                            db: Session = Depends(get_db),
+                            current_user : CurrentUser = Depends(get_current_user)):
+    """
+    Import an archive from `/export` (request body, gzip or plain NDJSON) into the
+    current user's account. Sessions and messages that already exist are skipped.
+    """
+    return await import_archive(db, current_user, request.stream(), batch_size)
 
 @router.get("/{session_id}", response_model=ChatSessionOut, status_code=status.HTTP_200_OK)
 async def get_chat_session(session_id : UUID,
-                            current_user : User = Depends(get_current_user),
+                            current_user : CurrentUser = Depends(get_current_user),
                             db : Session = Depends(get_db)):
     """Retrieve the exact session you want to find of the current user"""
     return await get_one_session(session_id, current_user, db)
@@ -37,28 +88,71 @@ async def get_chat_session(session_id : UUID,
 async def send_message_and_get_bot_response(
     session_id: UUID,
     message: MessageCreate,
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-   return await create_messages(session_id, message, current_user, db)
+    """
+    Send a message and get the bot reply. With `Accept: text/event-stream` the
+    reply is streamed as Server-Sent Events (see `stream_message_events`).
+    """
+    if "text/event-stream" in request.headers.get("accept", ""):
+        events = await stream_message_events(session_id, message, current_user, db, request)
+        return StreamingResponse(
+            events,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    profile = settings.PROFILE_ON_REQUEST and (
+        request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+    )
+    return await create_messages(session_id, message, current_user, db, profile=profile)
 
 @router.get("/{session_id}/messages", response_model=List[MessageOut])
 async def get_messages_for_session(
     session_id: UUID,
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Page size; without it and without a cursor every message is returned"),
+    before: Optional[str] = Query(None, description="Cursor from `X-Next-Before`: load older messages"),
+    after: Optional[str] = Query(None, description="Cursor from `X-Next-After`: load newer messages"),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Retrieves all messages for a specific chat session.
+    Retrieves the messages of a specific chat session, oldest first.
     Ensures the session belongs to the current user for authorization.
+
+    Pagination is opt-in: with `limit` (or a cursor) only the most recent page is
+    returned, and the cursors of the neighbouring pages come back in the
+    `X-Next-Before` / `X-Next-After` headers and as `Link` rel="prev" / rel="next".
     """
-    return await get_all_messages(session_id, current_user, db)
+    paginate = limit is not None or before is not None or after is not None
+    page = await get_messages_page(session_id, current_user, db, (limit or 50) if paginate else None, before, after)
+    links = []
+    base_url = request.url.remove_query_params(["before", "after"])
+    if page.next_before:
+        response.headers["X-Next-Before"] = page.next_before
+        links.append(f'<{base_url.include_query_params(before=page.next_before)}>; rel="prev"')
+    if page.next_after:
+        response.headers["X-Next-After"] = page.next_after
+        links.append(f'<{base_url.include_query_params(after=page.next_after)}>; rel="next"')
+    if links:
+        response.headers["Link"] = ", ".join(links)
+    return page.items
 
+@router.get("/{session_id}/messages/stream")
+async def stream_messages_for_session(
+    session_id: UUID,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Streams every message of the session as NDJSON (one MessageOut per line), oldest first"""
+    return StreamingResponse(await stream_messages(session_id, current_user, db), media_type="application/x-ndjson")
 
 
-#websocket endpoint
-active_connections: Dict[UUID, List[WebSocket]] = {}
 
+#websocket endpoint
 @router.websocket("/ws/{session_id}/")
 async def websocket_endpoint(websocket: WebSocket, session_id: UUID):
     return await websocket_chat(websocket,session_id)
\ No newline at end of file
@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Query, status
+from app.chatbot.memory_cache import memory_cache
+from app.chatbot.summarizer import summarization_worker
+from app.chatbot.response_cache import response_cache
+from app.chatbot.scheduler import llm_scheduler
+from app.chatbot.llm_management import context_builder
+from app.core.auth_cache import auth_user_cache
+from app.core.hashing import password_hasher
+from app.core.rate_limit import rate_limiter
+from app.core.tracing import profiler, ring_buffer, tracer
+from app.db.session import engine
+from app.db.stats import pool_stats, query_stats
+from app.db.write_behind import message_writer
+from app.realtime.manager import connection_manager
+
+router = APIRouter()
+
+@router.get("/memory-cache-stats", status_code=status.HTTP_200_OK)
+async def get_memory_cache_stats():
+    """Hit/miss/eviction counters of the in-process session memory cache"""
+    return memory_cache.stats()
+
+@router.get("/summarizer-stats", status_code=status.HTTP_200_OK)
+async def get_summarizer_stats():
+    """Queue depth and job latency of the background summarization worker"""
+    return summarization_worker.stats()
+
+@router.get("/auth-cache-stats", status_code=status.HTTP_200_OK)
+async def get_auth_cache_stats():
+    """Hit/miss counters of the access token -> user cache"""
+    return auth_user_cache.stats()
+
+@router.get("/password-hasher-stats", status_code=status.HTTP_200_OK)
+async def get_password_hasher_stats():
+    """Queueing and run time of the bcrypt executor"""
+    return password_hasher.stats()
+
+@router.get("/db-stats", status_code=status.HTTP_200_OK)
+async def get_db_stats():
+    """Connection pool usage, checkout wait times and per-statement timing histograms"""
+    return {
+        "pool": pool_stats(engine),
+        "queries": query_stats.snapshot(),
+    }
+
+@router.get("/ws-stats", status_code=status.HTTP_200_OK)
+async def get_ws_stats():
+    """Websocket sessions and connections held by this worker"""
+    return connection_manager.stats()
+
+@router.get("/response-cache-stats", status_code=status.HTTP_200_OK)
+async def get_response_cache_stats():
+    """Hit rate and saved LLM latency of the response cache"""
+    return response_cache.stats()
+
+@router.get("/llm-scheduler-stats", status_code=status.HTTP_200_OK)
+async def get_llm_scheduler_stats():
+    """In-flight LLM calls, token budget and queue depth/wait time per priority class"""
+    return llm_scheduler.stats()
+
+@router.get("/context-stats", status_code=status.HTTP_200_OK)
+async def get_context_stats():
+    """Prompt tokens per turn and how often history had to be cut to fit CONTEXT_MAX_PROMPT_TOKENS"""
+    return context_builder.stats()
+
+@router.get("/write-behind-stats", status_code=status.HTTP_200_OK)
+async def get_write_behind_stats():
+    """Queued turns, batch sizes and flush latency of the write-behind persister"""
+    return message_writer.stats()
+
+@router.get("/rate-limit-stats", status_code=status.HTTP_200_OK)
+async def get_rate_limit_stats():
+    """Checks and rejections of the rate limiter and LLM tokens charged to daily quotas"""
+    return rate_limiter.stats()
+
+@router.get("/traces", status_code=status.HTTP_200_OK)
+async def get_traces(limit: int = Query(20, ge=1, le=200), min_duration_ms: float = 0.0):
+    """Most recent sampled turn traces (newest first) and the state of the turn profiler"""
+    return {
+        "sample_rate": tracer.sample_rate,
+        "traces_recorded": tracer.traces,
+        "profiler": profiler.stats(),
+        "traces": ring_buffer.recent(limit, min_duration_ms),
+    }
@@ -0,0 +1,61 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.chatbot.memory_cache import memory_cache
+from app.chatbot.response_cache import response_cache
+from app.chatbot.scheduler import PRIORITY_NAMES, llm_scheduler
+from app.chatbot.summarizer import summarization_worker
+from app.core.auth_cache import auth_user_cache
+from app.core.metrics import metrics
+from app.db.session import engine
+from app.db.stats import pool_stats
+from app.db.write_behind import message_writer
+from app.realtime.manager import connection_manager
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _caches():
+    caches = {"memory": memory_cache.stats(), "response": response_cache.stats(), "auth": auth_user_cache.stats()}
+    yield ("cache_hits_total", "counter", "Cache lookups that found an entry",
+           [({"cache": name}, stats["hits"]) for name, stats in caches.items()])
+    yield ("cache_misses_total", "counter", "Cache lookups that did not find an entry",
+           [({"cache": name}, stats["misses"]) for name, stats in caches.items()])
+    yield ("cache_hit_ratio", "gauge", "Hits / lookups since start",
+           [({"cache": name}, stats["hit_rate"]) for name, stats in caches.items()])
+
+
+def _websockets():
+    stats = connection_manager.stats()
+    yield ("ws_connections", "gauge", "Open websocket connections on this worker", [({}, stats["connections"])])
+    yield ("ws_dropped_frames_total", "counter", "Frames dropped for slow websocket consumers", [({}, stats["dropped_frames"])])
+
+
+def _queues():
+    scheduler = llm_scheduler.stats()
+    yield ("llm_in_flight", "gauge", "LLM calls running", [({}, scheduler["in_flight"])])
+    yield ("llm_queue_depth", "gauge", "LLM calls waiting for a slot",
+           [({"priority": name}, scheduler["classes"][name]["queue_depth"]) for name in PRIORITY_NAMES.values()])
+    yield ("llm_rate_limited_total", "counter", "429 responses from the LLM provider", [({}, scheduler["rate_limited"])])
+    yield ("summarization_queue_depth", "gauge", "Sessions waiting for summarization",
+           [({}, summarization_worker.stats()["queue_depth"])])
+    yield ("write_behind_queued_turns", "gauge", "Chat turns waiting to be committed",
+           [({}, message_writer.stats()["queued_turns"])])
+
+
+def _db_pool():
+    stats = pool_stats(engine)
+    if "checked_out" in stats:
+        yield ("db_pool_checked_out", "gauge", "Connections in use", [({}, stats["checked_out"])])
+        yield ("db_pool_idle", "gauge", "Idle pooled connections", [({}, stats["idle"])])
+
+
+for collector in (_caches, _websockets, _queues, _db_pool):
+    metrics.register_collector(collector)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -14,7 +14,8 @@ async def create_user_api(user_in: UserCreate, db: Session = Depends(get_db)):
 
 from app.schemas.user import LoginRequest, TokenResponse
 from app.models.user import User
-from app.core.security import verify_password, create_access_token, create_refresh_token
+from app.core.security import create_access_token, create_refresh_token
+from app.core.hashing import password_hasher
 from sqlalchemy.future import select
 
 
@@ -24,11 +25,19 @@ async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == request.email))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(request.password, user.hash_password):
+    valid = False
+    if user:
+        valid, new_hash = await password_hasher.verify_and_update(request.password, user.hash_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
         )
+
+    # stored hash uses outdated bcrypt settings: upgrade it transparently
+    if new_hash is not None:
+        user.hash_password = new_hash
+        await db.commit()
     
     token = create_access_token(data={"sub": str(user.id)})
     refresh = create_refresh_token(data={"sub": str(user.id)})
@@ -0,0 +1,72 @@
+from importlib import import_module
+from typing import TYPE_CHECKING, Callable, Dict, Sequence, Tuple
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+# Factories import their SDK when called, so importing this module (and
+# everything that imports it) stays cheap; see app.chatbot.llm_management.get_llm
+
+
+def _gemini() -> "BaseChatModel":
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    if not settings.GEMINI_API_KEY:
+        raise ValueError(
+            "Google API Key is not set. Please set the GEMINI_API_KEY "
+            "environment variable or use LLM_BACKEND=fake."
+        )
+    return ChatGoogleGenerativeAI(
+        model=settings.LLM_MODEL,
+        google_api_key=settings.GEMINI_API_KEY,
+        temperature=settings.LLM_TEMPERATURE,
+        model_kwargs={"streaming": True},
+    )
+
+
+def _fake() -> "BaseChatModel":
+    from app.chatbot.fake_llm import FakeStreamingChatModel
+
+    return FakeStreamingChatModel(
+        ttft_ms=settings.FAKE_LLM_TTFT_MS,
+        tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+        reply_tokens=settings.FAKE_LLM_REPLY_TOKENS,
+        failure_rate=settings.FAKE_LLM_FAILURE_RATE,
+    )
+
+
+# name -> (factory, modules the factory imports)
+_backends: Dict[str, Tuple[Callable[[], "BaseChatModel"], Tuple[str, ...]]] = {
+    "gemini": (_gemini, ("langchain_google_genai",)),
+    "fake": (_fake, ("app.chatbot.fake_llm",)),
+}
+
+
+def register_llm_backend(name: str, factory: Callable[[], "BaseChatModel"], modules: Sequence[str] = ()):
+    """`modules` are imported by `preload_llm_backend()`; list whatever `factory` imports lazily"""
+    _backends[name] = (factory, tuple(modules))
+
+
+def _backend(name: str = None) -> Tuple[Callable[[], "BaseChatModel"], Tuple[str, ...]]:
+    name = name or settings.LLM_BACKEND
+    if name not in _backends:
+        raise ValueError(f"Unknown LLM_BACKEND '{name}', expected one of {sorted(_backends)}")
+    return _backends[name]
+
+
+def create_llm(name: str = None) -> "BaseChatModel":
+    factory, _ = _backend(name)
+    return factory()
+
+
+def preload_llm_backend(name: str = None):
+    """
+    Import the backend's SDK without creating a client. Safe before fork
+    (gunicorn --preload): workers share the imported modules, while clients,
+    which may hold gRPC channels that do not survive a fork, are created
+    in each worker.
+    """
+    _, modules = _backend(name)
+    for module in modules:
+        import_module(module)
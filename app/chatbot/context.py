@@ -0,0 +1,163 @@
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from cachetools import LRUCache
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from app.chatbot.memory import SummaryHistory
+from app.chatbot.tokens import TokenCounter, get_token_counter
+from app.core.metrics import Histogram
+
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+SUMMARY_HEADER = "Tóm tắt cuộc hội thoại trước đó:\n"
+
+
+@dataclass
+class PromptContext:
+    """Everything sent to the model for one turn, with its token accounting"""
+    summary: List[BaseMessage]
+    history: List[BaseMessage]
+    user_input: str
+    system_tokens: int
+    summary_tokens: int
+    history_tokens: int
+    input_tokens: int
+    dropped_messages: int = 0
+    # summary lines left out because even the summary did not fit
+    dropped_summary_lines: int = 0
+    _cache_text: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.system_tokens + self.summary_tokens + self.history_tokens + self.input_tokens
+
+    def cache_text(self) -> str:
+        """Summary and history as one string, for response cache keys"""
+        if self._cache_text is None:
+            self._cache_text = "\n".join(
+                f"{'User' if isinstance(m, HumanMessage) else 'AI' if isinstance(m, AIMessage) else 'Summary'}: {m.content}"
+                for m in self.summary + self.history
+            )
+        return self._cache_text
+
+    def token_report(self) -> dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "system_tokens": self.system_tokens,
+            "summary_tokens": self.summary_tokens,
+            "history_tokens": self.history_tokens,
+            "input_tokens": self.input_tokens,
+            "history_messages": len(self.history),
+            "dropped_messages": self.dropped_messages,
+        }
+
+
+class ContextBuilder:
+    """
+    Assembles the prompt of a turn within `max_prompt_tokens`:
+
+        system prompt -> summary (SystemMessage) -> recent turns -> user input
+
+    The system prompt and the user input are always sent. The summary comes
+    next; if it does not fit, its oldest lines are dropped. The rest of the
+    budget goes to the chat history, newest first: older messages are dropped
+    as soon as one does not fit, and a kept history never starts with a bot
+    reply. Message token counts come from SummaryHistory, which computes them
+    once per message. The summary message and its size are cached by summary
+    text, so neither is rebuilt while the summary does not change.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        max_prompt_tokens: int,
+        token_counter: Optional[TokenCounter] = None,
+        summary_cache_size: int = 1024
+    ):
+        self.system_prompt = system_prompt
+        self.max_prompt_tokens = max_prompt_tokens
+        self.token_counter = token_counter or get_token_counter()
+        self.system_tokens = self.token_counter.count(system_prompt)
+        self._summaries: LRUCache = LRUCache(maxsize=summary_cache_size)
+        self.turns = 0
+        self.truncated_turns = 0
+        self.dropped_messages = 0
+        # per builder, not registered for /metrics
+        self.prompt_tokens = Histogram("prompt_tokens", "Prompt tokens per turn", buckets=TOKEN_BUCKETS)
+
+    def _summary_segment(self, summary: str, budget: int) -> Tuple[List[BaseMessage], int, int]:
+        """(messages, tokens, dropped lines) of the summary within `budget`"""
+        summary = summary.strip()
+        if not summary:
+            return [], 0, 0
+        segment = self._summaries.get(summary)
+        if segment is None:
+            lines = [line for line in summary.split("\n") if line.strip()]
+            counts = [self.token_counter.count(line) for line in lines]
+            tokens = self.token_counter.count(SUMMARY_HEADER) + sum(counts)
+            message = SystemMessage(content=SUMMARY_HEADER + "\n".join(lines))
+            segment = self._summaries[summary] = (lines, counts, tokens, message)
+        lines, counts, tokens, message = segment
+        if tokens <= budget:
+            return [message], tokens, 0
+
+        # keep the newest lines that fit
+        start = len(lines)
+        kept_tokens = tokens - sum(counts)
+        while start > 0 and kept_tokens + counts[start - 1] <= budget:
+            start -= 1
+            kept_tokens += counts[start]
+        if start == len(lines):
+            return [], 0, len(lines)
+        return [SystemMessage(content=SUMMARY_HEADER + "\n".join(lines[start:]))], kept_tokens, start
+
+    def build(self, memory: SummaryHistory, user_input: str) -> PromptContext:
+        input_tokens = self.token_counter.count(user_input)
+        remaining = self.max_prompt_tokens - self.system_tokens - input_tokens
+
+        summary, summary_tokens, dropped_lines = self._summary_segment(memory.summary, max(remaining, 0))
+        remaining -= summary_tokens
+
+        messages = memory.chat_history
+        counts = memory.message_token_counts()
+        start = len(messages)
+        history_tokens = 0
+        while start > 0 and history_tokens + counts[start - 1] <= remaining:
+            start -= 1
+            history_tokens += counts[start]
+        while start < len(messages) and not isinstance(messages[start], HumanMessage):
+            history_tokens -= counts[start]
+            start += 1
+
+        context = PromptContext(
+            summary=summary,
+            history=messages[start:],
+            user_input=user_input,
+            system_tokens=self.system_tokens,
+            summary_tokens=summary_tokens,
+            history_tokens=history_tokens,
+            input_tokens=input_tokens,
+            dropped_messages=start,
+            dropped_summary_lines=dropped_lines,
+        )
+        self.turns += 1
+        if start or dropped_lines:
+            self.truncated_turns += 1
+        self.dropped_messages += start
+        self.prompt_tokens.observe(context.prompt_tokens)
+        return context
+
+    def stats(self) -> dict:
+        snapshot = self.prompt_tokens.snapshot()
+        return {
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "turns": self.turns,
+            "truncated_turns": self.truncated_turns,
+            "dropped_messages": self.dropped_messages,
+            "cached_summaries": len(self._summaries),
+            "prompt_tokens": {
+                "count": snapshot["count"],
+                "avg": snapshot["avg"],
+                "max": snapshot["max"],
+                "buckets": snapshot["buckets"],
+            },
+        }
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORDS = (
+    "moon tune soon june light bright night flight rain plain lane again "
+    "sky high fly why day way stay play sea free tree be"
+).split()
+
+
+class FakeLLMError(RuntimeError):
+    """Injected failure of the fake backend (FAKE_LLM_FAILURE_RATE)"""
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Local stand-in for the real chat model, for load tests and offline development.
+
+    Waits `ttft_ms` before the first token, then streams `reply_tokens` words at
+    `tokens_per_second`. The reply is derived from a hash of the prompt, so the
+    same prompt always gets the same reply. A `failure_rate` share of calls
+    raise FakeLLMError before the first token.
+    """
+
+    model: str = "fake-streaming"
+    temperature: float = 0.0
+    ttft_ms: float = 300
+    tokens_per_second: float = 50
+    reply_tokens: int = 60
+    failure_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "ttft_ms": self.ttft_ms,
+            "tokens_per_second": self.tokens_per_second,
+            "reply_tokens": self.reply_tokens,
+        }
+
+    def _reply_tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        seed = int.from_bytes(hashlib.sha256(prompt.encode()).digest()[:8], "big")
+        rng = random.Random(seed)
+        words = [rng.choice(_WORDS) for _ in range(self.reply_tokens)]
+        return [words[0]] + [" " + word for word in words[1:]]
+
+    def _should_fail(self) -> bool:
+        return self.failure_rate > 0 and random.random() < self.failure_rate
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+
+    def get_num_tokens(self, text: str) -> int:
+        return len(text.split())
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.ttft_ms / 1000)
+        if self._should_fail():
+            raise FakeLLMError("fake backend failure")
+        for i, token in enumerate(self._reply_tokens(messages)):
+            if i:
+                time.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.ttft_ms / 1000)
+        if self._should_fail():
+            raise FakeLLMError("fake backend failure")
+        for i, token in enumerate(self._reply_tokens(messages)):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        chunks = [chunk.message.content async for chunk in self._astream(messages, stop, run_manager)]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(chunks)))])
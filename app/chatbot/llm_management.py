@@ -1,63 +1,177 @@
+import asyncio
+import threading
+import time
 from app.core.config import settings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from typing import List
-from langchain_core.prompts import ChatPromptTemplate
-
-prompt_template = ChatPromptTemplate.from_messages([
-    ("system", "You are a helpful assistant who does not talk much but keeps rhyming your words"),
-    ("human", "{history}"),
-    ("human", "{user_input}")
-])
-
-llm = ChatGoogleGenerativeAI(
-    model="models/gemini-1.5-flash",
-    google_api_key=settings.GEMINI_API_KEY, # Use the key from settings
-    temperature=0.7,
-    model_kwargs={"streaming": True},
+from langchain_core.messages import AIMessageChunk
+from typing import TYPE_CHECKING, List, Optional
+from app.chatbot.tokens import ModelTokenCounter, RegexTokenCounter, register_token_counter
+from app.chatbot.response_cache import response_cache
+from app.chatbot.backends import create_llm, preload_llm_backend
+from app.chatbot.scheduler import INTERACTIVE, is_rate_limited, llm_scheduler
+from app.chatbot.context import ContextBuilder, PromptContext
+from app.core.metrics import llm_completion_tokens, llm_prompt_tokens, llm_time_to_first_token, llm_tokens_per_second
+from app.core.rate_limit import rate_limiter
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.runnables import Runnable
+
+SYSTEM_PROMPT = "You are a helpful assistant who does not talk much but keeps rhyming your words"
+
+# Model and chain are built on first use (or by `warm_up()` in the lifespan), not at
+# import: routes that never talk to the model must not pay for the provider SDK.
+_llm: Optional["BaseChatModel"] = None
+_chain: Optional["Runnable"] = None
+# get_llm() may race with warm_up() running in a thread
+_build_lock = threading.Lock()
+
+
+def _build_prompt_template():
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+    return ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        MessagesPlaceholder("summary", optional=True),
+        MessagesPlaceholder("history"),
+        ("human", "{user_input}")
+    ])
+
+
+def get_llm() -> "BaseChatModel":
+    """Chat model of LLM_BACKEND (see app.chatbot.backends), created once per process"""
+    global _llm
+    if _llm is None:
+        with _build_lock:
+            if _llm is None:
+                _llm = create_llm()
+    return _llm
+
+
+def get_chain() -> "Runnable":
+    """prompt template | chat model (LCEL)"""
+    global _chain
+    if _chain is None:
+        llm = get_llm()
+        with _build_lock:
+            if _chain is None:
+                _chain = _build_prompt_template() | llm
+    return _chain
+
+
+async def aget_llm() -> "BaseChatModel":
+    """`get_llm()` for async code: the first build runs in a thread instead of blocking the event loop"""
+    if _llm is None or _chain is None:
+        await asyncio.to_thread(get_chain)
+    return _llm
+
+
+def warm_up():
+    """Build the model and the chain now (blocking: imports the SDK)"""
+    get_chain()
+
+
+def preload():
+    """Import the LLM backend and LCEL modules without creating a client; safe before fork"""
+    preload_llm_backend()
+    _build_prompt_template()
+
+
+# exact token counts from the model's tokenizer (remote for gemini): set TOKEN_COUNTER=gemini
+register_token_counter("gemini", lambda: ModelTokenCounter(get_llm()))
+
+# builds the `summary`/`history` messages of each turn within CONTEXT_MAX_PROMPT_TOKENS
+context_builder = ContextBuilder(
+    SYSTEM_PROMPT,
+    max_prompt_tokens=settings.CONTEXT_MAX_PROMPT_TOKENS,
+    summary_cache_size=settings.MEMORY_CACHE_MAX_SESSIONS
 )
 
-##LCEL
-chain = prompt_template | llm
+# local estimate of reply sizes for the scheduler's token budget, never a remote call
+_budget_counter = RegexTokenCounter()
 
-async def get_llm_response(history: str, user_input: str) :
+async def get_llm_response(context: PromptContext, use_cache: bool = True, user_id: Optional[str] = None):
     """
    
     Tương tác với Mô hình Ngôn ngữ Lớn (LLM) để nhận phản hồi.
 
     Args:
-        prompt_messages: Danh sách các đối tượng BaseMessage của LangChain 
-                     (HumanMessage, AIMessage) đại diện cho lịch sử hội thoại 
-                     và lời nhắc hiện tại.
+        context: Prompt của lượt hội thoại (tóm tắt, lịch sử gần đây và tin nhắn
+            hiện tại của người dùng) do `context_builder.build()` tạo ra.
+        use_cache: Cho phép dùng `response_cache` (đặt False để luôn gọi LLM).
+        user_id: Người gửi, để `llm_scheduler` xếp hàng công bằng giữa các user
+            và để trừ số token thực tế vào quota hằng ngày của user (`rate_limiter`).
+
+    Yields:
+        Các AIMessageChunk của phản hồi. Khi trúng cache, phản hồi đã lưu
+        được phát lại theo từng chunk như một stream thật.
 
-    Returns:
-        Chuỗi nội dung phản hồi của bot đã được nối lại.
+    Raises:
+        LLMQueueTimeout: Không có slot LLM trong LLM_QUEUE_TIMEOUT_SECONDS.
 
 
     """
-    if not settings.GEMINI_API_KEY:
-        raise ValueError(
-            "Google API Key is not set. Please set the GOOGLE_API_KEY "
-            "environment variable or update it in core/config.py."
+    requested_at = time.perf_counter()
+    llm = await aget_llm()
+    cache_key = None
+    if use_cache:
+        cache_key = response_cache.key_for(
+            context.cache_text(), context.user_input,
+            model=llm.model, temperature=llm.temperature, system=SYSTEM_PROMPT
         )
-    
-
-    # full_response_content = ""
-    # try:
-        # # Stream the response from the LLM
-        # stream = llm.stream(prompt_messages)
-        # for chunk in stream:
-        #     full_response_content += chunk.content
-
-    async for chunk in chain.astream({
-        "history" : history,
-        "user_input" : user_input
-    }):
-
-        yield chunk
-    # except Exception as e:
-    #     # Log the error and re-raise or handle appropriately
-    #     print(f"Error calling LLM: {e}")
-    #     raise
-
-    # return full_response_content
+    if cache_key:
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            llm_time_to_first_token.observe(time.perf_counter() - requested_at, cached="true")
+            for text in cached.chunks:
+                yield AIMessageChunk(content=text)
+                await asyncio.sleep(0)
+            return
+
+    chunks: List[str] = []
+    first_chunk_at: Optional[float] = None
+    completion_tokens: Optional[int] = None
+    try:
+        async with llm_scheduler.slot(
+            user_id or "anonymous", INTERACTIVE, context.prompt_tokens + settings.LLM_RESERVED_OUTPUT_TOKENS
+        ) as grant:
+            started_at = time.perf_counter()
+            attempt = 0
+            while True:
+                try:
+                    async for chunk in get_chain().astream({
+                        "summary" : context.summary,
+                        "history" : context.history,
+                        "user_input" : context.user_input
+                    }):
+                        if first_chunk_at is None:
+                            first_chunk_at = time.perf_counter()
+                            # queue wait included: that is what the user waits for
+                            llm_time_to_first_token.observe(first_chunk_at - requested_at, cached="false")
+                        chunks.append(chunk.content)
+                        yield chunk
+                    break
+                except Exception as e:
+                    # a reply that already started streaming cannot be retried transparently
+                    if chunks or attempt >= llm_scheduler.max_retries or not is_rate_limited(e):
+                        raise
+                    await asyncio.sleep(llm_scheduler.on_rate_limited(attempt))
+                    attempt += 1
+            completion_tokens = _budget_counter.count("".join(chunks))
+            grant.charge(context.prompt_tokens + completion_tokens)
+    finally:
+        # the daily quota is charged even for a reply the consumer stopped reading
+        if user_id and chunks:
+            if completion_tokens is None:
+                completion_tokens = _budget_counter.count("".join(chunks))
+            await rate_limiter.charge_tokens(user_id, context.prompt_tokens + completion_tokens)
+
+    llm_prompt_tokens.inc(context.prompt_tokens)
+    llm_completion_tokens.inc(completion_tokens)
+    if first_chunk_at is not None and len(chunks) > 1:
+        streaming_time = time.perf_counter() - first_chunk_at
+        if streaming_time > 0:
+            llm_tokens_per_second.observe(completion_tokens / streaming_time)
+
+    # only complete replies are cached; a consumer that stops early never gets here
+    if cache_key:
+        await response_cache.set(cache_key, chunks, time.perf_counter() - started_at)
@@ -1,49 +1,152 @@
 
-from langchain_core.language_models import BaseChatModel
+import asyncio
+import logging
+import time
+import weakref
 from fastapi import HTTPException, status
 from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
-from typing import List, Tuple
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
 from uuid import UUID
-from sqlalchemy import  select
+from datetime import datetime
+from sqlalchemy import  select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 from app.models.chat_session import ChatSession
-from sqlalchemy.orm import relationship, selectinload
+from app.models.message import Message
+from app.chatbot.memory_cache import memory_cache
+from app.db.write_behind import message_writer
+from app.chatbot.tokens import TokenCounter, get_token_counter, message_text
+from app.core.config import settings
+from app.core.metrics import memory_load_duration
 load_dotenv()
 
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+logger = logging.getLogger(__name__)
+
+# shape of ChatSession.summary:
+#   {"version": 2, "segments": [{"level", "from_n", "to_n", "text", "tokens"}, ...]}
+# level 0 is one summarization pass (n = from_n = to_n); higher levels roll up
+# passes from_n..to_n. Pre-0005 rows are {"text": "..."}.
+SUMMARY_FORMAT_VERSION = 2
+
+
+def _segment_line(segment: dict) -> str:
+    text = " ".join(segment["text"].split())
+    if segment["from_n"] == segment["to_n"]:
+        return f"📝 [Tóm tắt lần {segment['to_n']}]: {text}"
+    return f"📚 [Tóm tắt lần {segment['from_n']}-{segment['to_n']}]: {text}"
+
 
 #store history messages and summary
 class SummaryHistory:
     def __init__(
         self,
-        llm: BaseChatModel,
-        max_token_limit: int = 100,
-        initial_summary: str = "",
+        llm: "BaseChatModel",
+        max_token_limit: int = settings.MEMORY_MAX_TOKEN_LIMIT,
+        initial_segments: List[dict] = None,
         initial_history: List[BaseMessage] = None,
-        initial_summary_count: int = 0
+        max_summary_tokens: int = settings.SUMMARY_MAX_TOKENS,
+        last_message_at: Optional[datetime] = None,
+        last_message_id: Optional[UUID] = None,
+        summarized_until: Optional[datetime] = None,
+        last_summarized_message_id: Optional[UUID] = None,
+        token_counter: Optional[TokenCounter] = None
     ):
         self.llm = llm
-        self.chat_history: List[BaseMessage] = initial_history or []
-        self.summary = initial_summary
+        self.token_counter = token_counter or get_token_counter()
+        # token counts are computed once per message; `_token_total` is kept in
+        # step with `chat_history` so checking the budget is O(1) per turn
+        self.chat_history: List[BaseMessage] = []
+        self._token_counts: List[int] = []
+        self._token_total = 0
+        self._extend_history(initial_history or [])
+        self.summary_segments: List[dict] = []
+        for segment in initial_segments or []:
+            if segment.get("tokens") is None:
+                segment = {**segment, "tokens": self.token_counter.count(segment["text"])}
+            self.summary_segments.append(segment)
+        self._summary: Optional[str] = None
         self.max_token_limit = max_token_limit
-        self.summary_count = initial_summary_count
+        self.max_summary_tokens = max_summary_tokens
+        # newest persisted message folded into this memory
+        self.last_message_at = last_message_at
+        self.last_message_id = last_message_id
+        # newest persisted message folded into `summary` (ChatSession watermark)
+        self.summarized_until = summarized_until
+        self.last_summarized_message_id = last_summarized_message_id
+
+    def save_context(
+        self,
+        input: str,
+        output: str,
+        timestamp: Optional[datetime] = None,
+        message_id: Optional[UUID] = None
+    ):
+        logger.debug("turn added to memory", extra={
+            "user_chars": len(input),
+            "bot_chars": len(output),
+            "history_tokens": self._token_total,
+            "sample_rate": settings.LOG_TURN_SAMPLE_RATE,
+        })
+
+        self._extend_history([HumanMessage(content=input), AIMessage(content=output)])
+        if timestamp is not None:
+            self.last_message_at = timestamp
+            self.last_message_id = message_id
+
+    @property
+    def summary(self) -> str:
+        """Segments rendered one per line, oldest first (cached until they change)"""
+        if self._summary is None:
+            self._summary = "\n".join(_segment_line(segment) for segment in self.summary_segments)
+        return self._summary
+
+    @property
+    def token_count(self) -> int:
+        """Tokens of the unsummarized chat history, kept up to date as messages are added"""
+        return self._token_total
 
-    def save_context(self, input: str, output: str):
-        print(f"User: {input}")
-        print(f"AI: {output}")
+    @property
+    def summary_count(self) -> int:
+        return self.summary_segments[-1]["to_n"] if self.summary_segments else 0
 
-        self.chat_history.append(HumanMessage(content=input))
-        self.chat_history.append(AIMessage(content=output))
+    def summary_tokens(self) -> int:
+        return sum(segment["tokens"] for segment in self.summary_segments)
 
-        if self._get_token_count() > self.max_token_limit:
-            self._summarize()
+    def summary_json(self) -> dict:
+        return {"version": SUMMARY_FORMAT_VERSION, "segments": self.summary_segments}
+
+    def needs_summary(self) -> bool:
+        return self.token_count > self.max_token_limit
+
+    def add_db_messages(self, messages: Sequence[Message]):
+        """Append persisted messages (oldest first) after the (last_message_at, last_message_id) watermark"""
+        self._extend_history(_to_langchain_messages(messages))
+        if messages:
+            self.last_message_at = messages[-1].timestamp
+            self.last_message_id = messages[-1].id
 
     def load_memory_variables(self) -> dict:
         history_str = self.summary + "\n" + self._get_formatted_history()
         return {"history": history_str.strip()}
 
-    def _get_token_count(self) -> int:
-        return sum(len(m.content.split()) for m in self.chat_history)
+    def message_token_counts(self) -> List[int]:
+        """Token count of each message in `chat_history`, same order"""
+        return self._token_counts
+
+    def _extend_history(self, messages: List[BaseMessage]):
+        for m in messages:
+            tokens = self.token_counter.count(message_text(m.content))
+            self.chat_history.append(m)
+            self._token_counts.append(tokens)
+            self._token_total += tokens
+
+    def _clear_history(self):
+        self.chat_history = []
+        self._token_counts = []
+        self._token_total = 0
 
     def _get_formatted_history(self) -> str:
         return "\n".join(
@@ -51,40 +154,157 @@ class SummaryHistory:
             for m in self.chat_history
         )
 
-    def _summarize(self):
-        print(f"\n📌 [Tóm tắt lần {self.summary_count + 1}] Đang thực hiện tóm tắt do vượt quá giới hạn token...")
+    async def asummarize(self) -> bool:
+        """
+        Fold the chat history into a new summary segment and advance the watermark.
+        Runs in the summarization worker (app.chatbot.summarizer), never on the request path.
+
+        When the segments then exceed `max_summary_tokens`, all but the newest
+        SUMMARY_ROLLUP_KEEP are rolled up into one higher-level segment. Returns
+        True in that case (the segment list was rewritten, not just appended to).
+
+        Nothing is changed until every LLM call has succeeded, so a call that
+        fails (e.g. on a 429) can be retried as a whole.
+        """
+        n = self.summary_count + 1
+        logger.info("summarization started", extra={"summary_n": n, "history_tokens": self._token_total})
 
         prompt = f"""Tóm tắt cuộc hội thoại sau bằng tiếng Việt, ngắn gọn và rõ ý:\n{self._get_formatted_history()}"""
-        stream = self.llm.stream([HumanMessage(content=prompt)])
+        response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+        text = response.content.strip()
+        segments = self.summary_segments + [
+            {"level": 0, "from_n": n, "to_n": n, "text": text, "tokens": self.token_counter.count(text)}
+        ]
 
-        summary_parts = []
-        for chunk in stream:
-            print(chunk.content, end="", flush=True)
-            summary_parts.append(chunk.content)
+        rolled_up = False
+        keep = settings.SUMMARY_ROLLUP_KEEP
+        if sum(segment["tokens"] for segment in segments) > self.max_summary_tokens and len(segments) > keep + 1:
+            oldest = segments[:-keep] if keep else segments
+            segments = [await self._roll_up(oldest)] + segments[len(oldest):]
+            rolled_up = True
 
-        self.summary += f"\n📝 [Tóm tắt lần {self.summary_count + 1}]: {''.join(summary_parts).strip()}\n"
-        self.chat_history = []
-        self.summary_count += 1
-        print(f"\n✅ Tóm tắt hoàn tất.\n")
+        self.summary_segments = segments
+        self._summary = None
+        self._clear_history()
+        self.summarized_until = self.last_message_at
+        self.last_summarized_message_id = self.last_message_id
+        logger.info("summarization finished", extra={
+            "summary_n": n, "rolled_up": rolled_up, "summary_tokens": self.summary_tokens()
+        })
+        return rolled_up
+
+    async def _roll_up(self, segments: List[dict]) -> dict:
+        """A single higher-level summary of `segments` (the oldest ones)"""
+        prompt = (
+            f"Gộp các bản tóm tắt sau thành một bản tóm tắt tổng hợp bằng tiếng Việt, "
+            f"tối đa {settings.SUMMARY_ROLLUP_MAX_WORDS} từ, giữ lại các chi tiết quan trọng:\n"
+            + "\n".join(_segment_line(segment) for segment in segments)
+        )
+        response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+        text = response.content.strip()
+        return {
+            "level": max(segment["level"] for segment in segments) + 1,
+            "from_n": segments[0]["from_n"],
+            "to_n": segments[-1]["to_n"],
+            "text": text,
+            "tokens": self.token_counter.count(text),
+        }
+
+def _to_langchain_messages(messages: Sequence[Message]) -> List[BaseMessage]:
+    converted: List[BaseMessage] = []
+    for msg in messages:
+        message_text = msg.content.get('text', '') if isinstance(msg.content, dict) else str(msg.content)
+        if msg.sender == "user":
+            converted.append(HumanMessage(content=message_text))
+        elif msg.sender == "bot":
+            converted.append(AIMessage(content=message_text))
+    return converted
+
+def _summary_segments(chat_session: ChatSession) -> List[dict]:
+    summary = chat_session.summary if isinstance(chat_session.summary, dict) else {}
+    if "segments" in summary:
+        return list(summary["segments"])
+    text = summary.get("text", "").strip()
+    if not text:
+        return []
+    # free-form summary written before the segment format: keep it as one rolled-up segment
+    n = text.count("Tóm tắt lần") or 1
+    return [{"level": 1, "from_n": 1, "to_n": n, "text": text, "tokens": None}]
+
+def has_segment_summary(chat_session: ChatSession) -> bool:
+    """False for an empty or pre-segment summary, which must be written whole"""
+    return isinstance(chat_session.summary, dict) and "segments" in chat_session.summary
+
+async def _load_messages(
+    db: AsyncSession,
+    session_id: UUID,
+    after: Optional[datetime] = None,
+    after_id: Optional[UUID] = None
+) -> Sequence[Message]:
+    """
+    Messages of a session in (timestamp, id) order, optionally only those after the
+    watermark `(after, after_id)`; rows sharing the watermark's timestamp are kept
+    """
+    stmt = select(Message).where(Message.session_id == session_id)
+    if after is not None and after_id is not None:
+        stmt = stmt.where(tuple_(Message.timestamp, Message.id) > tuple_(after, after_id))
+    elif after is not None:
+        stmt = stmt.where(Message.timestamp > after)
+    result = await db.execute(stmt.order_by(Message.timestamp.asc(), Message.id.asc()))
+    return result.scalars().all()
+
+async def build_session_memory(
+    db: AsyncSession,
+    chat_session: ChatSession,
+    llm_instance: "BaseChatModel",
+    max_token_limit: int = settings.MEMORY_MAX_TOKEN_LIMIT
+) -> SummaryHistory:
+    """Build a SummaryHistory from the summary and the messages after its watermark"""
+    existing_messages = await _load_messages(
+        db, chat_session.id, after=chat_session.summarized_until, after_id=chat_session.last_summarized_message_id
+    )
+
+    return SummaryHistory(
+        llm=llm_instance,
+        max_token_limit=max_token_limit,
+        initial_segments=_summary_segments(chat_session),
+        initial_history=_to_langchain_messages(existing_messages),
+        last_message_at=existing_messages[-1].timestamp if existing_messages else chat_session.summarized_until,
+        last_message_id=existing_messages[-1].id if existing_messages else chat_session.last_summarized_message_id,
+        summarized_until=chat_session.summarized_until,
+        last_summarized_message_id=chat_session.last_summarized_message_id
+    )
+
+# session id -> lock serializing get_session_memory(); dropped once no load holds it
+_load_locks: "weakref.WeakValueDictionary[UUID, asyncio.Lock]" = weakref.WeakValueDictionary()
 
 async def get_session_memory(
     session_id: UUID,
     db: AsyncSession,
     current_user_id: UUID,
-    llm_instance: BaseChatModel,
-    max_token_limit: int = 100
+    llm_instance: "BaseChatModel",
+    max_token_limit: int = settings.MEMORY_MAX_TOKEN_LIMIT
 ) -> Tuple[SummaryHistory, ChatSession]:
     """
     Loads existing chat session and messages to reconstruct HistorySummary
     .
     Returns the memory instance and the chat session ORM object.
+
+    Only messages after `ChatSession.summarized_until` are loaded, since older
+    ones are already folded into the summary.
+
+    The memory is served from `memory_cache` when possible; a hit only reads the
+    messages written after the newest message it holds. If the persisted
+    `summarized_until` no longer matches the cached one (another worker
+    summarized), the entry is rebuilt from scratch.
     """
+    start = time.perf_counter()
+    # turns still queued for write-behind must be visible to the reads below
+    await message_writer.flush_session(session_id)
     stmt_session = select(ChatSession).where(
-    ChatSession.id == session_id,
-    ChatSession.user_id == current_user_id
-).options(
-    selectinload(ChatSession.messages)
-)
+        ChatSession.id == session_id,
+        ChatSession.user_id == current_user_id
+    )
 
     result_session = await db.execute(stmt_session)
     chat_session = result_session.scalar_one_or_none()
@@ -92,27 +312,24 @@ async def get_session_memory(
     if not chat_session:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found or not authorized")
 
-    existing_messages = sorted(chat_session.messages, key=lambda msg: msg.timestamp)
-
-    messages_for_memory: List[BaseMessage] = []
-    for msg in existing_messages:
-        message_text = msg.content.get('text', '') if isinstance(msg.content, dict) else str(msg.content)
-        if msg.sender == "user":
-            messages_for_memory.append(HumanMessage(content=message_text))
-        elif msg.sender == "bot":
-            messages_for_memory.append(AIMessage(content=message_text))
-
-    initial_summary = chat_session.summary.get('text', '') if isinstance(chat_session.summary, dict) else ""
-    initial_summary_count = initial_summary.count("Tóm tắt lần")
-
-
-    memory = SummaryHistory(
-        llm=llm_instance,
-        max_token_limit=max_token_limit,
-        initial_summary=initial_summary,
-        initial_history=messages_for_memory,
-        initial_summary_count=initial_summary_count
-    )
-    return memory, chat_session
+    # concurrent turns of the session share the cached memory: one of them at a
+    # time appends the new rows, the others then find nothing past the watermark
+    lock = _load_locks.setdefault(session_id, asyncio.Lock())
+    async with lock:
+        memory = memory_cache.get(session_id)
+        if memory is not None and memory.summarized_until == chat_session.summarized_until:
+            memory.llm = llm_instance
+            memory.max_token_limit = max_token_limit
+            memory.add_db_messages(
+                await _load_messages(db, session_id, after=memory.last_message_at, after_id=memory.last_message_id)
+            )
+            memory_load_duration.observe(time.perf_counter() - start, source="cache")
+            return memory, chat_session
 
+        if memory is not None:
+            memory_cache.invalidate(session_id, stale=True)
 
+        memory = await build_session_memory(db, chat_session, llm_instance, max_token_limit)
+        memory_cache.put(session_id, memory)
+        memory_load_duration.observe(time.perf_counter() - start, source="db")
+        return memory, chat_session
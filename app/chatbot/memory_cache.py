@@ -0,0 +1,76 @@
+from uuid import UUID
+from cachetools import TTLCache
+from app.core.config import settings
+
+
+class _CountingTTLCache(TTLCache):
+    """TTLCache that counts evictions (LRU pressure) and expirations (TTL)"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+        self.expirations = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        return expired
+
+
+class SessionMemoryCache:
+    """
+    Bounded LRU/TTL cache of SummaryHistory objects keyed by chat session id.
+
+    The cached memory is mutated in place as turns are saved, so a hit only has
+    to pull the rows written after `memory.last_message_at`.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = _CountingTTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, session_id: UUID):
+        memory = self._cache.get(session_id)
+        if memory is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return memory
+
+    def put(self, session_id: UUID, memory) -> None:
+        self._cache[session_id] = memory
+
+    def invalidate(self, session_id: UUID, stale: bool = False) -> None:
+        """Drop a session, e.g. after a failed commit or when the DB moved on"""
+        if self._cache.pop(session_id, None) is not None and stale:
+            self.stale += 1
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "ttl_seconds": self._cache.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self._cache.evictions,
+            "expirations": self._cache.expirations,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+memory_cache = SessionMemoryCache(
+    maxsize=settings.MEMORY_CACHE_MAX_SESSIONS,
+    ttl=settings.MEMORY_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+from dataclasses import dataclass
+from typing import List, Optional
+from cachetools import TTLCache
+from app.core.config import settings
+
+
+@dataclass
+class CachedResponse:
+    chunks: List[str]
+    # how long the original LLM call took, i.e. what a hit saves
+    latency: float
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        """The unexpired entry for `key`, or None"""
+
+    @abstractmethod
+    async def set(self, key: str, value: CachedResponse):
+        """Store `value` under `key`"""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU with TTL"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: CachedResponse):
+        self._cache[key] = value
+
+
+class DiskCacheBackend(CacheBackend):
+    """
+    SQLite file shared by every worker on the host; queries run in a thread,
+    each on its own autocommit connection
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def _get(self, key: str) -> Optional[CachedResponse]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        return CachedResponse(chunks=data["chunks"], latency=data["latency"])
+
+    def _set(self, key: str, value: CachedResponse):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps({"chunks": value.chunks, "latency": value.latency}), now + self.ttl)
+            )
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: CachedResponse):
+        await asyncio.to_thread(self._set, key, value)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class ResponseCache:
+    """
+    Cache of complete LLM replies keyed by the normalized prompt and the model parameters.
+
+    Only short prompts are cached (RESPONSE_CACHE_MAX_HISTORY_CHARS /
+    RESPONSE_CACHE_MAX_INPUT_CHARS): session openers with an empty history and
+    retries of the same turn, not long unique conversations.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend], max_history_chars: int, max_input_chars: int):
+        self.backend = backend
+        self.max_history_chars = max_history_chars
+        self.max_input_chars = max_input_chars
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.saved_latency = 0.0
+
+    def key_for(self, history: str, user_input: str, **model_params) -> Optional[str]:
+        """Cache key for the prompt, or None when the bypass rules say not to cache it"""
+        if (
+            self.backend is None
+            or len(history) > self.max_history_chars
+            or len(user_input) > self.max_input_chars
+        ):
+            self.bypassed += 1
+            return None
+        raw = json.dumps([model_params, _normalize(history), _normalize(user_input)], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        entry = await self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.saved_latency += entry.latency
+        return entry
+
+    async def set(self, key: str, chunks: List[str], latency: float):
+        await self.backend.set(key, CachedResponse(chunks=chunks, latency=latency))
+        self.stores += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "saved_latency_seconds": self.saved_latency,
+        }
+
+
+def create_cache_backend() -> Optional[CacheBackend]:
+    if settings.RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryCacheBackend(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_TTL_SECONDS)
+    if settings.RESPONSE_CACHE_BACKEND == "disk":
+        return DiskCacheBackend(settings.RESPONSE_CACHE_PATH, settings.RESPONSE_CACHE_TTL_SECONDS)
+    if settings.RESPONSE_CACHE_BACKEND == "none":
+        return None
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND '{settings.RESPONSE_CACHE_BACKEND}', expected memory, disk or none")
+
+
+response_cache = ResponseCache(
+    create_cache_backend(),
+    max_history_chars=settings.RESPONSE_CACHE_MAX_HISTORY_CHARS,
+    max_input_chars=settings.RESPONSE_CACHE_MAX_INPUT_CHARS,
+)
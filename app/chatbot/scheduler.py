@@ -0,0 +1,286 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+from app.core.config import settings
+from app.core.metrics import Histogram
+
+# lower value = served first
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+WAIT_BUCKETS_MS = (5, 25, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+T = TypeVar("T")
+
+
+class LLMQueueTimeout(Exception):
+    """The call waited longer than LLM_QUEUE_TIMEOUT_SECONDS for a slot"""
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """True for provider 429s (google.api_core ResourceExhausted, also as the cause of another error)"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+        if code == 429 or type(exc).__name__ == "ResourceExhausted":
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class Grant:
+    """A slot handed out by the scheduler; `charge()` corrects the token estimate"""
+
+    def __init__(self, scheduler: "LLMScheduler", tokens: int):
+        self._scheduler = scheduler
+        self.tokens = tokens
+
+    def charge(self, actual_tokens: int):
+        self._scheduler._tokens -= actual_tokens - self.tokens
+        self.tokens = actual_tokens
+
+
+class _Waiter:
+    def __init__(self, user_key: str, priority: int, tokens: int):
+        self.user_key = user_key
+        self.priority = priority
+        self.tokens = tokens
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+
+
+class _FairQueue:
+    """Waiters of one priority class, served round-robin across users"""
+
+    def __init__(self):
+        self._users: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self.depth = 0
+
+    def push(self, waiter: _Waiter):
+        self._users.setdefault(waiter.user_key, deque()).append(waiter)
+        self.depth += 1
+
+    def peek(self) -> Optional[_Waiter]:
+        for waiters in self._users.values():
+            return waiters[0]
+        return None
+
+    def pop(self) -> _Waiter:
+        user_key, waiters = next(iter(self._users.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            # this user had its turn: go to the back of the rotation
+            self._users.move_to_end(user_key)
+        else:
+            del self._users[user_key]
+        self.depth -= 1
+        return waiter
+
+    def waiting_users(self) -> int:
+        return len(self._users)
+
+    def remove(self, waiter: _Waiter):
+        waiters = self._users.get(waiter.user_key)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del self._users[waiter.user_key]
+        self.depth -= 1
+
+
+class _ClassStats:
+    def __init__(self):
+        self.enqueued = 0
+        self.granted = 0
+        self.timeouts = 0
+        self.wait = Histogram("llm_queue_wait_ms", "Time from enqueue to grant", buckets=WAIT_BUCKETS_MS)
+
+
+class LLMScheduler:
+    """
+    Admission control for every call to the chat model.
+
+    At most `max_concurrency` calls run at once, and a token bucket refilled at
+    `tokens_per_minute` (0 = unlimited) paces them. Each call reserves its
+    estimated prompt+completion tokens up front and corrects the estimate
+    with `Grant.charge()` when it finishes. Waiting calls are served by priority
+    (INTERACTIVE before BACKGROUND), and round-robin across users within a
+    priority, so one chatty user cannot starve the others. A 429 from the
+    provider pauses all admissions for a jittered backoff before the call is
+    retried, instead of every queued call hitting the limit at once.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        tokens_per_minute: int,
+        queue_timeout: float,
+        max_retries: int,
+        retry_base_delay: float,
+        retry_max_delay: float
+    ):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._queues: Dict[int, _FairQueue] = {p: _FairQueue() for p in PRIORITY_NAMES}
+        self._stats: Dict[int, _ClassStats] = {p: _ClassStats() for p in PRIORITY_NAMES}
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at = 0.0
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    def _refill(self, now: float):
+        if self.tokens_per_minute > 0:
+            rate = self.tokens_per_minute / 60
+            self._tokens = min(self.tokens_per_minute, self._tokens + (now - self._refilled_at) * rate)
+        self._refilled_at = now
+
+    def _wake_at(self, when: float):
+        if self._timer is not None and self._timer_at <= when:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timer_at = when
+        self._timer = loop.call_later(max(0.0, when - time.monotonic()), self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.in_flight < self.max_concurrency:
+            queue = next((self._queues[p] for p in sorted(self._queues) if self._queues[p].depth), None)
+            if queue is None:
+                return
+            now = time.monotonic()
+            if now < self._paused_until:
+                self._wake_at(self._paused_until)
+                return
+            waiter = queue.peek()
+            if waiter.future.done():
+                # cancelled or timed out, and not yet removed by its own _acquire()
+                queue.pop()
+                continue
+            if self.tokens_per_minute > 0:
+                self._refill(now)
+                # a call bigger than the whole budget runs once the bucket is full
+                needed = min(waiter.tokens, self.tokens_per_minute)
+                if self._tokens < needed:
+                    self._wake_at(now + (needed - self._tokens) * 60 / self.tokens_per_minute)
+                    return
+            queue.pop()
+            self._tokens -= waiter.tokens
+            self.in_flight += 1
+            waiter.granted = True
+            stats = self._stats[waiter.priority]
+            stats.granted += 1
+            stats.wait.observe((time.perf_counter() - waiter.enqueued_at) * 1000)
+            waiter.future.set_result(None)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    async def _acquire(self, user_key: str, priority: int, tokens: int) -> Grant:
+        waiter = _Waiter(user_key, priority, tokens)
+        self._queues[priority].push(waiter)
+        self._stats[priority].enqueued += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout or None)
+        except BaseException as e:
+            if waiter.granted:
+                self._release()
+            else:
+                self._queues[priority].remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self._stats[priority].timeouts += 1
+                raise LLMQueueTimeout(
+                    f"No LLM capacity within {self.queue_timeout:g}s, please retry"
+                ) from None
+            raise
+        return Grant(self, tokens)
+
+    @asynccontextmanager
+    async def slot(self, user_key: str, priority: int = INTERACTIVE, estimated_tokens: int = 0):
+        """Wait for a slot; it is held until the block exits"""
+        grant = await self._acquire(user_key, priority, estimated_tokens)
+        try:
+            yield grant
+        finally:
+            self._release()
+
+    def on_rate_limited(self, attempt: int) -> float:
+        """Pause admissions after a 429 and return how long the caller should back off"""
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        self.rate_limited += 1
+        self.retries += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    async def call(
+        self,
+        user_key: str,
+        priority: int,
+        estimated_tokens: int,
+        fn: Callable[[], Awaitable[T]]
+    ) -> T:
+        """Run a non-streaming LLM call through the scheduler, retrying 429s"""
+        async with self.slot(user_key, priority, estimated_tokens):
+            attempt = 0
+            while True:
+                try:
+                    return await fn()
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_rate_limited(e):
+                        raise
+                    await asyncio.sleep(self.on_rate_limited(attempt))
+                    attempt += 1
+
+    def stats(self) -> dict:
+        self._refill(time.monotonic())
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "tokens_available": round(self._tokens) if self.tokens_per_minute > 0 else None,
+            "tokens_per_minute": self.tokens_per_minute,
+            "paused_for_seconds": max(0.0, self._paused_until - time.monotonic()),
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "classes": {
+                name: {
+                    "queue_depth": self._queues[priority].depth,
+                    "waiting_users": self._queues[priority].waiting_users(),
+                    "enqueued": self._stats[priority].enqueued,
+                    "granted": self._stats[priority].granted,
+                    "timeouts": self._stats[priority].timeouts,
+                    "wait": self._stats[priority].wait.snapshot(),
+                }
+                for priority, name in PRIORITY_NAMES.items()
+            },
+        }
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+    max_retries=settings.LLM_MAX_RETRIES,
+    retry_base_delay=settings.LLM_RETRY_BASE_DELAY,
+    retry_max_delay=settings.LLM_RETRY_MAX_DELAY,
+)
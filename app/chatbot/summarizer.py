@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Set
+from uuid import UUID
+from sqlalchemy import Text, func, literal, update
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from app.core.config import settings
+from app.core.metrics import summarization_duration
+from app.core.tracing import tracer
+from app.db.session import AsyncSessionLocal
+from app.db.write_behind import message_writer
+from app.models.chat_session import ChatSession
+from app.chatbot.memory import build_session_memory, has_segment_summary
+from app.chatbot.memory_cache import memory_cache
+from app.chatbot.llm_management import aget_llm
+from app.chatbot.scheduler import BACKGROUND, llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+def _append_segment(segment: dict):
+    """summary = jsonb_set(summary, '{segments}', summary->'segments' || '[segment]')"""
+    return func.jsonb_set(
+        ChatSession.summary,
+        literal(["segments"], ARRAY(Text)),
+        ChatSession.summary["segments"].op("||", return_type=JSONB)(literal([segment], JSONB))
+    )
+
+
+class SummarizationWorker:
+    """
+    In-process queue of summarization jobs, drained by a small pool of asyncio tasks.
+
+    Jobs are keyed by session id: a session that is already queued or being
+    summarized is not queued again. Each job reloads the unsummarized messages
+    in its own DB session, calls the LLM asynchronously and writes the new
+    summary with a compare-and-set on the watermark, so two workers (or two
+    processes) never fold the same messages twice.
+    """
+
+    def __init__(self, concurrency: int, maxsize: int):
+        self.concurrency = concurrency
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._pending: Set[UUID] = set()
+        self._enqueued_at: Dict[UUID, float] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.in_flight = 0
+        self.enqueued = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.completed = 0
+        self.skipped = 0
+        self.conflicts = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, session_id: UUID) -> bool:
+        """Schedule a summarization of the session; False if already pending or the queue is full"""
+        if session_id in self._pending:
+            self.deduplicated += 1
+            return False
+        try:
+            self._queue.put_nowait(session_id)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self._pending.add(session_id)
+        self._enqueued_at[session_id] = time.perf_counter()
+        self.enqueued += 1
+        return True
+
+    async def _run(self):
+        while True:
+            session_id = await self._queue.get()
+            self.in_flight += 1
+            outcome = "failed"
+            try:
+                # a trace of its own: the turn that queued it has already finished
+                with tracer.span("summarization", session_id=str(session_id)) as span:
+                    outcome = await self._summarize_session(session_id)
+                    span.set_attribute("outcome", outcome)
+            except Exception:
+                self.failed += 1
+                logger.exception("summarization failed", extra={"session_id": str(session_id)})
+            finally:
+                self.in_flight -= 1
+                self._pending.discard(session_id)
+                latency = time.perf_counter() - self._enqueued_at.pop(session_id, time.perf_counter())
+                summarization_duration.observe(latency, outcome=outcome)
+                self.last_latency = latency
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+                self._queue.task_done()
+
+    async def _summarize_session(self, session_id: UUID) -> str:
+        """Returns the outcome: completed, skipped or conflict"""
+        # summarize what the cached memory has seen, including queued write-behind turns
+        await message_writer.flush_session(session_id)
+        async with AsyncSessionLocal() as db:
+            chat_session = await db.get(ChatSession, session_id)
+            if chat_session is None:
+                self.skipped += 1
+                return "skipped"
+
+            memory = await build_session_memory(db, chat_session, await aget_llm())
+            if not memory.needs_summary():
+                self.skipped += 1
+                return "skipped"
+
+            previous_watermark = chat_session.summarized_until
+            # queued behind interactive turns
+            with tracer.span("llm.summarize") as span:
+                span.set_attribute("history_tokens", memory.token_count)
+                rolled_up = await llm_scheduler.call(
+                    str(chat_session.user_id),
+                    BACKGROUND,
+                    memory.token_count + settings.LLM_RESERVED_OUTPUT_TOKENS,
+                    memory.asummarize
+                )
+                span.set_attribute("rolled_up", rolled_up)
+            if rolled_up or not has_segment_summary(chat_session):
+                summary = memory.summary_json()
+            else:
+                # only the new segment travels; the stored ones are left as they are
+                summary = _append_segment(memory.summary_segments[-1])
+
+            with tracer.span("db.write_summary"):
+                result = await db.execute(
+                    update(ChatSession)
+                    .where(
+                        ChatSession.id == session_id,
+                        ChatSession.summarized_until.is_not_distinct_from(previous_watermark)
+                    )
+                    .values(
+                        summary=summary,
+                        summarized_until=memory.summarized_until,
+                        last_summarized_message_id=memory.last_summarized_message_id
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+
+        if result.rowcount == 0:
+            # somebody else summarized first; let the next turn rebuild from the DB
+            self.conflicts += 1
+            memory_cache.invalidate(session_id)
+            return "conflict"
+
+        # the fresh memory matches the DB; turns written meanwhile are picked up
+        # by the next cache hit since they are newer than the watermark
+        memory_cache.put(session_id, memory)
+        self.completed += 1
+        return "completed"
+
+    def stats(self) -> dict:
+        finished = self.completed + self.skipped + self.conflicts + self.failed
+        return {
+            "queue_depth": self._queue.qsize(),
+            "in_flight": self.in_flight,
+            "workers": len(self._tasks),
+            "enqueued": self.enqueued,
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "skipped": self.skipped,
+            "conflicts": self.conflicts,
+            "failed": self.failed,
+            "avg_latency_seconds": (self.total_latency / finished) if finished else 0.0,
+            "max_latency_seconds": self.max_latency,
+            "last_latency_seconds": self.last_latency,
+        }
+
+
+summarization_worker = SummarizationWorker(
+    concurrency=settings.SUMMARY_WORKERS,
+    maxsize=settings.SUMMARY_QUEUE_MAXSIZE,
+)
@@ -0,0 +1,73 @@
+import math
+import re
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Callable, Dict
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+# words (any script, including Vietnamese diacritics) or single punctuation marks
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+class TokenCounter(ABC):
+    """Counts tokens of a piece of text"""
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """Number of tokens in `text`"""
+
+
+class RegexTokenCounter(TokenCounter):
+    """
+    Fast offline approximation of a SentencePiece tokenizer such as Gemini's.
+
+    Every punctuation mark is one token, ASCII words take about one token per
+    `ascii_chars_per_token` characters and words with non-ASCII letters (e.g.
+    Vietnamese syllables with diacritics) split into more pieces.
+    """
+
+    def __init__(self, ascii_chars_per_token: float = 4.0, non_ascii_chars_per_token: float = 2.5):
+        self.ascii_chars_per_token = ascii_chars_per_token
+        self.non_ascii_chars_per_token = non_ascii_chars_per_token
+
+    def count(self, text: str) -> int:
+        total = 0
+        for piece in _TOKEN_PATTERN.findall(text):
+            per_token = self.ascii_chars_per_token if piece.isascii() else self.non_ascii_chars_per_token
+            total += max(1, math.ceil(len(piece) / per_token))
+        return total
+
+
+class ModelTokenCounter(TokenCounter):
+    """Exact counts from the chat model's own tokenizer (may call the provider API)"""
+
+    def __init__(self, llm: "BaseChatModel"):
+        self.llm = llm
+
+    def count(self, text: str) -> int:
+        return self.llm.get_num_tokens(text)
+
+
+_token_counter_factories: Dict[str, Callable[[], TokenCounter]] = {
+    "regex": RegexTokenCounter,
+}
+
+
+def register_token_counter(name: str, factory: Callable[[], TokenCounter]):
+    _token_counter_factories[name] = factory
+
+
+def get_token_counter(name: str = None) -> TokenCounter:
+    name = name or settings.TOKEN_COUNTER
+    if name not in _token_counter_factories:
+        raise ValueError(f"Unknown token counter '{name}', expected one of {sorted(_token_counter_factories)}")
+    return _token_counter_factories[name]()
+
+
+def message_text(content) -> str:
+    """Text of a LangChain message content (plain string or list of parts)"""
+    if isinstance(content, str):
+        return content
+    return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
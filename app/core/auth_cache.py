@@ -0,0 +1,72 @@
+import time
+from typing import Optional
+from uuid import UUID
+from cachetools import TTLCache
+from sqlalchemy import event
+from app.core.config import settings
+from app.models.user import User
+from app.schemas.user import CurrentUser
+
+
+class AuthUserCache:
+    """
+    TTL-bounded LRU cache from access token to the lightweight user record it resolves to.
+
+    Entries never outlive the token's own `exp` claim, and are dropped as soon
+    as the user row is updated or deleted in this process (see the mapper
+    events below). Other workers rely on the TTL.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        entry = self._cache.get(token)
+        if entry is not None:
+            user, expires_at = entry
+            if expires_at is None or expires_at > time.time():
+                self.hits += 1
+                return user
+            self._cache.pop(token, None)
+        self.misses += 1
+        return None
+
+    def put(self, token: str, user: CurrentUser, expires_at: Optional[float]):
+        self._cache[token] = (user, expires_at)
+
+    def invalidate_user(self, user_id: UUID):
+        stale = [token for token, (user, _) in list(self._cache.items()) if user.id == user_id]
+        for token in stale:
+            self._cache.pop(token, None)
+        self.invalidations += len(stale)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "ttl_seconds": self._cache.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+auth_user_cache = AuthUserCache(
+    maxsize=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS,
+)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User):
+    # e.g. email or password changes must not keep authenticating old tokens
+    auth_user_cache.invalidate_user(target.id)
@@ -6,7 +6,146 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     SECRET_KEY: str
     ALGORITHM: str
-    GEMINI_API_KEY: str
+    # only needed with LLM_BACKEND=gemini
+    GEMINI_API_KEY: str = ""
+
+    # Chat model backend: "gemini" or "fake" (local deterministic stream, for load tests)
+    LLM_BACKEND: str = "gemini"
+    LLM_MODEL: str = "models/gemini-1.5-flash"
+    LLM_TEMPERATURE: float = 0.7
+    FAKE_LLM_TTFT_MS: float = 300
+    FAKE_LLM_TOKENS_PER_SECOND: float = 50
+    FAKE_LLM_REPLY_TOKENS: int = 60
+    FAKE_LLM_FAILURE_RATE: float = 0.0
+    # When the chat model is built (app.chatbot.llm_management): "startup" (before serving),
+    # "background" (serve at once, build in a thread) or "lazy" (first chat turn).
+    # LLM_PRELOAD imports the backend SDK when app.main is imported, e.g. before
+    # gunicorn --preload forks; the client itself is always created in the worker.
+    LLM_WARMUP: str = "background"
+    LLM_PRELOAD: bool = False
+
+    # Global admission control for LLM calls (app.chatbot.scheduler); 0 tokens/minute = no budget
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_TOKENS_PER_MINUTE: int = 0
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 30
+    # tokens reserved for the reply until the real size is known
+    LLM_RESERVED_OUTPUT_TOKENS: int = 512
+    LLM_MAX_RETRIES: int = 3
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 8
+
+    # SQLAlchemy engine / connection pool
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # asyncpg prepared statements cached per connection (0 disables, e.g. behind pgbouncer)
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
+    # In-process cache of SummaryHistory objects, keyed by chat session id
+    MEMORY_CACHE_MAX_SESSIONS: int = 1024
+    MEMORY_CACHE_TTL_SECONDS: int = 900
+    # Unsummarized history above this many tokens (per TOKEN_COUNTER) gets summarized
+    MEMORY_MAX_TOKEN_LIMIT: int = 2000
+    TOKEN_COUNTER: str = "regex"
+    # Upper bound of system prompt + summary + recent turns + user input sent per turn;
+    # the oldest turns are left out first
+    CONTEXT_MAX_PROMPT_TOKENS: int = 4000
+
+    # Shared secret for the operational /internal/* endpoints, sent as `X-Internal-Token`;
+    # empty = those endpoints are disabled (404)
+    INTERNAL_API_TOKEN: str = ""
+
+    # Access token -> user record cache used by get_current_user / get_ws_current_user
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_CACHE_TTL_SECONDS: int = 60
+
+    # bcrypt runs off the event loop: "thread" or "process" pool
+    PASSWORD_HASH_EXECUTOR: str = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 4
+
+    # Websocket fan-out across workers: "inprocess" (single worker) or "broker"
+    # (python -m app.realtime.broker)
+    WS_BACKPLANE: str = "inprocess"
+    WS_BROKER_HOST: str = "127.0.0.1"
+    WS_BROKER_PORT: int = 8765
+
+    # Per-socket send queue and coalescing of streamed LLM chunks
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SLOW_CONSUMER_POLICY: str = "drop"  # or "disconnect"
+    WS_COALESCE_MS: int = 20
+    WS_COALESCE_BYTES: int = 512
+
+    # Cache of complete LLM replies: "memory", "disk" (SQLite at RESPONSE_CACHE_PATH) or "none".
+    # Prompts with a longer history or input than the limits below bypass the cache.
+    RESPONSE_CACHE_BACKEND: str = "memory"
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2048
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_PATH: str = ".cache/llm_responses.sqlite3"
+    RESPONSE_CACHE_MAX_HISTORY_CHARS: int = 4000
+    RESPONSE_CACHE_MAX_INPUT_CHARS: int = 1000
+
+    # Write-behind persistence of chat turns (app.db.write_behind): turns are committed
+    # in batches of up to WRITE_BEHIND_MAX_BATCH, at most WRITE_BEHIND_MAX_DELAY_MS later
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_MAX_BATCH: int = 500
+    WRITE_BEHIND_MAX_DELAY_MS: int = 50
+    WRITE_BEHIND_MAX_PENDING: int = 10000
+
+    # Summary segments above SUMMARY_MAX_TOKENS are rolled up into one higher-level
+    # segment, except the newest SUMMARY_ROLLUP_KEEP
+    SUMMARY_MAX_TOKENS: int = 800
+    SUMMARY_ROLLUP_KEEP: int = 2
+    SUMMARY_ROLLUP_MAX_WORDS: int = 200
+
+    # Background summarization worker pool
+    SUMMARY_WORKERS: int = 2
+    SUMMARY_QUEUE_MAXSIZE: int = 1000
+
+    # Rate limiting (app.core.rate_limit). Token buckets refilled at N per minute with
+    # room for a burst of *_BURST; 0 per minute = no limit. REST requests, websocket connects
+    # and websocket turns are limited per client IP, REST requests per user, chat turns
+    # (websocket and REST) per user, and LLM tokens (prompt + completion) per user per UTC
+    # day. State is kept per worker ("memory") or in a SQLite file shared by every worker
+    # on the host ("disk", RATE_LIMIT_PATH).
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_PATH: str = ".cache/rate_limits.sqlite3"
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    RATE_LIMIT_IP_PER_MINUTE: int = 300
+    RATE_LIMIT_IP_BURST: int = 60
+    RATE_LIMIT_USER_PER_MINUTE: int = 120
+    RATE_LIMIT_USER_BURST: int = 30
+    RATE_LIMIT_TURNS_PER_MINUTE: int = 20
+    RATE_LIMIT_TURN_BURST: int = 5
+    RATE_LIMIT_DAILY_TOKENS: int = 0
+    # take the client IP from X-Forwarded-For (only behind a proxy that sets it)
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False
+
+    # Logging of the "app.*" loggers (app.core.log): "json" or "text" lines on stderr,
+    # written by a background thread. DEBUG/INFO records are kept with probability
+    # LOG_SAMPLE_RATE (per-turn records use LOG_TURN_SAMPLE_RATE); WARNING and up always are.
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_SAMPLE_RATE: float = 1.0
+    LOG_TURN_SAMPLE_RATE: float = 0.01
+
+    # Per-turn tracing (app.core.tracing): share of turns traced, traces kept for
+    # /internal/traces, and an optional OTLP/JSON lines file ("" = off)
+    TRACE_SAMPLE_RATE: float = 1.0
+    TRACE_RING_BUFFER_SIZE: int = 200
+    TRACE_OTLP_FILE: str = ""
+    TRACE_SERVICE_NAME: str = "chatai"
+    # Sampling profiler: turns asked for with `X-Profile: 1` / `?profile=1` (only when
+    # PROFILE_ON_REQUEST is set), and every turn slower than PROFILE_SLOW_TURN_MS
+    # (0 = off), are written to PROFILE_DIR as collapsed stacks (flamegraph.pl, speedscope)
+    PROFILE_ON_REQUEST: bool = False
+    PROFILE_SLOW_TURN_MS: int = 0
+    PROFILE_INTERVAL_MS: float = 5
+    PROFILE_DIR: str = ".profiles"
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from app.core.config import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# module level so they can also run in a ProcessPoolExecutor
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt off the event loop on a thread (default) or process pool.
+
+    At most `max_concurrency` hashes run at once; callers above that wait on a
+    semaphore, and the time they spend there is reported by `stats()`.
+    """
+
+    def __init__(self, executor: str, max_workers: int, max_concurrency: int):
+        self.executor_kind = executor
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._executor: Optional[Executor] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.rehashed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started_at = time.perf_counter()
+        wait = started_at - queued_at
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.active += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self.total_run += time.perf_counter() - started_at
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check the password; the second item is a fresh hash when `pwd_context`
+        reports the stored one as outdated (deprecated scheme or too few rounds).
+        """
+        valid, new_hash = await self._run(_verify_and_update, password, hashed_password)
+        if new_hash is not None:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.executor_kind,
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "waiting": self.waiting,
+            "active": self.active,
+            "completed": self.completed,
+            "rehashed": self.rehashed,
+            "avg_wait_seconds": (self.total_wait / self.completed) if self.completed else 0.0,
+            "max_wait_seconds": self.max_wait,
+            "avg_run_seconds": (self.total_run / self.completed) if self.completed else 0.0,
+        }
+
+
+password_hasher = PasswordHasher(
+    executor=settings.PASSWORD_HASH_EXECUTOR,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY,
+)
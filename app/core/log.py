@@ -0,0 +1,106 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+from app.core.config import settings
+
+# attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+# per-record override of the sampling rate: logger.info(..., extra={"sample_rate": 0.01})
+SAMPLE_RATE_ATTR = "sample_rate"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[logging.Handler] = None
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {
+        key: value for key, value in vars(record).items()
+        if key not in _RECORD_ATTRS and key != SAMPLE_RATE_ATTR
+    }
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event and the record's extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """`ts LEVEL logger event key=value ...`, for reading in a terminal"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = (f"{datetime.fromtimestamp(record.created).isoformat(sep=' ', timespec='milliseconds')} "
+                f"{record.levelname:7s} {record.name} {record.getMessage()}")
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a random `rate` share of records below WARNING; WARNING and up always pass"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = getattr(record, SAMPLE_RATE_ATTR, self.rate)
+        return rate >= 1 or random.random() < rate
+
+
+def configure_logging():
+    """
+    Route the "app" logger tree through a queue to a background writer thread,
+    so a log call on the event loop never waits on stderr. Sampling happens
+    before the record is queued. Safe to call more than once.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter()
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _handler = logging.handlers.QueueHandler(records)
+    _handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATE))
+
+    logger = logging.getLogger("app")
+    logger.setLevel(settings.LOG_LEVEL.upper())
+    logger.addHandler(_handler)
+    # uvicorn's handlers on the root logger would print everything a second time
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener, _handler
+    if _listener is not None:
+        logging.getLogger("app").removeHandler(_handler)
+        _listener.stop()
+        _listener = None
+        _handler = None
@@ -0,0 +1,235 @@
+import bisect
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# upper bounds in milliseconds, for the in-process stats behind /internal
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+TOKENS_PER_SECOND_BUCKETS = (5, 10, 20, 40, 60, 80, 120, 160, 240, 320)
+
+# (labels, value) pairs of one metric, as produced by collectors
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """
+    Cumulative-bucket histogram in Prometheus' sense (seconds unless the name says otherwise).
+
+    Also used unregistered, for the JSON stats of a single component (pool
+    checkouts, scheduler waits, prompt sizes, ...), through `snapshot()`.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = list(buckets)
+        # per label set: [per-bucket counts (+Inf last), sum, max]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, value]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] = max(series[2], value)
+
+    def snapshot(self, **labels) -> dict:
+        """count, sum, avg, max and per-bucket (not cumulative) counts of one label set, in the metric's unit"""
+        counts, total, largest = self._series.get(self._key(labels), ([0] * (len(self.buckets) + 1), 0.0, 0.0))
+        count = sum(counts)
+        return {
+            "count": count,
+            "sum": total,
+            "avg": total / count if count else 0.0,
+            "max": largest,
+            "buckets": dict(zip([f"le_{_format_value(b)}" for b in self.buckets] + ["le_inf"], counts)),
+        }
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total, _) in self._series.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float("inf")], counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics, rendered in the Prometheus text format (0.0.4).
+
+    Hot paths update Counter/Gauge/Histogram objects directly: a dict lookup
+    and an addition, no locks (everything runs on the event loop). Values that
+    already live elsewhere (cache counters, pool usage, ...) are not copied on
+    every event; collectors read them when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        """`collector()` yields (name, type, help, samples) at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, type, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {type}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+http_request_duration = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template, until the body is sent",
+    ("method", "route", "status"))
+ws_connections_opened = metrics.counter(
+    "ws_connections_opened_total", "Websocket connections accepted (including rejected logins)")
+ws_turns = metrics.counter(
+    "ws_turns_total", "Websocket chat turns by outcome", ("outcome",))
+ws_turn_duration = metrics.histogram(
+    "ws_turn_duration_seconds", "Websocket turn latency, from the user message to the saved reply")
+llm_time_to_first_token = metrics.histogram(
+    "llm_time_to_first_token_seconds", "Time from the LLM call (including the scheduler queue) to its first chunk",
+    ("cached",))
+llm_tokens_per_second = metrics.histogram(
+    "llm_tokens_per_second", "Completion tokens per second after the first chunk", buckets=TOKENS_PER_SECOND_BUCKETS)
+llm_completion_tokens = metrics.counter(
+    "llm_completion_tokens_total", "Completion tokens streamed by the LLM (cache hits excluded)")
+llm_prompt_tokens = metrics.counter(
+    "llm_prompt_tokens_total", "Prompt tokens sent to the LLM (cache hits excluded)")
+memory_load_duration = metrics.histogram(
+    "memory_load_duration_seconds", "Loading a session's conversation memory", ("source",))
+summarization_duration = metrics.histogram(
+    "summarization_duration_seconds", "Summarization jobs, from enqueue to the written summary", ("outcome",),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+db_commit_duration = metrics.histogram(
+    "db_commit_duration_seconds", "AsyncSession.commit() latency")
+rate_limit_rejections = metrics.counter(
+    "rate_limit_rejections_total", "Requests and chat turns rejected by the rate limiter", ("scope",))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request into `http_request_duration_seconds`.
+
+    Requests are labelled with the route template (`/chat-session/{session_id}`),
+    not the raw path, so the number of series stays bounded. Streaming bodies
+    are timed until their last chunk. Websockets are counted by the chat code.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status_code: Optional[int] = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status_code or 500,
+            )
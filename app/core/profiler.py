@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+# pseudo-frames for samples taken while the profiled task was not running
+LOOP_IDLE = "(awaiting: event loop idle)"
+LOOP_BUSY = "(awaiting: event loop running other tasks)"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    """Stack of `frame` as `root;...;leaf`, the collapsed format of flamegraph.pl / speedscope"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profile:
+    """Samples collected for one asyncio task (one chat turn)"""
+
+    def __init__(self, label: str, task: asyncio.Task, loop: asyncio.AbstractEventLoop, thread_id: int):
+        self.label = label
+        self.task = task
+        self.loop = loop
+        self.thread_id = thread_id
+        self.started_at = time.perf_counter()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for individual chat turns.
+
+    While at least one profile is active, a daemon thread wakes every
+    `interval` seconds and reads the event loop thread's stack from
+    `sys._current_frames()`. The sample goes to the profile whose task is the
+    one running on the loop at that moment. When the task is suspended the
+    sample is recorded as LOOP_IDLE (the loop is waiting on I/O: the LLM
+    stream, the database) or LOOP_BUSY (the loop is running other tasks:
+    this turn is waiting for the CPU), so the profile also shows where the
+    turn spent its time waiting. Nothing runs while no profile is active.
+    """
+
+    def __init__(self, interval: float, output_dir: str):
+        self.interval = interval
+        self.output_dir = output_dir
+        self._profiles: Dict[int, Profile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.dumped = 0
+
+    def begin(self, label: str) -> Optional[Profile]:
+        """Profile the current task until `end()`; must be called on the event loop"""
+        task = asyncio.current_task()
+        if task is None:
+            return None
+        profile = Profile(label, task, asyncio.get_running_loop(), threading.get_ident())
+        with self._lock:
+            self._profiles[id(profile)] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="turn-profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def end(self, profile: Profile):
+        with self._lock:
+            self._profiles.pop(id(profile), None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                profiles = list(self._profiles.values())
+                if not profiles:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for profile in profiles:
+                frame = frames.get(profile.thread_id)
+                if frame is None:
+                    continue
+                running = asyncio.current_task(profile.loop)
+                if running is profile.task:
+                    stack = _collapse(frame)
+                elif running is None:
+                    stack = LOOP_IDLE
+                else:
+                    stack = LOOP_BUSY
+                profile.stacks[f"{profile.label};{stack}"] += 1
+                profile.samples += 1
+
+    def dump(self, profile: Profile, name: str) -> Optional[str]:
+        """Write the collapsed stacks to `output_dir` and return the path (blocking: run in a thread)"""
+        if not profile.stacks:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{name}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in profile.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.dumped += 1
+        return path
+
+    def stats(self) -> dict:
+        return {
+            "active_profiles": len(self._profiles),
+            "interval_ms": self.interval * 1000,
+            "output_dir": self.output_dir,
+            "dumped": self.dumped,
+        }
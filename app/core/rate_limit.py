@@ -0,0 +1,330 @@
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from cachetools import TTLCache
+from app.core.config import settings
+from app.core.metrics import rate_limit_rejections
+from app.core.security import verify_token
+
+
+class RateLimitExceeded(Exception):
+    """A token bucket or the daily token quota has nothing left for this request"""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded ({scope}), retry in {math.ceil(retry_after)}s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+    def to_dict(self) -> dict:
+        return {"detail": str(self), "scope": self.scope, "retry_after": round(self.retry_after, 3)}
+
+
+def _utc_day() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _seconds_until_next_day() -> float:
+    now = datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
+
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        """
+        Take `cost` tokens from the bucket `key` (refilled at `rate` per second, holding
+        at most `burst`); 0.0 when taken, otherwise the seconds until they would be there
+        """
+
+    @abstractmethod
+    async def usage(self, key: str, day: str) -> int:
+        """Amount counted against `key` on `day`"""
+
+    @abstractmethod
+    async def add_usage(self, key: str, day: str, amount: int) -> int:
+        """Add `amount` to the usage of `key` on `day`; returns the new total"""
+
+
+def _refill(tokens: float, updated_at: float, now: float, rate: float, burst: int) -> float:
+    return min(float(burst), tokens + (now - updated_at) * rate)
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Per-worker buckets. A bucket that has not been touched for long enough to
+    refill completely is the same as a new one, so idle keys simply expire
+    (and at most `max_keys` are kept).
+
+    Daily usage is a plain dict for the current day only, never evicted (an
+    evicted counter would hand its user a fresh quota) and dropped as a whole
+    when the day rolls over; it holds one int per user active that day.
+    """
+
+    def __init__(self, max_keys: int, ttl: float):
+        self._buckets: TTLCache = TTLCache(maxsize=max_keys, ttl=ttl)
+        self._usage_day = ""
+        self._usage: Dict[str, int] = {}
+
+    def _usage_of(self, day: str) -> Dict[str, int]:
+        if day != self._usage_day:
+            self._usage_day = day
+            self._usage = {}
+        return self._usage
+
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (float(burst), now))
+        tokens = _refill(tokens, updated_at, now, rate, burst)
+        if tokens >= cost:
+            self._buckets[key] = (tokens - cost, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (cost - tokens) / rate
+
+    async def usage(self, key: str, day: str) -> int:
+        return self._usage_of(day).get(key, 0)
+
+    async def add_usage(self, key: str, day: str, amount: int) -> int:
+        usage = self._usage_of(day)
+        usage[key] = usage.get(key, 0) + amount
+        return usage[key]
+
+
+class DiskRateLimitBackend(RateLimitBackend):
+    """
+    SQLite file shared by every worker on the host, so the limits hold across
+    workers; queries run in a thread and each bucket update is one IMMEDIATE
+    transaction. Buckets idle for a day and usage of past days are pruned.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._takes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage (key TEXT NOT NULL, day TEXT NOT NULL, used INTEGER NOT NULL, "
+                "PRIMARY KEY (key, day))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def _take(self, key: str, rate: float, burst: int, cost: float) -> float:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(*row, now, rate, burst) if row else float(burst)
+            retry_after = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                retry_after = (cost - tokens) / rate
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)", (key, tokens, now))
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM buckets WHERE updated_at < ?", (now - 86400,))
+            conn.execute("COMMIT")
+            return retry_after
+        finally:
+            conn.close()
+
+    def _usage(self, key: str, day: str) -> int:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT used FROM usage WHERE key = ? AND day = ?", (key, day)).fetchone()
+        return row[0] if row else 0
+
+    def _add_usage(self, key: str, day: str, amount: int) -> int:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO usage (key, day, used) VALUES (?, ?, ?) "
+                "ON CONFLICT (key, day) DO UPDATE SET used = used + excluded.used",
+                (key, day, amount)
+            )
+            used = conn.execute("SELECT used FROM usage WHERE key = ? AND day = ?", (key, day)).fetchone()[0]
+            conn.execute("DELETE FROM usage WHERE day < ?", (day,))
+            conn.execute("COMMIT")
+            return used
+        finally:
+            conn.close()
+
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        return await asyncio.to_thread(self._take, key, rate, burst, cost)
+
+    async def usage(self, key: str, day: str) -> int:
+        return await asyncio.to_thread(self._usage, key, day)
+
+    async def add_usage(self, key: str, day: str, amount: int) -> int:
+        return await asyncio.to_thread(self._add_usage, key, day, amount)
+
+
+class RateLimiter:
+    """
+    Token buckets for REST requests (per client IP and per user) and chat turns
+    (per user), and a daily quota of LLM tokens per user.
+
+    The quota is checked before a turn starts and charged afterwards with the
+    turn's real prompt and completion sizes, so the turn that crosses it still
+    completes and the next one is rejected. Every check raises
+    RateLimitExceeded with the time after which a retry can succeed.
+    """
+
+    def __init__(self, backend: RateLimitBackend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.checked = 0
+        self.rejected = 0
+        self.tokens_charged = 0
+
+    async def _take(self, scope: str, key: str, per_minute: int, burst: int):
+        if per_minute <= 0:
+            return
+        self.checked += 1
+        retry_after = await self.backend.take(f"{scope}:{key}", per_minute / 60, max(burst, 1))
+        if retry_after > 0:
+            self._reject(scope)
+            raise RateLimitExceeded(scope, retry_after)
+
+    def _reject(self, scope: str):
+        self.rejected += 1
+        rate_limit_rejections.inc(scope=scope)
+
+    async def check_request(self, ip: Optional[str], user_id: Optional[str]):
+        """One REST request from `ip`, authenticated as `user_id` (None when unknown)"""
+        if not self.enabled:
+            return
+        if ip:
+            await self._take("ip", ip, settings.RATE_LIMIT_IP_PER_MINUTE, settings.RATE_LIMIT_IP_BURST)
+        if user_id:
+            await self._take("user", user_id, settings.RATE_LIMIT_USER_PER_MINUTE, settings.RATE_LIMIT_USER_BURST)
+
+    async def check_turn(self, user_id: str):
+        """One chat turn (one LLM call) of `user_id`"""
+        if not self.enabled:
+            return
+        quota = settings.RATE_LIMIT_DAILY_TOKENS
+        if quota > 0 and await self.backend.usage(f"tokens:{user_id}", _utc_day()) >= quota:
+            self._reject("daily_tokens")
+            raise RateLimitExceeded("daily_tokens", _seconds_until_next_day())
+        await self._take("turn", user_id, settings.RATE_LIMIT_TURNS_PER_MINUTE, settings.RATE_LIMIT_TURN_BURST)
+
+    async def charge_tokens(self, user_id: str, tokens: int):
+        """Count the prompt + completion tokens of a finished LLM call against the daily quota"""
+        if not self.enabled or settings.RATE_LIMIT_DAILY_TOKENS <= 0 or tokens <= 0:
+            return
+        self.tokens_charged += tokens
+        await self.backend.add_usage(f"tokens:{user_id}", _utc_day(), tokens)
+
+    async def daily_usage(self, user_id: str) -> Tuple[int, int]:
+        """(tokens used today, daily quota) of `user_id`"""
+        return await self.backend.usage(f"tokens:{user_id}", _utc_day()), settings.RATE_LIMIT_DAILY_TOKENS
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "checked": self.checked,
+            "rejected": self.rejected,
+            "tokens_charged": self.tokens_charged,
+        }
+
+
+def create_rate_limit_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        rates = [rate for rate in (settings.RATE_LIMIT_IP_PER_MINUTE, settings.RATE_LIMIT_USER_PER_MINUTE,
+                                   settings.RATE_LIMIT_TURNS_PER_MINUTE) if rate > 0]
+        burst = max(settings.RATE_LIMIT_IP_BURST, settings.RATE_LIMIT_USER_BURST, settings.RATE_LIMIT_TURN_BURST, 1)
+        # long enough for the slowest bucket to refill completely
+        ttl = burst / min(rates) * 60 if rates else 60
+        return MemoryRateLimitBackend(settings.RATE_LIMIT_MAX_KEYS, ttl)
+    if settings.RATE_LIMIT_BACKEND == "disk":
+        return DiskRateLimitBackend(settings.RATE_LIMIT_PATH)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND '{settings.RATE_LIMIT_BACKEND}', expected memory or disk")
+
+
+rate_limiter = RateLimiter(create_rate_limit_backend(), enabled=settings.RATE_LIMIT_ENABLED)
+
+
+def client_ip(scope) -> Optional[str]:
+    """Client address of an HTTP or websocket ASGI scope"""
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+def _token_user_id(scope) -> Optional[str]:
+    """User id (`sub`) of a valid bearer token; no database lookup"""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                payload = verify_token(token)
+                return payload.get("sub") if payload else None
+    return None
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying the per-IP and per-user buckets to every HTTP request
+    before routing, authentication or any database work, answering 429 with
+    Retry-After when one is empty. The user is taken from the bearer token's
+    signature-checked `sub` claim. /metrics is exempt.
+
+    A websocket handshake takes from the per-IP bucket and is refused (close
+    code 1013, "try again later") when it is empty; the turns on an open
+    socket are limited by the chat code.
+    """
+
+    EXEMPT_PATHS = ("/metrics",)
+
+    def __init__(self, app, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket" and self.limiter.enabled:
+            try:
+                await self.limiter.check_request(client_ip(scope), None)
+            except RateLimitExceeded:
+                await send({"type": "websocket.close", "code": 1013})
+                return
+        if scope["type"] != "http" or not self.limiter.enabled or scope["path"] in self.EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+        try:
+            await self.limiter.check_request(client_ip(scope), _token_user_id(scope))
+        except RateLimitExceeded as e:
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", e.retry_after_header.encode())],
+            })
+            await send({"type": "http.response.body", "body": json.dumps(e.to_dict()).encode()})
+            return
+        await self.app(scope, receive, send)
@@ -1,21 +1,25 @@
+import secrets
 from typing import Optional
-from fastapi import Depends, HTTPException, WebSocket, status
+from uuid import UUID
+from fastapi import Depends, Header, HTTPException, WebSocket, status
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from sqlalchemy import select
 from app.core.config import settings
+from app.core.hashing import pwd_context
 from app.api.deps import get_db
+from app.db.session import AsyncSessionLocal
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import User
+from app.schemas.user import CurrentUser
+from app.core.auth_cache import auth_user_cache
 
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 1
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
+# blocking helpers; request handlers use app.core.hashing.password_hasher instead
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -40,50 +44,59 @@ def verify_token(token: str):
         return None
     
 
-async def get_ws_current_user(websocket: WebSocket) -> Optional[User]:
-    token = websocket.query_params.get("token")
-    print("token:" , token)
-    if not token:
-        return None
+async def _resolve_user(token: str, db: Optional[AsyncSession] = None) -> Optional[CurrentUser]:
+    """
+    Decode the token and look up its user, serving repeated tokens from `auth_user_cache`.
+    `db` is only used on a cache miss; without one a short-lived session is opened.
+    """
+    cached = auth_user_cache.get(token)
+    if cached is not None:
+        return cached
 
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id = payload.get("sub")
-        print(user_id)
         if user_id is None:
             return None
-    except JWTError:
+        user_id = UUID(user_id)
+    except (JWTError, ValueError, TypeError):
         return None
 
-    # Manually get db session (can't use Depends)
-    db_gen = get_db()
-    db: AsyncSession = await db_gen.__anext__()
-    try:
-        stmt = select(User).where(User.id == user_id)
-        result = await db.execute(stmt)
-        return result.scalar_one_or_none()
-    finally:
-        await db_gen.aclose()
+    stmt = select(User).where(User.id == user_id)
+    if db is not None:
+        user = (await db.execute(stmt)).scalar_one_or_none()
+    else:
+        async with AsyncSessionLocal() as session:
+            user = (await session.execute(stmt)).scalar_one_or_none()
+    if user is None:
+        return None
+
+    current_user = CurrentUser.model_validate(user)
+    auth_user_cache.put(token, current_user, payload.get("exp"))
+    return current_user
+
+async def get_ws_current_user(websocket: WebSocket) -> Optional[CurrentUser]:
+    token = websocket.query_params.get("token")
+    if not token:
+        return None
+    return await _resolve_user(token)
     
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="user/login")
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> CurrentUser:
     """Dependency to get the current authenticated user."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except (JWTError, ValueError, TypeError):
-        raise credentials_exception
-
-    stmt = select(User).where(User.id == user_id)
-    result = await db.execute(stmt)
-    user = result.scalar_one_or_none()
+    user = await _resolve_user(token, db)
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return user
+
+async def require_internal_token(x_internal_token: Optional[str] = Header(None)):
+    """Dependency guarding /internal/*: the caller must send INTERNAL_API_TOKEN"""
+    if not settings.INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_internal_token is None or not secrets.compare_digest(x_internal_token, settings.INTERNAL_API_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid internal token")
@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional
+from app.core.config import settings
+from app.core.profiler import SamplingProfiler
+
+logger = logging.getLogger(__name__)
+
+# OTLP enum values
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+
+class Span:
+    """One timed stage of a trace; use `Tracer.span()` rather than creating it directly"""
+
+    def __init__(self, name: str, trace_id: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        # every span of the trace, in the order they finished; shared with the root
+        self.trace_spans: List["Span"] = parent.trace_spans if parent else []
+
+    @property
+    def sampled(self) -> bool:
+        return True
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self, trace_start_ns: int) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "start_offset_ms": (self.start_ns - trace_start_ns) / 1e6,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stand-in for the spans of an unsampled trace"""
+    sampled = False
+    trace_id = None
+    duration_ms = 0.0
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_error(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Any] = ContextVar("current_span", default=None)
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
+
+
+class RingBufferExporter:
+    """Keeps the last `maxsize` traces in memory for /internal/traces"""
+
+    def __init__(self, maxsize: int):
+        self._traces: Deque[dict] = deque(maxlen=maxsize)
+
+    def export(self, root: Span):
+        self._traces.append({
+            "trace_id": root.trace_id,
+            "name": root.name,
+            "duration_ms": root.duration_ms,
+            "error": root.error,
+            # root first, then the stages in the order they started
+            "spans": [span.to_dict(root.start_ns) for span in sorted(root.trace_spans, key=lambda s: s.start_ns)],
+        })
+
+    def recent(self, limit: int = 20, min_duration_ms: float = 0.0) -> List[dict]:
+        traces = [t for t in reversed(self._traces) if t["duration_ms"] >= min_duration_ms]
+        return traces[:limit]
+
+    def shutdown(self):
+        pass
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+class OTLPFileExporter:
+    """
+    Appends each finished trace to `path` as one OTLP/JSON ExportTraceServiceRequest
+    per line, the format of the OpenTelemetry Collector's file exporter. The file
+    can be loaded by its otlpjsonfile receiver or uploaded to any OTLP/HTTP endpoint
+    as is, without running a collector next to the app. Lines are written by a
+    background thread.
+    """
+
+    def __init__(self, path: str, service_name: str):
+        self.path = path
+        self.resource = {"attributes": _otlp_attributes({"service.name": service_name})}
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="otlp-file-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, root: Span):
+        spans = [{
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent.span_id if span.parent else "",
+            "name": span.name,
+            "kind": SPAN_KIND_SERVER if span.parent is None else SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": _otlp_attributes(span.attributes),
+            "status": {"code": STATUS_CODE_ERROR, "message": span.error} if span.error else {"code": STATUS_CODE_OK},
+        } for span in root.trace_spans]
+        self._queue.put({"resourceSpans": [{
+            "resource": self.resource,
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]})
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                request = self._queue.get()
+                if request is None:
+                    return
+                f.write(json.dumps(request, ensure_ascii=False, default=str) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class Tracer:
+    """
+    Minimal in-process tracer for the chat pipeline.
+
+    `span()` opens a child of the current span (tracked in a ContextVar, so it
+    follows the asyncio task), or starts a new trace when there is none. Only
+    `sample_rate` of the traces are recorded; in the others every span is
+    NOOP_SPAN and costs a ContextVar lookup. When the root span ends, the whole
+    trace is handed to each exporter.
+    """
+
+    def __init__(self, sample_rate: float, exporters: list):
+        self.sample_rate = sample_rate
+        self.exporters = exporters
+        self.traces = 0
+
+    @contextmanager
+    def span(self, name: str, force: bool = False, **attributes):
+        parent = _current_span.get()
+        if parent is NOOP_SPAN or (parent is None and not force and random.random() >= self.sample_rate):
+            if parent is None:
+                token = _current_span.set(NOOP_SPAN)
+                try:
+                    yield NOOP_SPAN
+                finally:
+                    _current_span.reset(token)
+            else:
+                yield NOOP_SPAN
+            return
+
+        span = Span(name, parent.trace_id if parent else os.urandom(16).hex(), parent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            span.trace_spans.append(span)
+            if parent is None:
+                self._export(span)
+
+    def _export(self, root: Span):
+        self.traces += 1
+        for exporter in self.exporters:
+            try:
+                exporter.export(root)
+            except Exception:
+                logger.exception("trace export failed", extra={"exporter": type(exporter).__name__})
+
+    def shutdown(self):
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+def _create_exporters() -> list:
+    exporters: list = [ring_buffer]
+    if settings.TRACE_OTLP_FILE:
+        exporters.append(OTLPFileExporter(settings.TRACE_OTLP_FILE, settings.TRACE_SERVICE_NAME))
+    return exporters
+
+
+ring_buffer = RingBufferExporter(settings.TRACE_RING_BUFFER_SIZE)
+tracer = Tracer(settings.TRACE_SAMPLE_RATE, _create_exporters())
+profiler = SamplingProfiler(settings.PROFILE_INTERVAL_MS / 1000, settings.PROFILE_DIR)
+
+
+@asynccontextmanager
+async def trace_turn(name: str, profile: bool = False, **attributes):
+    """
+    Root span of one chat turn, optionally profiled.
+
+    The turn is profiled when `profile` is set (the client asked for it: the
+    trace is then always recorded and the stacks always written) or when
+    PROFILE_SLOW_TURN_MS > 0, in which case the stacks are only written for
+    turns slower than that. The path of the written file is recorded as the
+    span's `profile.path` attribute.
+    """
+    threshold_ms = settings.PROFILE_SLOW_TURN_MS
+    with tracer.span(name, force=profile, **attributes) as span:
+        active = profiler.begin(name) if profile or threshold_ms > 0 else None
+        try:
+            yield span
+        finally:
+            if active is not None:
+                profiler.end(active)
+                if profile or active.elapsed_ms >= threshold_ms:
+                    file_name = f"{name}-{span.trace_id or 'untraced'}"
+                    path = await asyncio.to_thread(profiler.dump, active, file_name)
+                    if path:
+                        span.set_attribute("profile.path", path)
+                        logger.info("turn profile written", extra={
+                            "path": path, "duration_ms": round(active.elapsed_ms), "samples": active.samples
+                        })
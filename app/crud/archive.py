@@ -0,0 +1,423 @@
+import json
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator, List, Optional, Set
+from uuid import UUID
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.chatbot.memory_cache import memory_cache
+from app.db.session import AsyncSessionLocal
+from app.db.write_behind import message_writer
+from app.models.chat_session import PREVIEW_LENGTH, ChatSession
+from app.models.message import Message
+from app.schemas.user import CurrentUser
+from app.schemas.chat_session import ArchiveSession
+from app.schemas.message import ArchiveMessage
+
+# Archive format: gzip-compressed NDJSON. A header line, then every session,
+# then every message (ordered by session, then time), one JSON object per line:
+#   {"type": "export", "version": 1, "user_id": ..., "exported_at": ...}
+#   {"type": "session", "id": ..., "started_at": ..., "summary": ..., ...}
+#   {"type": "message", "id": ..., "session_id": ..., "sender": ..., "content": ..., "timestamp": ...}
+ARCHIVE_VERSION = 1
+
+SESSION_COLUMNS = (
+    ChatSession.id,
+    ChatSession.started_at,
+    ChatSession.ended_at,
+    ChatSession.summary,
+    ChatSession.summarized_until,
+    ChatSession.last_summarized_message_id,
+    ChatSession.message_count,
+    ChatSession.last_message_at,
+    ChatSession.last_message_preview,
+)
+MESSAGE_COLUMNS = (Message.id, Message.session_id, Message.sender, Message.content, Message.timestamp)
+
+SESSION_TIMESTAMPS = ("started_at", "ended_at", "summarized_until", "last_message_at")
+# bind parameter limit of the Postgres wire protocol
+MAX_BIND_PARAMS = 32767
+# limits on an uploaded archive, after decompression
+MAX_LINE_BYTES = 1 << 20
+MAX_ARCHIVE_BYTES = 1 << 30
+# decompressed bytes produced per zlib call
+DECOMPRESS_CHUNK = 1 << 16
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _line(record: dict) -> str:
+    return json.dumps(record, default=_json_default, ensure_ascii=False) + "\n"
+
+
+async def export_archive(current_user: CurrentUser, batch_size: int = 1000) -> AsyncIterator[bytes]:
+    """
+    Every session and message of the user as a gzip-compressed NDJSON stream.
+
+    Both tables are read through server-side cursors `batch_size` rows at a
+    time, and each batch is compressed and sent before the next one is read,
+    so memory use does not depend on how much history the user has.
+    """
+    # turns still queued for write-behind belong in the archive
+    await message_writer.flush_user(current_user.id)
+    user_id = current_user.id
+
+    sessions = (select(*SESSION_COLUMNS)
+                .where(ChatSession.user_id == user_id)
+                .order_by(ChatSession.id)
+                .execution_options(yield_per=batch_size))
+    messages = (select(*MESSAGE_COLUMNS)
+                .join(ChatSession, Message.session_id == ChatSession.id)
+                .where(ChatSession.user_id == user_id)
+                .order_by(Message.session_id, Message.timestamp, Message.id)
+                .execution_options(yield_per=batch_size))
+
+    async def chunks():
+        # wbits=31: gzip container
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        yield compressor.compress(_line({
+            "type": "export",
+            "version": ARCHIVE_VERSION,
+            "user_id": user_id,
+            "exported_at": datetime.now(timezone.utc),
+        }).encode())
+        # the request-scoped session is closed before a streaming body runs
+        async with AsyncSessionLocal() as db:
+            for record_type, stmt in (("session", sessions), ("message", messages)):
+                result = await db.stream(stmt)
+                async for partition in result.partitions():
+                    text = "".join(_line({"type": record_type, **row._mapping}) for row in partition)
+                    compressed = compressor.compress(text.encode())
+                    if compressed:
+                        yield compressed
+        yield compressor.flush()
+
+    return chunks()
+
+
+class _LineSplitter:
+    """
+    Splits decompressed bytes into lines, refusing lines over `max_line` bytes
+    and more than `max_total` bytes overall (None = no limit)
+    """
+
+    def __init__(self, max_line: int, max_total: Optional[int]):
+        self.max_line = max_line
+        self.max_total = max_total
+        self.total = 0
+        self.pending = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        self.total += len(data)
+        if self.max_total is not None and self.total > self.max_total:
+            raise ValueError(f"archive is larger than {self.max_total} bytes uncompressed")
+        # only the new bytes can hold the next newline
+        search_from = len(self.pending)
+        self.pending += data
+        lines = []
+        start = 0
+        while True:
+            end = self.pending.find(b"\n", search_from)
+            if end < 0:
+                break
+            lines.append(bytes(self.pending[start:end]))
+            start = search_from = end + 1
+        del self.pending[:start]
+        if len(self.pending) > self.max_line or any(len(line) > self.max_line for line in lines):
+            raise ValueError(f"line longer than {self.max_line} bytes")
+        return lines
+
+
+async def _decompressed_lines(body: AsyncIterable[bytes],
+                              max_line: int = MAX_LINE_BYTES,
+                              max_total: Optional[int] = MAX_ARCHIVE_BYTES) -> AsyncIterator[str]:
+    """
+    Lines of a gzip (or plain) NDJSON byte stream, decoded incrementally.
+
+    The gzip stream is inflated at most DECOMPRESS_CHUNK bytes at a time, so a
+    small upload cannot expand into one huge buffer before the limits apply.
+    """
+    decompressor = None
+    splitter = _LineSplitter(max_line, max_total)
+    head = b""
+    async for chunk in body:
+        if decompressor is None:
+            # the first two bytes decide, however the body happens to be chunked
+            head += chunk
+            if len(head) < 2:
+                continue
+            # gzip magic number; anything else is taken as uncompressed NDJSON
+            decompressor = zlib.decompressobj(47) if head[:2] == b"\x1f\x8b" else False
+            chunk = head
+        data = decompressor.decompress(chunk, DECOMPRESS_CHUNK) if decompressor else chunk
+        while True:
+            for line in splitter.feed(data):
+                if line.strip():
+                    yield line.decode()
+            if not decompressor or not decompressor.unconsumed_tail:
+                break
+            data = decompressor.decompress(decompressor.unconsumed_tail, DECOMPRESS_CHUNK)
+    if decompressor is None:
+        # a body shorter than the magic number
+        splitter.feed(head)
+    if decompressor:
+        for line in splitter.feed(decompressor.flush()):
+            if line.strip():
+                yield line.decode()
+    if splitter.pending.strip():
+        yield splitter.pending.decode()
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC; offsets in the archive are converted"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _validate(model: type, record: dict) -> BaseModel:
+    try:
+        return model.model_validate(record)
+    except ValidationError as e:
+        error = e.errors()[0]
+        field = ".".join(str(part) for part in error["loc"])
+        raise ValueError(f"{record.get('type')} record, {field}: {error['msg']}") from None
+
+
+def _session_row(record: dict, user_id: UUID) -> dict:
+    session = _validate(ArchiveSession, record)
+    row = {column.key: getattr(session, column.key) for column in SESSION_COLUMNS}
+    for key in SESSION_TIMESTAMPS:
+        row[key] = _naive_utc(row[key])
+    row["last_message_at"] = (row["last_message_at"] or row["started_at"]
+                              or datetime.now(timezone.utc).replace(tzinfo=None))
+    # archives are always imported into the importing user's account
+    row["user_id"] = user_id
+    return row
+
+
+def _message_row(record: dict) -> dict:
+    message = _validate(ArchiveMessage, record)
+    return {
+        "id": message.id,
+        "session_id": message.session_id,
+        "sender": message.sender,
+        "content": message.content.model_dump(),
+        "timestamp": _naive_utc(message.timestamp),
+    }
+
+
+@dataclass
+class ImportResult:
+    sessions: int = 0
+    messages: int = 0
+    # already present (same id), not overwritten
+    skipped_sessions: int = 0
+    skipped_messages: int = 0
+    # messages of sessions owned by somebody else, or missing from the archive
+    rejected_messages: int = 0
+    seconds: float = 0.0
+
+    def report(self) -> dict:
+        rows = self.sessions + self.messages + self.skipped_sessions + self.skipped_messages
+        return {
+            "sessions": self.sessions,
+            "messages": self.messages,
+            "skipped_sessions": self.skipped_sessions,
+            "skipped_messages": self.skipped_messages,
+            "rejected_messages": self.rejected_messages,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(rows / self.seconds) if self.seconds else 0,
+        }
+
+
+class ArchiveImporter:
+    """
+    Bulk-loads an archive from `export_archive()` into one user's account.
+
+    Rows are written `batch_size` at a time as multi-row INSERT ... ON CONFLICT
+    DO NOTHING statements built from plain dicts (no ORM objects), one
+    transaction per batch. With `method="copy"` each batch is COPYed into a
+    temporary table instead and moved over with a single INSERT ... SELECT,
+    which is faster for large archives. Rows whose id already exists are
+    skipped, so importing an archive twice is harmless. A message is only
+    imported into a session the user owns, and the activity counters of the
+    sessions that got messages are recomputed in the same transaction.
+
+    Every record is validated before it is written, and lines longer than
+    MAX_LINE_BYTES or archives over `max_bytes` (uncompressed; None = no
+    limit) are refused; all of these raise ValueError.
+    """
+
+    def __init__(self, db: AsyncSession, user_id: UUID, batch_size: int = 5000, method: str = "insert",
+                 max_bytes: Optional[int] = MAX_ARCHIVE_BYTES):
+        if method not in ("insert", "copy"):
+            raise ValueError(f"Unknown import method '{method}', expected insert or copy")
+        self.db = db
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.method = method
+        self.max_bytes = max_bytes
+        self.result = ImportResult()
+        # sessions of the archive that belong to the importing user
+        self.owned: Set[UUID] = set()
+
+    async def run(self, body: AsyncIterable[bytes]) -> ImportResult:
+        start = time.perf_counter()
+        sessions: List[dict] = []
+        messages: List[dict] = []
+        async for line in _decompressed_lines(body, max_total=self.max_bytes):
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("every line must be a JSON object")
+            record_type = record.get("type")
+            if record_type == "export":
+                if record.get("version") != ARCHIVE_VERSION:
+                    raise ValueError(f"Unsupported archive version {record.get('version')}")
+            elif record_type == "session":
+                sessions.append(_session_row(record, self.user_id))
+                if len(sessions) >= self.batch_size:
+                    await self._write_sessions(sessions)
+                    sessions = []
+            elif record_type == "message":
+                # sessions come first in an archive; write the rest before their messages
+                if sessions:
+                    await self._write_sessions(sessions)
+                    sessions = []
+                messages.append(_message_row(record))
+                if len(messages) >= self.batch_size:
+                    await self._write_messages(messages)
+                    messages = []
+        if sessions:
+            await self._write_sessions(sessions)
+        if messages:
+            await self._write_messages(messages)
+        for session_id in self.owned:
+            memory_cache.invalidate(session_id)
+        self.result.seconds = time.perf_counter() - start
+        return self.result
+
+    async def _write_sessions(self, rows: List[dict]):
+        inserted = await self._insert(ChatSession.__table__, rows)
+        await self.db.commit()
+        self.result.sessions += inserted
+        self.result.skipped_sessions += len(rows) - inserted
+        # existing sessions only count as owned when they are the importing user's
+        owned = await self.db.execute(
+            select(ChatSession.id).where(
+                ChatSession.id.in_([row["id"] for row in rows]),
+                ChatSession.user_id == self.user_id
+            )
+        )
+        self.owned.update(owned.scalars().all())
+
+    async def _write_messages(self, rows: List[dict]):
+        allowed = [row for row in rows if row["session_id"] in self.owned]
+        self.result.rejected_messages += len(rows) - len(allowed)
+        if not allowed:
+            return
+        inserted = await self._insert(Message.__table__, allowed)
+        if inserted:
+            await self._refresh_activity({row["session_id"] for row in allowed})
+        await self.db.commit()
+        self.result.messages += inserted
+        self.result.skipped_messages += len(allowed) - inserted
+
+    async def _refresh_activity(self, session_ids: Set[UUID]):
+        """
+        Recompute the denormalized counters of sessions that got messages, as
+        migration 0004 does: sessions that already existed keep their own
+        counters (ON CONFLICT DO NOTHING), which no longer match their messages
+        """
+        stats = (
+            select(
+                Message.session_id,
+                func.count().label("message_count"),
+                func.max(Message.timestamp).label("last_message_at"),
+            )
+            .where(Message.session_id.in_(session_ids))
+            .group_by(Message.session_id)
+            .subquery()
+        )
+        last_message = (
+            select(Message.session_id, Message.content)
+            .where(Message.session_id.in_(session_ids))
+            .distinct(Message.session_id)
+            .order_by(Message.session_id, Message.timestamp.desc(), Message.id.desc())
+            .subquery()
+        )
+        await self.db.execute(
+            update(ChatSession)
+            .where(ChatSession.id == stats.c.session_id, ChatSession.id == last_message.c.session_id)
+            .values(
+                message_count=stats.c.message_count,
+                last_message_at=stats.c.last_message_at,
+                last_message_preview=func.left(last_message.c.content["text"].astext, PREVIEW_LENGTH),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    async def _insert(self, table, rows: List[dict]) -> int:
+        """Insert `rows`, skipping ids that already exist; returns how many were inserted (not committed)"""
+        if self.method == "copy":
+            inserted = await self._copy(table, rows)
+        else:
+            inserted = 0
+            # one statement can carry at most MAX_BIND_PARAMS values
+            step = MAX_BIND_PARAMS // len(rows[0])
+            for i in range(0, len(rows), step):
+                result = await self.db.execute(
+                    pg_insert(table).values(rows[i:i + step]).on_conflict_do_nothing(index_elements=["id"])
+                )
+                inserted += result.rowcount
+        return inserted
+
+    async def _copy(self, table, rows: List[dict]) -> int:
+        columns = list(rows[0])
+        staging = f"import_{table.name}"
+        connection = await self.db.connection()
+        raw = await connection.get_raw_connection()
+        asyncpg_connection = raw.driver_connection
+        await asyncpg_connection.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        # asyncpg's COPY codecs take JSON(B) as text
+        records = [
+            tuple(json.dumps(row[c]) if c in ("content", "summary") and row[c] is not None else row[c] for c in columns)
+            for row in rows
+        ]
+        await asyncpg_connection.copy_records_to_table(staging, records=records, columns=columns)
+        column_list = ", ".join(columns)
+        status = await asyncpg_connection.execute(
+            f"INSERT INTO {table.name} ({column_list}) SELECT {column_list} FROM {staging} ON CONFLICT (id) DO NOTHING"
+        )
+        # "INSERT 0 <n>"
+        return int(status.rsplit(" ", 1)[-1])
+
+
+async def import_archive(db: AsyncSession,
+                         current_user: CurrentUser,
+                         body: AsyncIterable[bytes],
+                         batch_size: int = 5000,
+                         method: str = "insert") -> dict:
+    """Import an archive uploaded by the user; batches committed before an error are kept"""
+    try:
+        result = await ArchiveImporter(db, current_user.id, batch_size, method).run(body)
+    except (ValueError, KeyError, zlib.error) as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid archive: {e}")
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error while importing: {e}")
+    return result.report()
@@ -1,54 +1,154 @@
-from fastapi.websockets import WebSocketState
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.schemas.message import MessageCreate
-from app.api.deps import get_db
-from fastapi import HTTPException, status, WebSocket, WebSocketDisconnect
-from app.models.chat_session import ChatSession
+from app.schemas.message import MessageCreate, MessageOut, MessagePage
+from app.schemas.chat_session import ChatSessionOut, ChatSessionPage, SearchHit, SearchPage
+from app.db.session import AsyncSessionLocal
+from app.db.write_behind import message_writer
+from app.crud.pagination import encode_cursor, decode_cursor, encode_rank_cursor, decode_rank_cursor
+from fastapi import HTTPException, Request, status, WebSocket, WebSocketDisconnect
+from app.models.chat_session import PREVIEW_LENGTH, ChatSession
 from app.models.message import Message
-from app.models.user import User
+from app.schemas.user import CurrentUser
 from app.core.security import get_ws_current_user
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import select
-from app.chatbot.memory import get_session_memory
+from sqlalchemy import REAL, Text, and_, case, cast, func, literal, literal_column, null, select, tuple_, union_all, update
+from app.chatbot.memory import SummaryHistory, get_session_memory
+from app.chatbot.memory_cache import memory_cache
+from app.chatbot.summarizer import summarization_worker
+from app.realtime.manager import connection_manager
 from uuid import UUID
-from app.chatbot.llm_management import llm, get_llm_response
-from langchain_core.messages import HumanMessage
-from typing import Dict, List
+from app.chatbot.llm_management import aget_llm, context_builder, get_llm_response
+from app.chatbot.scheduler import LLMQueueTimeout
+from app.core.config import settings
+from app.core.metrics import ws_connections_opened, ws_turn_duration, ws_turns
+from app.core.rate_limit import RateLimitExceeded, client_ip, rate_limiter
+from app.core.tracing import trace_turn, tracer
+from contextlib import aclosing
+import asyncio
+import json
+import logging
+import time
+from typing import Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# must match the configuration the search_vector triggers use (migration 0006)
+SEARCH_CONFIG = literal_column("'simple'::regconfig")
+SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5"
+
+async def _record_turn_activity(db: AsyncSession, session_id: UUID, last_message: Message, count: int = 2):
+    """Bump the denormalized counters of the session in the same transaction as the turn"""
+    await db.execute(
+        update(ChatSession)
+        .where(ChatSession.id == session_id)
+        .values(
+            message_count=ChatSession.message_count + count,
+            last_message_at=last_message.timestamp,
+            last_message_preview=last_message.content.get("text", "")[:PREVIEW_LENGTH]
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+async def _save_turn(db: AsyncSession,
+                     session_id: UUID,
+                     memory: SummaryHistory,
+                     user_text: str,
+                     bot_text: str,
+                     user_id: Optional[UUID] = None) -> Tuple[Message, Message]:
+    """
+    Persist the user and bot messages of one turn, bump the session counters and
+    append the turn to the cached memory, in a single transaction.
+    On a database error the transaction is rolled back, the cached memory is
+    dropped and the error re-raised.
+
+    With WRITE_BEHIND_ENABLED the turn is only queued on `message_writer` and
+    `db` is not used; `user_id`, the session owner, lets `flush_user()` find it.
+    """
+    if settings.WRITE_BEHIND_ENABLED:
+        # ids and timestamps are final now; the rows are committed in a later batch
+        user_msg, bot_msg = message_writer.new_turn(session_id, user_text, bot_text)
+        memory.save_context(user_text, bot_text, timestamp=bot_msg.timestamp, message_id=bot_msg.id)
+        with tracer.span("write_behind.enqueue"):
+            await message_writer.enqueue(session_id, (user_msg, bot_msg), user_id=user_id)
+        if memory.needs_summary():
+            summarization_worker.enqueue(session_id)
+        return user_msg, bot_msg
+
+    try:
+        user_msg = Message(session_id=session_id, sender="user", content={"text": user_text})
+        bot_msg = Message(session_id=session_id, sender="bot", content={"text": bot_text})
+        db.add_all([user_msg, bot_msg])
+        with tracer.span("db.flush"):
+            await db.flush()
+            await _record_turn_activity(db, session_id, bot_msg)
+
+        memory.save_context(user_text, bot_text, timestamp=bot_msg.timestamp, message_id=bot_msg.id)
+        with tracer.span("db.commit"):
+            await db.commit()
+    except SQLAlchemyError:
+        await db.rollback()
+        memory_cache.invalidate(session_id)
+        raise
+
+    # Summary update runs in the background worker
+    if memory.needs_summary():
+        summarization_worker.enqueue(session_id)
+    return user_msg, bot_msg
+
+async def _check_turn_limit(current_user: CurrentUser):
+    """Per-user turn bucket and daily token quota of a REST chat turn; 429 when exhausted"""
+    try:
+        await rate_limiter.check_turn(str(current_user.id))
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e),
+                            headers={"Retry-After": e.retry_after_header})
 
-active_connections: Dict[UUID, List[WebSocket]] = {}
 #websocket endpoint
 async def websocket_chat(websocket : WebSocket, session_id : UUID):
-    """websocket endpoint for realtime chat"""
+    """
+    websocket endpoint for realtime chat
+
+    No database connection is held while the socket is open: each turn leases a
+    short-lived session to load the memory, releases it while the LLM streams,
+    and leases another one to save the turn. Idle sockets therefore don't count
+    against the connection pool.
+
+    The streamed reply is broadcast to every socket subscribed to the session
+    (other tabs, devices and workers) through `connection_manager`, as
+    coalesced JSON frames tagged with the reply's message_id and a sequence
+    number (see app.realtime.stream.ReplyStream). Each socket has its own
+    bounded send queue, so a slow client never throttles the LLM stream.
+
+    A turn over the client IP's or the user's rate limit, or the daily token
+    quota, is answered on this socket only, with {"type": "error", "code": "rate_limited", "scope": ...,
+    "retry_after": seconds, "error": ...}.
+    """
     await websocket.accept()
+    ws_connections_opened.inc()
 
-    # Manually handle dependencies
-    db_gen = get_db()
-    db: AsyncSession = await db_gen.__anext__()
     try:
         current_user = await get_ws_current_user(websocket)
     except Exception as e:
+        logger.info("websocket authentication failed", extra={"session_id": str(session_id), "error": repr(e)})
         await websocket.close(code=1008)
-        await db_gen.aclose()
         return
     
     if not current_user:
         await websocket.close(code=1008)
-        await db_gen.aclose()
         return
 
-    # Confirm session ownership
-    stmt = select(ChatSession).where(ChatSession.id == session_id, ChatSession.user_id == current_user.id)
-    result = await db.execute(stmt)
-    chat_session = result.scalar_one_or_none()
+    # Confirm session ownership once; the result holds for the socket's lifetime
+    async with AsyncSessionLocal() as db:
+        stmt = select(ChatSession).where(ChatSession.id == session_id, ChatSession.user_id == current_user.id)
+        result = await db.execute(stmt)
+        chat_session = result.scalar_one_or_none()
     if not chat_session:
         await websocket.close(code=1008)
-        await db_gen.aclose()
         return
 
-    # Add connection to pool
-    if session_id not in active_connections:
-        active_connections[session_id] = []
-    active_connections[session_id].append(websocket)
+    connection = await connection_manager.connect(session_id, websocket)
+    ip = client_ip(websocket.scope)
+    # `?profile=1` profiles every turn of the socket, {"profile": true} a single one
+    profile_socket = settings.PROFILE_ON_REQUEST and websocket.query_params.get("profile") == "1"
 
     try:
         while True:
@@ -57,63 +157,91 @@ async def websocket_chat(websocket : WebSocket, session_id : UUID):
             user_text = data.get("text")
             if not user_text:
                 continue
-
-            # Load memory & context
-            memory, _ = await get_session_memory(
-                session_id=session_id,
-                db=db,
-                current_user_id=current_user.id,
-                llm_instance=llm,
-                max_token_limit=100
-            )
-            history = memory.load_memory_variables()["history"]
-            print(type(history))
-            # Generate bot response
             try:
-                response_chunks = []
-                async for rep_chunk in get_llm_response(history, user_text):
-                   if websocket.client_state != WebSocketState.CONNECTED:
-                        break
-                   await websocket.send_text(rep_chunk.content)
-                   response_chunks.append(rep_chunk.content)
-
-                full_response = "".join(response_chunks)
-            except Exception as e:
-                if websocket.client_state == WebSocketState.CONNECTED:
-                    await websocket.send_json({"error": f"LLM error: {str(e)}"})
+                await rate_limiter.check_request(ip, None)
+                await rate_limiter.check_turn(str(current_user.id))
+            except RateLimitExceeded as e:
+                # answered to this socket only, before any memory load or LLM call
+                ws_turns.inc(outcome="rate_limited")
+                connection.send(json.dumps({
+                    "type": "error",
+                    "code": "rate_limited",
+                    "scope": e.scope,
+                    "retry_after": round(e.retry_after, 3),
+                    "error": str(e),
+                }), control=True)
                 continue
+            turn_started_at = time.perf_counter()
+            profile = profile_socket or (settings.PROFILE_ON_REQUEST and bool(data.get("profile")))
 
-            # Save both messages
-            user_msg = Message(session_id=session_id, sender="user", content={"text": user_text})
-            bot_msg = Message(session_id=session_id, sender="bot", content={"text": full_response})
-            db.add_all([user_msg, bot_msg])
-            await db.flush()
+            async with trace_turn("chat.turn", profile=profile, transport="websocket",
+                                  session_id=str(session_id)) as turn_span:
+                # Load memory & context
+                with tracer.span("memory.load"):
+                    async with AsyncSessionLocal() as db:
+                        memory, _ = await get_session_memory(
+                            session_id=session_id,
+                            db=db,
+                            current_user_id=current_user.id,
+                            llm_instance=await aget_llm()
+                        )
+                with tracer.span("prompt.build") as span:
+                    context = context_builder.build(memory, user_text)
+                    span.set_attribute("prompt_tokens", context.prompt_tokens)
+                    span.set_attribute("dropped_messages", context.dropped_messages)
+                # Generate bot response
+                stream = connection_manager.open_stream(session_id)
+                try:
+                    with tracer.span("llm.stream") as span:
+                        response_chunks = []
+                        async with aclosing(get_llm_response(context, user_id=str(current_user.id))) as reply:
+                            async for rep_chunk in reply:
+                                # keep generating while any tab on this worker still listens
+                                if connection_manager.local_subscribers(session_id) == 0:
+                                    break
+                                if not response_chunks:
+                                    span.set_attribute("ttft_ms", round((time.perf_counter() - turn_started_at) * 1000, 1))
+                                await stream.write(rep_chunk.content)
+                                response_chunks.append(rep_chunk.content)
+                        span.set_attribute("chunks", len(response_chunks))
 
-            # Save to memory (summary update)
-            memory.save_context(user_text, full_response)
-            chat_session.summary = {"text": memory.summary}
-            await db.commit()
+                    full_response = "".join(response_chunks)
+                except Exception as e:
+                    ws_turns.inc(outcome="llm_error")
+                    logger.warning("llm error", extra={"session_id": str(session_id), "error": repr(e)})
+                    turn_span.set_error(e)
+                    await stream.fail(f"LLM error: {str(e)}")
+                    continue
 
-            disconnected = [
-                conn for conn in active_connections[session_id]
-                if conn.client_state != WebSocketState.CONNECTED
-            ]
-            # Clean up any disconnected clients
-            for conn in disconnected:
-                if conn in active_connections[session_id]:
-                    active_connections[session_id].remove(conn)
+                # Save both messages
+                try:
+                    with tracer.span("turn.save"):
+                        async with AsyncSessionLocal() as db:
+                            user_msg, bot_msg = await _save_turn(db, session_id, memory, user_text, full_response,
+                                                                 user_id=current_user.id)
+                except SQLAlchemyError as e:
+                    ws_turns.inc(outcome="db_error")
+                    logger.error("saving turn failed", extra={"session_id": str(session_id), "error": repr(e)})
+                    turn_span.set_error(e)
+                    await stream.fail(f"Error at saving messages: {str(e)}")
+                    continue
 
-    except WebSocketDisconnect:
-        active_connections[session_id].remove(websocket)
-        if not active_connections[session_id]:
-            del active_connections[session_id]
+                await stream.finish(
+                    user_message_id=str(user_msg.id),
+                    bot_message_id=str(bot_msg.id),
+                    usage=context.token_report()
+                )
+                ws_turns.inc(outcome="ok")
+                ws_turn_duration.observe(time.perf_counter() - turn_started_at)
 
+    except WebSocketDisconnect:
+        pass
     finally:
-        await db_gen.aclose()
+        await connection_manager.disconnect(session_id, connection)
 
 
 
-async def create_session(current_user : User,
+async def create_session(current_user : CurrentUser,
                          db: AsyncSession):
     """Create a new chat session"""
     try:
@@ -128,74 +256,187 @@ async def create_session(current_user : User,
     
 async def create_messages(session_id : UUID,
                           message: MessageCreate,
-                          current_user : User,
-                          db: AsyncSession):
-    """Process messages in a chat session"""
-    memory, chat_session = await get_session_memory(
-        session_id,
-        db,
-        current_user.id,
-        llm,
-        max_token_limit= 100
-    )
+                          current_user : CurrentUser,
+                          db: AsyncSession,
+                          profile: bool = False):
+    """Process messages in a chat session; `profile` writes a profile of the turn (see trace_turn)"""
+    await _check_turn_limit(current_user)
+    async with trace_turn("chat.turn", profile=profile, transport="rest", session_id=str(session_id)) as turn_span:
+        with tracer.span("memory.load"):
+            memory, _ = await get_session_memory(
+                session_id,
+                db,
+                current_user.id,
+                await aget_llm()
+            )
 
-    converssation_context = memory.load_memory_variables()["history"]
-    prompt_messages = [
-        HumanMessage(content= converssation_context),
-        HumanMessage(content= message.content.text)
-    ]
+        with tracer.span("prompt.build") as span:
+            context = context_builder.build(memory, message.content.text)
+            span.set_attribute("prompt_tokens", context.prompt_tokens)
+            span.set_attribute("dropped_messages", context.dropped_messages)
 
-    bot_response = ""
-    try:
-        bot_response = await get_llm_response(prompt_messages)
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"LLM error: {e}")
+        bot_response = ""
+        try:
+            with tracer.span("llm.stream") as span:
+                reply = get_llm_response(context, user_id=str(current_user.id))
+                chunks = [chunk.content async for chunk in reply]
+                span.set_attribute("chunks", len(chunks))
+            bot_response = "".join(chunks)
+        except LLMQueueTimeout as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e),
+                                headers={"Retry-After": str(int(settings.LLM_QUEUE_TIMEOUT_SECONDS))})
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"LLM error: {e}")
 
-    try:
-        user_db_message = Message(
-            session_id = session_id,
-            sender= "user",
-            content = {"text" : message.content.text}
-        )
-        db.add(user_db_message)
-        await db.flush()
+        try:
+            with tracer.span("turn.save"):
+                _, bot_db_message = await _save_turn(db, session_id, memory, message.content.text, bot_response,
+                                                     user_id=current_user.id)
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error at creating message: {e}")
 
-        bot_db_message = Message(
-            session_id = session_id,
-            sender = "bot",
-            content = {"text" : bot_response}
-        )
-        db.add(bot_db_message)
-        await db.flush()
+        turn_span.set_attribute("reply_chars", len(bot_response))
+        return bot_db_message
 
-        memory.save_context(message.content.text, bot_response)
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-        chat_session.summary = {"text" : memory.summary}
-        await db.commit()
-        await db.refresh(user_db_message)
-        return bot_db_message
-    except SQLAlchemyError as e:
-        await db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error at creating message: {e}")
+# turns saved by tasks that outlive their request; referenced until they finish
+_pending_saves: Set[asyncio.Task] = set()
+
+def _on_save_done(task: asyncio.Task):
+    _pending_saves.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("saving streamed turn failed", extra={"error": repr(task.exception())})
+
+def _save_turn_task(session_id: UUID, memory: SummaryHistory, user_text: str, bot_text: str, user_id: UUID) -> asyncio.Task:
+    """`_save_turn` in its own task and session, so the client going away cannot cancel it"""
+    async def save():
+        async with AsyncSessionLocal() as db:
+            return await _save_turn(db, session_id, memory, user_text, bot_text, user_id=user_id)
+
+    task = asyncio.create_task(save())
+    _pending_saves.add(task)
+    task.add_done_callback(_on_save_done)
+    return task
 
-async def get_sessions(db: AsyncSession, current_user: User):
-    """Retrieve all sessions of this specific user"""
+async def stream_message_events(session_id: UUID,
+                                message: MessageCreate,
+                                current_user: CurrentUser,
+                                db: AsyncSession,
+                                request: Request):
+    """
+    Same turn as `create_messages`, streamed as Server-Sent Events:
 
+        event: chunk  data: {"text": "..."}
+        event: done   data: {"user_message": MessageOut, "bot_message": MessageOut, "usage": {...}}
+        event: error  data: {"error": "..."}
+
+    The rate limit is checked and memory is loaded (and ownership checked)
+    before the response starts, so those errors are still plain HTTP errors.
+    The turn is persisted after the LLM stream ends. If the client goes away,
+    whether noticed at the next chunk or by the server cancelling or closing
+    the stream, the reply is saved up to that point, as over the websocket.
+    The save runs in its own task, so the cancellation does not reach it.
+    """
+    await _check_turn_limit(current_user)
+    memory, _ = await get_session_memory(session_id, db, current_user.id, await aget_llm())
+    user_text = message.content.text
+    context = context_builder.build(memory, user_text)
+
+    async def events():
+        response_chunks = []
+        disconnected = False
+        save: Optional[asyncio.Task] = None
+        try:
+            try:
+                async with aclosing(get_llm_response(context, user_id=str(current_user.id))) as reply:
+                    async for rep_chunk in reply:
+                        if await request.is_disconnected():
+                            disconnected = True
+                            break
+                        response_chunks.append(rep_chunk.content)
+                        yield _sse_event("chunk", {"text": rep_chunk.content})
+            except Exception as e:
+                # a failed reply is not saved
+                response_chunks = []
+                yield _sse_event("error", {"error": f"LLM error: {e}"})
+                return
+
+            if disconnected and not response_chunks:
+                return
+            save = _save_turn_task(session_id, memory, user_text, "".join(response_chunks), current_user.id)
+            try:
+                user_msg, bot_msg = await asyncio.shield(save)
+            except SQLAlchemyError as e:
+                yield _sse_event("error", {"error": f"Error at saving messages: {e}"})
+                return
+            yield _sse_event("done", {
+                "user_message": MessageOut.model_validate(user_msg).model_dump(mode="json"),
+                "bot_message": MessageOut.model_validate(bot_msg).model_dump(mode="json"),
+                "usage": context.token_report(),
+            })
+        finally:
+            # cancelled or closed mid-stream (client gone): keep what was generated;
+            # not awaited, since a cancelled body is cancelled again at every await
+            if save is None and response_chunks:
+                _save_turn_task(session_id, memory, user_text, "".join(response_chunks), current_user.id)
+
+    return events()
+
+async def get_sessions(db: AsyncSession,
+                       current_user: CurrentUser,
+                       limit: Optional[int] = 20,
+                       before: Optional[str] = None,
+                       include_summary: bool = False) -> ChatSessionPage:
+    """
+    Retrieve the sessions of this specific user, most recently active first.
+
+    Keyset-paginated on (last_message_at, id); with `limit` None every session
+    (before the cursor, if any) is returned. The summary JSONB is only read
+    when `include_summary` is set.
+    """
+
+    columns = [
+        ChatSession.id,
+        ChatSession.user_id,
+        ChatSession.started_at,
+        ChatSession.ended_at,
+        ChatSession.message_count,
+        ChatSession.last_message_at,
+        ChatSession.last_message_preview,
+    ]
+    if include_summary:
+        columns.append(ChatSession.summary)
+
+    # counters of sessions with queued write-behind turns must be up to date
+    await message_writer.flush_user(current_user.id)
     try:
-        stmt = select(ChatSession).where(ChatSession.user_id == current_user.id).order_by(ChatSession.started_at.desc())
+        stmt = select(*columns).where(ChatSession.user_id == current_user.id)
+        if before:
+            stmt = stmt.where(tuple_(ChatSession.last_message_at, ChatSession.id) < tuple_(*decode_cursor(before)))
+        stmt = stmt.order_by(ChatSession.last_message_at.desc(), ChatSession.id.desc())
+        if limit is not None:
+            # one extra row tells whether another page exists
+            stmt = stmt.limit(limit + 1)
         results = await db.execute(stmt)
-        sessions = results.scalars().all()
-        
-        return sessions
+        rows = results.all()
     
     except SQLAlchemyError as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error while fetching sessions : {e}")
+
+    page = ChatSessionPage(items=[ChatSessionOut.model_validate(row._mapping) for row in rows[:limit]])
+    if limit is not None and len(rows) > limit:
+        last = page.items[-1]
+        page.next_before = encode_cursor(last.last_message_at, last.id)
+    return page
     
 async def get_one_session(session_id : UUID,
-                           current_user : User,
+                           current_user : CurrentUser,
                            db : AsyncSession):
     """Retrive the exact session requested by specific user"""
+    await message_writer.flush_session(session_id)
     try:
         stmt = select(ChatSession).where(ChatSession.id == session_id, ChatSession.user_id == current_user.id)
         result = await db.execute(stmt)
@@ -207,23 +448,167 @@ async def get_one_session(session_id : UUID,
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error while fetching session: {e}")
     
-async def get_all_messages(session_id : UUID,
-                           current_user : User,
-                           db : AsyncSession):
-    """Retrive all messages for a specific chat session belongs to the current user"""
+async def get_messages_page(session_id : UUID,
+                            current_user : CurrentUser,
+                            db : AsyncSession,
+                            limit : Optional[int] = 50,
+                            before : Optional[str] = None,
+                            after : Optional[str] = None) -> MessagePage:
+    """
+    Keyset-paginated messages of a session belonging to the current user, ordered by (timestamp, id).
+
+    Without a cursor the most recent `limit` messages are returned; `before` walks
+    back to older pages and `after` fetches what was written since. With `limit`
+    None every message (after the cursor, if any) is returned. Items are always
+    in chronological order.
+    """
+    if before and after:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use either 'before' or 'after', not both")
+    await message_writer.flush_session(session_id)
     try:
         stmt = (select(Message)
                 .join(ChatSession, Message.session_id == ChatSession.id)
                 .where(
                     Message.session_id == session_id,
                     ChatSession.user_id == current_user.id
+                ))
+        position = tuple_(Message.timestamp, Message.id)
+
+        if after or limit is None:
+            if after:
+                stmt = stmt.where(position > tuple_(*decode_cursor(after)))
+            if before:
+                stmt = stmt.where(position < tuple_(*decode_cursor(before)))
+            stmt = stmt.order_by(Message.timestamp.asc(), Message.id.asc())
+        else:
+            if before:
+                stmt = stmt.where(position < tuple_(*decode_cursor(before)))
+            stmt = stmt.order_by(Message.timestamp.desc(), Message.id.desc())
+
+        if limit is None:
+            messages = list((await db.execute(stmt)).scalars().all())
+            has_more = False
+        else:
+            # one extra row tells whether another page exists
+            result = await db.execute(stmt.limit(limit + 1))
+            messages = list(result.scalars().all())
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+            if not after:
+                messages.reverse()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error while fetching messages {e}")
+
+    page = MessagePage(items=messages)
+    if messages:
+        oldest, newest = messages[0], messages[-1]
+        if has_more or after:
+            page.next_before = encode_cursor(oldest.timestamp, oldest.id)
+        page.next_after = encode_cursor(newest.timestamp, newest.id)
+    elif after:
+        page.next_after = after
+    return page
+
+async def stream_messages(session_id : UUID,
+                          current_user : CurrentUser,
+                          db : AsyncSession,
+                          batch_size : int = 500):
+    """
+    Stream every message of a session as NDJSON, oldest first.
+
+    Rows are read through a server-side cursor in batches of `batch_size`, so
+    memory use does not depend on the size of the session.
+    """
+    await get_one_session(session_id, current_user, db)
+
+    stmt = (select(Message.id, Message.session_id, Message.sender, Message.content, Message.timestamp)
+            .where(Message.session_id == session_id)
+            .order_by(Message.timestamp.asc(), Message.id.asc())
+            .execution_options(yield_per=batch_size))
+
+    async def rows():
+        # the request-scoped session is closed before a streaming body runs
+        async with AsyncSessionLocal() as stream_db:
+            result = await stream_db.stream(stmt)
+            async for partition in result.partitions():
+                yield "".join(
+                    MessageOut.model_validate(row._mapping).model_dump_json() + "\n"
+                    for row in partition
                 )
-        ).order_by(Message.timestamp.asc())
 
-        result = await db.execute(stmt)
-        messages = result.scalars().all()
+    return rows()
 
-        return messages
+async def search_conversations(db: AsyncSession,
+                               current_user: CurrentUser,
+                               q: str,
+                               limit: int = 20,
+                               before: Optional[str] = None) -> SearchPage:
+    """
+    Full-text search over the user's messages and session summaries, best match first.
+
+    Both sides are matched against their GIN-indexed `search_vector` and ranked
+    with ts_rank; the union is keyset-paginated on (rank, id). Snippets are
+    only computed for the rows of the page, since ts_headline re-parses the text.
+    """
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+
+    message_hits = (select(
+                        literal("message").label("kind"),
+                        Message.id.label("id"),
+                        Message.session_id.label("session_id"),
+                        Message.sender.label("sender"),
+                        Message.timestamp.label("timestamp"),
+                        func.ts_rank(Message.search_vector, query, 1).label("rank"))
+                    .join(ChatSession, Message.session_id == ChatSession.id)
+                    .where(ChatSession.user_id == current_user.id, Message.search_vector.op("@@")(query)))
+    session_hits = (select(
+                        literal("session").label("kind"),
+                        ChatSession.id.label("id"),
+                        ChatSession.id.label("session_id"),
+                        cast(null(), Text).label("sender"),
+                        ChatSession.last_message_at.label("timestamp"),
+                        func.ts_rank(ChatSession.search_vector, query, 1).label("rank"))
+                    .where(ChatSession.user_id == current_user.id, ChatSession.search_vector.op("@@")(query)))
+    hits = union_all(message_hits, session_hits).subquery("hits")
+
+    stmt = select(hits)
+    if before:
+        rank, id = decode_rank_cursor(before)
+        stmt = stmt.where(tuple_(hits.c.rank, hits.c.id) < tuple_(cast(rank, REAL), id))
+    page = stmt.order_by(hits.c.rank.desc(), hits.c.id.desc()).limit(limit + 1).cte("page")
+
+    document = case(
+        (page.c.kind == "message", Message.content["text"].astext),
+        else_=func.chat_session_summary_text(ChatSession.summary)
+    )
+    stmt = (select(page, func.ts_headline(SEARCH_CONFIG, document, query, SEARCH_HEADLINE_OPTIONS).label("snippet"))
+            .outerjoin(Message, and_(page.c.kind == "message", Message.id == page.c.id))
+            .outerjoin(ChatSession, and_(page.c.kind == "session", ChatSession.id == page.c.id))
+            .order_by(page.c.rank.desc(), page.c.id.desc()))
+
+    # turns still queued by the write-behind writer must be searchable
+    await message_writer.flush_user(current_user.id)
+    try:
+        rows = (await db.execute(stmt)).all()
     except SQLAlchemyError as e:
         await db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error while fetching messages {e}")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error while searching: {e}")
+
+    items = [
+        SearchHit(
+            kind=row.kind,
+            session_id=row.session_id,
+            message_id=row.id if row.kind == "message" else None,
+            sender=row.sender,
+            timestamp=row.timestamp,
+            rank=row.rank,
+            snippet=row.snippet,
+        )
+        for row in rows[:limit]
+    ]
+    result = SearchPage(items=items)
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        result.next_before = encode_rank_cursor(last.rank, last.id)
+    return result
@@ -0,0 +1,35 @@
+import base64
+from datetime import datetime
+from typing import Tuple
+from uuid import UUID
+from fastapi import HTTPException, status
+
+
+def encode_cursor(timestamp: datetime, id: UUID) -> str:
+    """Opaque keyset cursor for a (timestamp, id) position"""
+    raw = f"{timestamp.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(timestamp), UUID(id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+
+
+def encode_rank_cursor(rank: float, id: UUID) -> str:
+    """Opaque keyset cursor for a (rank, id) position in search results"""
+    raw = f"{rank!r}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        return float(rank), UUID(id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
@@ -6,7 +6,7 @@ from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.security import get_password_hash
+from app.core.hashing import password_hasher
 
 
 async def create_user(db: AsyncSession, user_in: UserCreate) -> User:
@@ -22,7 +22,7 @@ async def create_user(db: AsyncSession, user_in: UserCreate) -> User:
             )
 
         # Tạo user mới
-        hashed_pw = get_password_hash(user_in.password)
+        hashed_pw = await password_hasher.hash(user_in.password)
         db_user = User(
             username=user_in.username,
             email=user_in.email,
@@ -0,0 +1,66 @@
+"""
+Fill `search_vector` for rows written before migration 0006.
+
+    DATABASE_URL=postgresql+asyncpg://... python -m app.db.backfill_search \\
+        [--batch-size 2000] [--pause 0.05]
+
+Rows are walked in primary-key order and updated `--batch-size` at a time, one
+short transaction per batch, so the tables stay writable and the WAL is spread
+out. New rows are covered by the triggers from 0006, so the script can run
+while the app is serving and can be restarted at any time; rows that already
+have a vector are skipped. Run migration 0007 (the GIN indexes) afterwards.
+"""
+import argparse
+import asyncio
+import time
+from uuid import UUID
+from sqlalchemy import text
+from app.db.session import engine
+
+TABLES = {
+    "messages": "message_search_vector(content)",
+    "chat_sessions": "chat_session_search_vector(summary)",
+}
+
+
+async def backfill_table(table: str, batch_size: int, pause: float) -> int:
+    expression = TABLES[table]
+    select_ids = text(f"SELECT id FROM {table} WHERE id > :after ORDER BY id LIMIT :limit")
+    update = text(
+        f"UPDATE {table} SET search_vector = {expression} "
+        f"WHERE id = ANY(:ids) AND search_vector IS NULL"
+    )
+
+    updated = 0
+    after = UUID(int=0)
+    start = time.perf_counter()
+    while True:
+        async with engine.begin() as conn:
+            ids = (await conn.execute(select_ids, {"after": after, "limit": batch_size})).scalars().all()
+            if not ids:
+                break
+            updated += (await conn.execute(update, {"ids": list(ids)})).rowcount
+        after = ids[-1]
+        elapsed = time.perf_counter() - start
+        print(f"{table}: {updated} rows updated ({updated / elapsed:.0f} rows/s)")
+        if pause:
+            await asyncio.sleep(pause)
+
+    elapsed = time.perf_counter() - start
+    print(f"{table}: done, {updated} rows in {elapsed:.1f}s ({updated / elapsed if elapsed else 0:.0f} rows/s)")
+    return updated
+
+
+async def main(args):
+    try:
+        for table in TABLES:
+            await backfill_table(table, args.batch_size, args.pause)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between batches")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,57 @@
+"""
+Bulk-load a conversation archive (from GET /chat-session/export) into a user's account.
+
+    DATABASE_URL=postgresql+asyncpg://... python -m app.db.import_archive FILE \\
+        --user-email someone@example.com [--method copy] [--batch-size 5000]
+
+FILE is the gzip-compressed (or plain) NDJSON archive, or - for stdin. With
+--method insert (the default, also used by POST /chat-session/import) rows go
+in as multi-row INSERT ... ON CONFLICT DO NOTHING statements; with --method copy
+each batch is COPYed into a temporary table first, which is faster for large
+archives. Rows that already exist are skipped, so an interrupted import can
+simply be run again.
+"""
+import argparse
+import asyncio
+import sys
+from sqlalchemy import select
+from app.crud.archive import ArchiveImporter
+from app.db.session import AsyncSessionLocal, engine
+from app.models.user import User
+
+CHUNK_SIZE = 1 << 16
+
+
+async def _read_chunks(f):
+    while True:
+        chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def main(args):
+    f = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+    try:
+        async with AsyncSessionLocal() as db:
+            user = (await db.execute(select(User).where(User.email == args.user_email))).scalar_one_or_none()
+            if user is None:
+                sys.exit(f"No user with email {args.user_email}")
+            # no size limit for archives loaded by an operator
+            importer = ArchiveImporter(db, user.id, args.batch_size, args.method, max_bytes=None)
+            report = (await importer.run(_read_chunks(f))).report()
+        for key, value in report.items():
+            print(f"{key}: {value}")
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="archive path, or - for stdin")
+    parser.add_argument("--user-email", required=True, help="account the archive is imported into")
+    parser.add_argument("--method", choices=("insert", "copy"), default="insert")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,4 @@
+-- Messages inserted in the same transaction (user + bot of one turn) used to share
+-- CURRENT_TIMESTAMP, so their order was undefined and "newer than" queries could
+-- not tell them apart.
+ALTER TABLE messages ALTER COLUMN timestamp SET DEFAULT clock_timestamp();
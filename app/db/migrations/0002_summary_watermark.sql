@@ -0,0 +1,6 @@
+-- Watermark of the newest message folded into chat_sessions.summary, so memory
+-- loads only need the messages after it.
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS summarized_until TIMESTAMP;
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS last_summarized_message_id UUID;
+
+CREATE INDEX IF NOT EXISTS ix_messages_session_id_timestamp ON messages (session_id, timestamp);
@@ -0,0 +1,4 @@
+-- Keyset pagination orders messages by (timestamp, id); include the id tiebreaker
+-- in the index. It still serves the (session_id, timestamp) range scans.
+CREATE INDEX IF NOT EXISTS ix_messages_session_id_timestamp_id ON messages (session_id, timestamp, id);
+DROP INDEX IF EXISTS ix_messages_session_id_timestamp;
@@ -0,0 +1,29 @@
+-- Denormalized per-session activity for the session list (sorted by last activity).
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP;
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS last_message_preview TEXT;
+
+UPDATE chat_sessions s
+SET message_count = stats.message_count,
+    last_message_at = stats.last_message_at
+FROM (
+    SELECT session_id, COUNT(*) AS message_count, MAX(timestamp) AS last_message_at
+    FROM messages
+    GROUP BY session_id
+) stats
+WHERE stats.session_id = s.id;
+
+UPDATE chat_sessions s
+SET last_message_preview = LEFT(last_message.content->>'text', 120)
+FROM (
+    SELECT DISTINCT ON (session_id) session_id, content
+    FROM messages
+    ORDER BY session_id, timestamp DESC, id DESC
+) last_message
+WHERE last_message.session_id = s.id;
+
+UPDATE chat_sessions SET last_message_at = COALESCE(started_at, CURRENT_TIMESTAMP) WHERE last_message_at IS NULL;
+ALTER TABLE chat_sessions ALTER COLUMN last_message_at SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE chat_sessions ALTER COLUMN last_message_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS ix_chat_sessions_user_id_last_message_at ON chat_sessions (user_id, last_message_at);
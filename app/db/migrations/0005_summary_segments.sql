@@ -0,0 +1,18 @@
+-- chat_sessions.summary moves from one ever-growing {"text": "..."} string to
+-- {"version": 2, "segments": [...]}. An existing summary becomes a single
+-- rolled-up segment covering the summarization passes it mentions.
+UPDATE chat_sessions
+SET summary = jsonb_build_object(
+    'version', 2,
+    'segments', jsonb_build_array(jsonb_build_object(
+        'level', 1,
+        'from_n', 1,
+        'to_n', GREATEST(1, (length(summary->>'text') - length(replace(summary->>'text', 'Tóm tắt lần', '')))
+                            / length('Tóm tắt lần')),
+        'text', btrim(summary->>'text'),
+        'tokens', NULL
+    ))
+)
+WHERE summary ? 'text' AND NOT summary ? 'segments' AND btrim(summary->>'text') <> '';
+
+UPDATE chat_sessions SET summary = NULL WHERE summary ? 'text' AND NOT summary ? 'segments';
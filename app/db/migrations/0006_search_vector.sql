@@ -0,0 +1,65 @@
+-- Full-text search over message text and session summaries (GET /chat-session/search).
+-- Text is indexed with the 'simple' configuration: there is no Vietnamese
+-- dictionary, so words are lower-cased but not stemmed.
+--
+-- Adding the nullable columns is instant. Existing rows are filled afterwards in
+-- batches by `python -m app.db.backfill_search`, then 0007 builds the GIN indexes.
+
+-- content->>'text' has to be JSONB for the functions below; script_database.sql
+-- already creates it that way, older databases may still have JSON (table rewrite).
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'messages' AND column_name = 'content') = 'json' THEN
+        ALTER TABLE messages ALTER COLUMN content TYPE JSONB USING content::jsonb;
+    END IF;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION message_search_vector(content JSONB) RETURNS tsvector
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT to_tsvector('simple', coalesce(content->>'text', ''))
+$$;
+
+CREATE OR REPLACE FUNCTION chat_session_summary_text(summary JSONB) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT coalesce(
+        (SELECT string_agg(segment->>'text', E'\n') FROM jsonb_array_elements(summary->'segments') segment),
+        summary->>'text',
+        ''
+    )
+$$;
+
+CREATE OR REPLACE FUNCTION chat_session_search_vector(summary JSONB) RETURNS tsvector
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT to_tsvector('simple', chat_session_summary_text(summary))
+$$;
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector;
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION messages_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := message_search_vector(NEW.content);
+    RETURN NEW;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION chat_sessions_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := chat_session_search_vector(NEW.summary);
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS messages_search_vector_update ON messages;
+CREATE TRIGGER messages_search_vector_update
+    BEFORE INSERT OR UPDATE OF content ON messages
+    FOR EACH ROW EXECUTE FUNCTION messages_search_vector_trigger();
+
+DROP TRIGGER IF EXISTS chat_sessions_search_vector_update ON chat_sessions;
+CREATE TRIGGER chat_sessions_search_vector_update
+    BEFORE INSERT OR UPDATE OF summary ON chat_sessions
+    FOR EACH ROW EXECUTE FUNCTION chat_sessions_search_vector_trigger();
@@ -0,0 +1,4 @@
+-- Run after `python -m app.db.backfill_search` has filled the search vectors.
+-- CONCURRENTLY keeps the tables writable; it cannot run inside a transaction block.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_search_vector ON messages USING gin (search_vector);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_sessions_search_vector ON chat_sessions USING gin (search_vector);
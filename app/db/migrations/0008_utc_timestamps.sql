@@ -0,0 +1,15 @@
+-- Every TIMESTAMP column holds naive UTC. Write-behind (app.db.write_behind) assigns
+-- message timestamps in the app as UTC, so the database defaults must produce UTC
+-- too, whatever the server's TimeZone setting; otherwise rows from both sources
+-- compare wrongly against each other and against the summarized_until /
+-- last_message_at watermarks.
+ALTER TABLE messages ALTER COLUMN timestamp SET DEFAULT (clock_timestamp() AT TIME ZONE 'UTC');
+ALTER TABLE chat_sessions ALTER COLUMN started_at SET DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC');
+ALTER TABLE chat_sessions ALTER COLUMN last_message_at SET DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC');
+ALTER TABLE users ALTER COLUMN created_at SET DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC');
+
+-- Rows written by the old defaults on a server whose TimeZone is not UTC are in
+-- server-local time. If that applies (and write-behind was never enabled, since its
+-- rows are already UTC), convert them once, e.g.:
+--   UPDATE messages SET timestamp = timestamp AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC';
+-- and likewise for chat_sessions.started_at, last_message_at and summarized_until.
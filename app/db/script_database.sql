@@ -13,28 +13,87 @@ CREATE TABLE users (
     username TEXT NOT NULL unique,
     email TEXT NOT NULL UNIQUE,
     hash_password TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
 );
 
 -- Table: chat_sessions
 CREATE TABLE chat_sessions (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
     user_id UUID REFERENCES users(id) ON DELETE SET NULL,
-	summary JSONB,
-    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+	summary JSONB, -- {"version": 2, "segments": [...]}, see app/chatbot/memory.py
+    -- every timestamp is naive UTC, whatever the server's TimeZone (migration 0008)
+    started_at TIMESTAMP DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
     ended_at TIMESTAMP,
-    title text
+    title text,
+    summarized_until TIMESTAMP,
+    last_summarized_message_id UUID,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    last_message_at TIMESTAMP NOT NULL DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+    last_message_preview TEXT,
+    search_vector tsvector -- set by chat_sessions_search_vector_update
 );
 
+CREATE INDEX ix_chat_sessions_user_id_last_message_at ON chat_sessions (user_id, last_message_at);
+CREATE INDEX ix_chat_sessions_search_vector ON chat_sessions USING gin (search_vector);
+
 -- Table: messages
 CREATE TABLE messages (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
     session_id UUID REFERENCES chat_sessions(id) ON DELETE CASCADE,
     sender TEXT CHECK (sender IN ('user', 'bot')) NOT NULL,
     content JSONB NOT NULL,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    -- clock_timestamp() so user/bot rows written in one transaction stay ordered
+    timestamp TIMESTAMP DEFAULT (clock_timestamp() AT TIME ZONE 'UTC'),
+    search_vector tsvector -- set by messages_search_vector_update
 );
 
+CREATE INDEX ix_messages_session_id_timestamp_id ON messages (session_id, timestamp, id);
+CREATE INDEX ix_messages_search_vector ON messages USING gin (search_vector);
+
+-- Full-text search ('simple' configuration: lower-cased, not stemmed)
+CREATE OR REPLACE FUNCTION message_search_vector(content JSONB) RETURNS tsvector
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT to_tsvector('simple', coalesce(content->>'text', ''))
+$$;
+
+CREATE OR REPLACE FUNCTION chat_session_summary_text(summary JSONB) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT coalesce(
+        (SELECT string_agg(segment->>'text', E'\n') FROM jsonb_array_elements(summary->'segments') segment),
+        summary->>'text',
+        ''
+    )
+$$;
+
+CREATE OR REPLACE FUNCTION chat_session_search_vector(summary JSONB) RETURNS tsvector
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT to_tsvector('simple', chat_session_summary_text(summary))
+$$;
+
+CREATE OR REPLACE FUNCTION messages_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := message_search_vector(NEW.content);
+    RETURN NEW;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION chat_sessions_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := chat_session_search_vector(NEW.summary);
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER messages_search_vector_update
+    BEFORE INSERT OR UPDATE OF content ON messages
+    FOR EACH ROW EXECUTE FUNCTION messages_search_vector_trigger();
+
+CREATE TRIGGER chat_sessions_search_vector_update
+    BEFORE INSERT OR UPDATE OF summary ON chat_sessions
+    FOR EACH ROW EXECUTE FUNCTION chat_sessions_search_vector_trigger();
+
 -- Table: intents
 CREATE TABLE intents (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
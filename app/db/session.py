@@ -1,8 +1,24 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.db.stats import InstrumentedAsyncPool, InstrumentedAsyncSession, query_stats
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
-AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+connect_args = {}
+if make_url(settings.DATABASE_URL).get_driver_name() == "asyncpg":
+    connect_args["prepared_statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
 
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DB_ECHO,
+    poolclass=InstrumentedAsyncPool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args=connect_args,
+)
+query_stats.attach(engine.sync_engine)
+AsyncSessionLocal = sessionmaker(bind=engine, class_=InstrumentedAsyncSession, expire_on_commit=False)
 
@@ -0,0 +1,113 @@
+import time
+from typing import Dict, List
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.core.metrics import LATENCY_BUCKETS_MS, Histogram, db_commit_duration
+
+MAX_TRACKED_STATEMENTS = 200
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_wait = Histogram("db_pool_checkout_wait_ms", "Pool checkout wait", buckets=LATENCY_BUCKETS_MS)
+        self.checkout_errors = 0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except Exception:
+            self.checkout_errors += 1
+            raise
+        finally:
+            self.checkout_wait.observe((time.perf_counter() - start) * 1000)
+
+    def recreate(self):
+        # keep the counters across pool recreation (e.g. after a disconnect)
+        pool = super().recreate()
+        pool.checkout_wait = self.checkout_wait
+        pool.checkout_errors = self.checkout_errors
+        return pool
+
+
+class InstrumentedAsyncSession(AsyncSession):
+    """AsyncSession that records commit latency in `db_commit_duration_seconds`"""
+
+    async def commit(self):
+        start = time.perf_counter()
+        try:
+            await super().commit()
+        finally:
+            db_commit_duration.observe(time.perf_counter() - start)
+
+
+def _query_histogram() -> Histogram:
+    return Histogram("db_query_duration_ms", "Statement execution time", buckets=LATENCY_BUCKETS_MS)
+
+
+class QueryStats:
+    """Per-statement timing histograms collected from engine cursor events"""
+
+    def __init__(self):
+        self.statements: Dict[str, Histogram] = {}
+        self.all_queries = _query_histogram()
+
+    def attach(self, engine: Engine):
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "handle_error", self._error)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _error(self, context):
+        # a failed statement never reaches after_cursor_execute; drop its start time
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        self.all_queries.observe(elapsed_ms)
+        # statements are parameterized, so their text is a small, bounded set
+        key = " ".join(statement.split())[:200]
+        histogram = self.statements.get(key)
+        if histogram is None:
+            if len(self.statements) >= MAX_TRACKED_STATEMENTS:
+                return
+            histogram = self.statements[key] = _query_histogram()
+        histogram.observe(elapsed_ms)
+
+    def snapshot(self, top: int = 20) -> dict:
+        slowest: List = sorted(self.statements.items(), key=lambda item: item[1].snapshot()["sum"], reverse=True)[:top]
+        return {
+            "all": self.all_queries.snapshot(),
+            "by_statement": [{"statement": statement, **histogram.snapshot()} for statement, histogram in slowest],
+        }
+
+
+query_stats = QueryStats()
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    stats = {
+        "pool_class": type(pool).__name__,
+        "status": pool.status(),
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": pool.overflow(),
+        })
+    if isinstance(pool, InstrumentedAsyncPool):
+        stats["checkout_errors"] = pool.checkout_errors
+        stats["checkout_wait"] = pool.checkout_wait.snapshot()
+    return stats
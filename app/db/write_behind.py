@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import bindparam, insert, update
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.core.metrics import LATENCY_BUCKETS_MS, Histogram
+from app.chatbot.memory_cache import memory_cache
+from app.models.chat_session import PREVIEW_LENGTH, ChatSession
+from app.models.message import Message
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingTurn:
+    session_id: UUID
+    messages: Tuple[Message, Message]
+    done: asyncio.Future
+    user_id: Optional[UUID] = None
+
+
+class MessageWriter:
+    """
+    Write-behind persistence of chat turns (WRITE_BEHIND_ENABLED).
+
+    `enqueue()` returns as soon as the turn is queued. A single flusher task
+    writes everything queued, across all sessions, in one transaction: one
+    multi-row INSERT for the messages and one executemany UPDATE for the session
+    counters. It runs once `max_batch` turns are waiting or `max_delay` seconds
+    after the first one. There is one flusher and batches keep queue order, so
+    turns of a session are committed in the order they were sent.
+
+    Message ids and timestamps are assigned here rather than by the database.
+    Timestamps are naive UTC like the database defaults (migration 0008), and
+    strictly increasing per session within this process only: turns of one
+    session written by two workers at once can interleave by clock skew, so
+    readers order by (timestamp, id) and never by timestamp alone. Readers call
+    `flush_session()` / `flush_user()` first, so a session always reads its own writes.
+
+    A failed batch is retried `max_retries` times and then dropped; those turns
+    are lost, which is the price of not waiting for the commit.
+    """
+
+    def __init__(self, max_batch: int, max_delay: float, max_pending: int, max_retries: int = 3):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self._queue: List[_PendingTurn] = []
+        self._last_by_session: Dict[UUID, asyncio.Future] = {}
+        self._last_by_user: Dict[UUID, asyncio.Future] = {}
+        self._last_done: Optional[asyncio.Future] = None
+        self._last_timestamp: Dict[UUID, datetime] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_now = asyncio.Event()
+        self._room = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.turns = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.dropped_turns = 0
+        self.max_batch_seen = 0
+        self.batch_latency = Histogram("write_behind_batch_ms", "Batch write latency", buckets=LATENCY_BUCKETS_MS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write out everything still queued, then stop the flusher"""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _next_timestamp(self, session_id: UUID) -> datetime:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        last = self._last_timestamp.get(session_id)
+        if last is not None and now <= last:
+            now = last + timedelta(microseconds=1)
+        self._last_timestamp[session_id] = now
+        return now
+
+    def new_turn(self, session_id: UUID, user_text: str, bot_text: str) -> Tuple[Message, Message]:
+        """Transient user/bot messages with their final id and timestamp"""
+        return (
+            Message(id=uuid.uuid4(), session_id=session_id, sender="user",
+                    content={"text": user_text}, timestamp=self._next_timestamp(session_id)),
+            Message(id=uuid.uuid4(), session_id=session_id, sender="bot",
+                    content={"text": bot_text}, timestamp=self._next_timestamp(session_id)),
+        )
+
+    async def enqueue(
+        self,
+        session_id: UUID,
+        messages: Tuple[Message, Message],
+        user_id: Optional[UUID] = None
+    ) -> asyncio.Future:
+        """
+        Queue a turn built by `new_turn()`; the returned future resolves once it is
+        committed. `user_id` (the session owner) lets `flush_user()` find the turn.
+        """
+        while len(self._queue) >= self.max_pending:
+            # backpressure: the flusher is behind, wait for it instead of growing without bound
+            self._room.clear()
+            self._flush_now.set()
+            self._wakeup.set()
+            await self._room.wait()
+        done = asyncio.get_running_loop().create_future()
+        self._queue.append(_PendingTurn(session_id, messages, done, user_id))
+        self._last_by_session[session_id] = done
+        if user_id is not None:
+            self._last_by_user[user_id] = done
+        self._last_done = done
+        self.turns += 1
+        if len(self._queue) >= self.max_batch:
+            self._flush_now.set()
+        self._wakeup.set()
+        return done
+
+    def pending(self, session_id: UUID) -> bool:
+        return session_id in self._last_by_session
+
+    async def flush_session(self, session_id: UUID):
+        """Wait until every queued turn of the session is committed"""
+        done = self._last_by_session.get(session_id)
+        if done is None:
+            return
+        self._flush_now.set()
+        self._wakeup.set()
+        # a dropped batch is not the reader's error: it reads what did reach the DB
+        await asyncio.wait([done])
+
+    async def flush_user(self, user_id: UUID):
+        """
+        Wait until every queued turn of the user's sessions is committed; for reads
+        across all of a user's sessions (session list, search, export)
+        """
+        done = self._last_by_user.get(user_id)
+        if done is None:
+            return
+        self._flush_now.set()
+        self._wakeup.set()
+        # batches are written in queue order, so the user's last turn commits last
+        await asyncio.wait([done])
+
+    async def flush(self):
+        """Wait until everything queued so far is committed"""
+        done = self._last_done
+        if done is None or done.done():
+            return
+        self._flush_now.set()
+        self._wakeup.set()
+        if self._task is None:
+            # not started (or already stopped): write inline
+            await self._write_pending()
+        else:
+            await asyncio.wait([done])
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._queue:
+                continue
+            if not self._flush_now.is_set():
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            await self._write_pending()
+
+    async def _write_pending(self):
+        self._flush_now.clear()
+        while self._queue:
+            batch = self._queue[:self.max_batch]
+            del self._queue[:len(batch)]
+            self._room.set()
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch: List[_PendingTurn]):
+        start = time.perf_counter()
+        error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._insert(batch)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                self.failed_batches += 1
+                await asyncio.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+        self.batches += 1
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        self.batch_latency.observe((time.perf_counter() - start) * 1000)
+        if error is not None:
+            self.dropped_turns += len(batch)
+            logger.error("write-behind batch dropped", extra={"turns": len(batch), "error": repr(error)})
+            # cached memories contain turns that never reached the database
+            for session_id in {turn.session_id for turn in batch}:
+                memory_cache.invalidate(session_id)
+
+        for turn in batch:
+            if error is None:
+                turn.done.set_result(None)
+            else:
+                turn.done.set_exception(error)
+                # nobody may be waiting on this turn
+                turn.done.exception()
+            if self._last_by_session.get(turn.session_id) is turn.done:
+                del self._last_by_session[turn.session_id]
+                self._last_timestamp.pop(turn.session_id, None)
+            if turn.user_id is not None and self._last_by_user.get(turn.user_id) is turn.done:
+                del self._last_by_user[turn.user_id]
+
+    async def _insert(self, batch: List[_PendingTurn]):
+        rows = []
+        activity: Dict[UUID, dict] = {}
+        for turn in batch:
+            for message in turn.messages:
+                rows.append({
+                    "id": message.id,
+                    "session_id": message.session_id,
+                    "sender": message.sender,
+                    "content": message.content,
+                    "timestamp": message.timestamp,
+                })
+            last = turn.messages[-1]
+            counters = activity.setdefault(turn.session_id, {"b_id": turn.session_id, "b_count": 0})
+            counters["b_count"] += len(turn.messages)
+            counters["b_last_at"] = last.timestamp
+            counters["b_preview"] = last.content.get("text", "")[:PREVIEW_LENGTH]
+
+        sessions = ChatSession.__table__
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(Message), rows)
+            await db.execute(
+                update(sessions)
+                .where(sessions.c.id == bindparam("b_id"))
+                .values(
+                    message_count=sessions.c.message_count + bindparam("b_count"),
+                    last_message_at=bindparam("b_last_at"),
+                    last_message_preview=bindparam("b_preview")
+                ),
+                list(activity.values())
+            )
+            await db.commit()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.WRITE_BEHIND_ENABLED,
+            "queued_turns": len(self._queue),
+            "sessions_pending": len(self._last_by_session),
+            "users_pending": len(self._last_by_user),
+            "turns": self.turns,
+            "batches": self.batches,
+            "avg_batch_size": ((self.turns - len(self._queue)) / self.batches) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "failed_batches": self.failed_batches,
+            "dropped_turns": self.dropped_turns,
+            "batch_latency": self.batch_latency.snapshot(),
+        }
+
+
+message_writer = MessageWriter(
+    max_batch=settings.WRITE_BEHIND_MAX_BATCH,
+    max_delay=settings.WRITE_BEHIND_MAX_DELAY_MS / 1000,
+    max_pending=settings.WRITE_BEHIND_MAX_PENDING,
+)
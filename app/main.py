@@ -1,16 +1,69 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from app.api.routes import users
 from app.api.routes import chat_session
+from app.api.routes import internal
+from app.api.routes import metrics
+from app.chatbot import llm_management
+from app.chatbot.summarizer import summarization_worker
+from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.core.log import configure_logging, shutdown_logging
+from app.core.metrics import MetricsMiddleware
+from app.core.rate_limit import RateLimitMiddleware
+from app.core.security import require_internal_token
+from app.core.tracing import tracer
+from app.db.write_behind import message_writer
+from app.realtime.manager import connection_manager
 
 from fastapi.middleware.cors import CORSMiddleware
 
+configure_logging()
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+if settings.LLM_PRELOAD:
+    llm_management.preload()
+
+
+async def _warm_up_llm():
+    try:
+        await asyncio.to_thread(llm_management.warm_up)
+    except Exception:
+        # the first chat turn will retry and report the error to the client
+        logger.exception("LLM warm-up failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.LLM_WARMUP == "startup":
+        await asyncio.to_thread(llm_management.warm_up)
+    elif settings.LLM_WARMUP == "background":
+        # keep a reference, or the task may be garbage-collected before it finishes
+        app.state.llm_warm_up = asyncio.create_task(_warm_up_llm())
+    summarization_worker.start()
+    message_writer.start()
+    await connection_manager.start()
+    yield
+    await connection_manager.stop()
+    # queued write-behind turns are committed before the process exits
+    await message_writer.stop()
+    await summarization_worker.stop()
+    password_hasher.shutdown()
+    tracer.shutdown()
+    shutdown_logging()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",  
 ]
 
+# inside CORS, so 429s carry the CORS headers and preflights are never limited
+app.add_middleware(RateLimitMiddleware)
+
 # Add CORS middleware here
 app.add_middleware(
     CORSMiddleware,
@@ -19,7 +72,12 @@ app.add_middleware(
     allow_methods=["*"],          
     allow_headers=["*"],
 )
+# outermost, so CORS and error handling are part of the measured latency
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(users.router, prefix="/user")
 app.include_router(chat_session.router, prefix="/chat-session")
+# operational data (pool stats, traces with session ids, ...): never public
+app.include_router(internal.router, prefix="/internal", dependencies=[Depends(require_internal_token)])
+app.include_router(metrics.router)
 
@@ -1,19 +1,36 @@
-from sqlalchemy import Column, TIMESTAMP, text, ForeignKey
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, TIMESTAMP, Integer, Text, text, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 import uuid
 from app.db.base import Base
 
+# characters of the last message kept in last_message_preview (also LEFT(..., 120) in migration 0004)
+PREVIEW_LENGTH = 120
+
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions" 
+    __table_args__ = (
+        Index("ix_chat_sessions_user_id_last_message_at", "user_id", "last_message_at"),
+        Index("ix_chat_sessions_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     summary = Column(JSONB, nullable=True)
-    started_at = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+    started_at = Column(TIMESTAMP, server_default=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"))
     ended_at = Column(TIMESTAMP, nullable=True)
+    # watermark: newest message already folded into `summary`
+    summarized_until = Column(TIMESTAMP, nullable=True)
+    last_summarized_message_id = Column(UUID(as_uuid=True), nullable=True)
+    # denormalized activity, maintained as messages are written; a new session
+    # counts its creation as last activity so it sorts to the top of the list
+    message_count = Column(Integer, nullable=False, server_default=text('0'))
+    last_message_at = Column(TIMESTAMP, nullable=False, server_default=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"))
+    last_message_preview = Column(Text, nullable=True)
+    # filled by a trigger from the summary segments (migration 0006); never loaded unless asked for
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
 
     owner = relationship("User", back_populates="session")
-    messages = relationship("Message", back_populates="chat_session", cascade="all, delete-orphan")
\ No newline at end of file
+    messages = relationship("Message", back_populates="chat_session", cascade="all, delete-orphan")
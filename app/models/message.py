@@ -1,17 +1,23 @@
-from sqlalchemy import Column, TIMESTAMP, text, ForeignKey, JSON, Text
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, TIMESTAMP, text, ForeignKey, Text, Index
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, UUID
+from sqlalchemy.orm import deferred, relationship
 import uuid
 from app.db.base import Base
 
 
 class Message(Base):
     __tablename__ = "messages" 
+    __table_args__ = (
+        Index("ix_messages_session_id_timestamp_id", "session_id", "timestamp", "id"),
+        Index("ix_messages_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     session_id = Column(UUID(as_uuid=True), ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=True)
     sender = Column(Text, nullable=False) # 'user' or 'bot'
-    content = Column(JSON, nullable=False) # JSONB in PostgreSQL, will store {"text": "..."}
-    timestamp = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+    content = Column(JSONB, nullable=False) # {"text": "..."}
+    timestamp = Column(TIMESTAMP, server_default=text("(clock_timestamp() AT TIME ZONE 'UTC')"))
+    # filled by a trigger from content->>'text' (migration 0006); never loaded unless asked for
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
 
     chat_session = relationship("ChatSession", back_populates="messages")
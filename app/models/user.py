@@ -12,6 +12,6 @@ class User(Base):
     username = Column(String, nullable=False)
     email = Column(String, nullable=False, unique=True)
     hash_password = Column(String, nullable=False)
-    created_at = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+    created_at = Column(TIMESTAMP, server_default=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"))
 
     session = relationship("ChatSession", back_populates="owner")
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional, Set
+from uuid import UUID
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (session_id, payload) -> None
+MessageHandler = Callable[[UUID, dict], Awaitable[None]]
+
+
+class Backplane(ABC):
+    """
+    Fan-out channel between workers. Each worker subscribes to the chat sessions
+    it has sockets for and receives what other workers publish on them.
+    """
+
+    async def start(self, on_message: MessageHandler):
+        self._on_message = on_message
+
+    async def close(self):
+        pass
+
+    async def subscribe(self, session_id: UUID):
+        pass
+
+    async def unsubscribe(self, session_id: UUID):
+        pass
+
+    @abstractmethod
+    async def publish(self, session_id: UUID, payload: dict):
+        """Send `payload` to the other workers subscribed to `session_id`"""
+
+
+class InProcessBackplane(Backplane):
+    """Single worker: every subscriber is local, so there is nothing to forward"""
+
+    async def publish(self, session_id: UUID, payload: dict):
+        pass
+
+
+class BrokerBackplane(Backplane):
+    """
+    Client of the line-delimited JSON broker in app.realtime.broker, a local
+    stand-in for Redis/NATS pub/sub. Reconnects with backoff and restores its
+    subscriptions; messages published while disconnected are dropped.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._channels: Set[str] = set()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    async def start(self, on_message: MessageHandler):
+        await super().start(on_message)
+        self._reader_task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _send(self, frame: dict) -> bool:
+        if self._writer is None:
+            return False
+        try:
+            self._writer.write(json.dumps(frame).encode() + b"\n")
+            await self._writer.drain()
+            return True
+        except (ConnectionError, RuntimeError):
+            return False
+
+    async def subscribe(self, session_id: UUID):
+        channel = str(session_id)
+        self._channels.add(channel)
+        await self._send({"op": "sub", "channel": channel})
+
+    async def unsubscribe(self, session_id: UUID):
+        channel = str(session_id)
+        self._channels.discard(channel)
+        await self._send({"op": "unsub", "channel": channel})
+
+    async def publish(self, session_id: UUID, payload: dict):
+        if not await self._send({"op": "pub", "channel": str(session_id), "data": payload}):
+            self.dropped += 1
+
+    async def _run(self):
+        backoff = 0.1
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                backoff = 0.1
+                for channel in list(self._channels):
+                    await self._send({"op": "sub", "channel": channel})
+                while line := await reader.readline():
+                    frame = json.loads(line)
+                    await self._on_message(UUID(frame["channel"]), frame["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("backplane broker connection error", extra={"error": repr(e), "retry_in": backoff})
+            self._writer = None
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 5.0)
+
+
+def create_backplane() -> Backplane:
+    if settings.WS_BACKPLANE == "broker":
+        return BrokerBackplane(settings.WS_BROKER_HOST, settings.WS_BROKER_PORT)
+    if settings.WS_BACKPLANE == "inprocess":
+        return InProcessBackplane()
+    raise ValueError(f"Unknown WS_BACKPLANE '{settings.WS_BACKPLANE}', expected 'inprocess' or 'broker'")
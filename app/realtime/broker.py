@@ -0,0 +1,68 @@
+"""
+Minimal pub/sub broker for the websocket backplane (local stand-in for Redis).
+
+    python -m app.realtime.broker --host 127.0.0.1 --port 8765
+
+Protocol: newline-delimited JSON frames from clients,
+{"op": "sub" | "unsub", "channel": ...} and {"op": "pub", "channel": ..., "data": ...};
+subscribers receive {"channel": ..., "data": ...}.
+"""
+import argparse
+import asyncio
+import json
+from typing import Dict, Set
+
+
+class Broker:
+    def __init__(self):
+        self.channels: Dict[str, Set[asyncio.StreamWriter]] = {}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: Set[str] = set()
+        try:
+            while line := await reader.readline():
+                frame = json.loads(line)
+                channel = frame["channel"]
+                if frame["op"] == "sub":
+                    self.channels.setdefault(channel, set()).add(writer)
+                    subscribed.add(channel)
+                elif frame["op"] == "unsub":
+                    self._remove(channel, writer)
+                    subscribed.discard(channel)
+                elif frame["op"] == "pub":
+                    out = json.dumps({"channel": channel, "data": frame["data"]}).encode() + b"\n"
+                    for subscriber in list(self.channels.get(channel, ())):
+                        subscriber.write(out)
+        except (ConnectionError, json.JSONDecodeError, KeyError):
+            pass
+        finally:
+            for channel in subscribed:
+                self._remove(channel, writer)
+            writer.close()
+
+    def _remove(self, channel: str, writer: asyncio.StreamWriter):
+        subscribers = self.channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(writer)
+            if not subscribers:
+                del self.channels[channel]
+
+
+async def serve(host: str, port: int) -> asyncio.AbstractServer:
+    broker = Broker()
+    return await asyncio.start_server(broker.handle, host, port)
+
+
+async def main(host: str, port: int):
+    server = await serve(host, port)
+    print(f"Backplane broker listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port))
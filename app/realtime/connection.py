@@ -0,0 +1,99 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple
+from fastapi import WebSocket
+from fastapi.websockets import WebSocketState
+
+# websocket close code "Try Again Later", used for slow consumers
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class Connection:
+    """
+    One websocket with a bounded outgoing queue drained by its own writer task.
+
+    Producers call `send()`, which never awaits the network, so a slow client
+    cannot slow down whoever is broadcasting (e.g. the LLM read loop). When more
+    than `max_queue` data frames are waiting the `slow_consumer_policy` applies:
+    "drop" discards the frame (clients see the gap in `seq` and can reload the
+    message over REST), "disconnect" closes the socket with code 1013.
+    Control frames (done/error) are never dropped.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue: int,
+        slow_consumer_policy: str,
+        on_close: Callable[["Connection"], Awaitable[None]]
+    ):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.slow_consumer_policy = slow_consumer_policy
+        self._on_close = on_close
+        self._queue: Deque[Tuple[str, bool]] = deque()
+        self._data_frames = 0
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        # slow-consumer close scheduled by send(); kept so it is neither collected nor repeated
+        self._closing: Optional[asyncio.Task] = None
+        self.closed = False
+        self.close_code: Optional[int] = None
+        self.sent = 0
+        self.dropped = 0
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def stop(self):
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+
+    def send(self, data: str, control: bool = False) -> bool:
+        """Queue a serialized frame; False when it was dropped or the connection is gone"""
+        if self.closed or self._closing is not None:
+            return False
+        if not control and self._data_frames >= self.max_queue:
+            self.dropped += 1
+            if self.slow_consumer_policy == "disconnect":
+                self._closing = asyncio.create_task(self._close(SLOW_CONSUMER_CLOSE_CODE))
+            return False
+        self._queue.append((data, control))
+        if not control:
+            self._data_frames += 1
+        self._wakeup.set()
+        return True
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                while self._queue:
+                    data, control = self._queue.popleft()
+                    if not control:
+                        self._data_frames -= 1
+                    await self.websocket.send_text(data)
+                    self.sent += 1
+                self._wakeup.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await self._close()
+
+    async def _close(self, code: Optional[int] = None):
+        if self.closed:
+            return
+        self.closed = True
+        self.close_code = code
+        self._queue.clear()
+        if code is not None and self.websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await self.websocket.close(code=code)
+            except Exception:
+                pass
+        await self._on_close(self)
+
+    def queued(self) -> int:
+        return len(self._queue)
@@ -0,0 +1,105 @@
+import json
+import uuid
+from typing import Dict, Set
+from uuid import UUID
+from fastapi import WebSocket
+from app.core.config import settings
+from app.realtime.backplane import Backplane, create_backplane
+from app.realtime.connection import SLOW_CONSUMER_CLOSE_CODE, Connection
+from app.realtime.stream import ReplyStream
+
+
+class ConnectionManager:
+    """
+    Tracks the websockets subscribed to each chat session in this worker and
+    broadcasts frames to all of them, plus to other workers through the backplane.
+
+    Frames are serialized once and queued on each local Connection without
+    awaiting the network. The copy that comes back from the backplane carries
+    this worker's `origin` and is ignored.
+    """
+
+    def __init__(self, backplane: Backplane):
+        self.backplane = backplane
+        self.origin = uuid.uuid4().hex
+        self._connections: Dict[UUID, Set[Connection]] = {}
+        self.slow_consumer_disconnects = 0
+        self.dropped_frames = 0
+
+    async def start(self):
+        await self.backplane.start(self._on_backplane_message)
+
+    async def stop(self):
+        await self.backplane.close()
+
+    async def connect(self, session_id: UUID, websocket: WebSocket) -> Connection:
+        async def on_close(connection: Connection):
+            if connection.close_code == SLOW_CONSUMER_CLOSE_CODE:
+                self.slow_consumer_disconnects += 1
+            await self.disconnect(session_id, connection)
+
+        connection = Connection(
+            websocket,
+            max_queue=settings.WS_SEND_QUEUE_SIZE,
+            slow_consumer_policy=settings.WS_SLOW_CONSUMER_POLICY,
+            on_close=on_close
+        )
+        connection.start()
+        subscribers = self._connections.setdefault(session_id, set())
+        subscribers.add(connection)
+        if len(subscribers) == 1:
+            await self.backplane.subscribe(session_id)
+        return connection
+
+    async def disconnect(self, session_id: UUID, connection: Connection):
+        await connection.stop()
+        subscribers = self._connections.get(session_id)
+        if subscribers is None or connection not in subscribers:
+            return
+        subscribers.discard(connection)
+        self.dropped_frames += connection.dropped
+        if not subscribers:
+            del self._connections[session_id]
+            await self.backplane.unsubscribe(session_id)
+
+    def local_subscribers(self, session_id: UUID) -> int:
+        return len(self._connections.get(session_id, ()))
+
+    def open_stream(self, session_id: UUID) -> ReplyStream:
+        """Start a streamed reply whose coalesced frames go to every socket on the session"""
+        async def broadcast(frame: dict, control: bool):
+            await self.broadcast(session_id, frame, control)
+
+        return ReplyStream(
+            broadcast,
+            max_bytes=settings.WS_COALESCE_BYTES,
+            max_delay=settings.WS_COALESCE_MS / 1000
+        )
+
+    async def broadcast(self, session_id: UUID, frame: dict, control: bool = False):
+        """Send a JSON frame to every socket on the session, in every worker"""
+        data = json.dumps(frame, ensure_ascii=False)
+        self._deliver_local(session_id, data, control)
+        await self.backplane.publish(session_id, {"origin": self.origin, "data": data, "control": control})
+
+    async def _on_backplane_message(self, session_id: UUID, payload: dict):
+        if payload.get("origin") != self.origin:
+            self._deliver_local(session_id, payload["data"], payload.get("control", False))
+
+    def _deliver_local(self, session_id: UUID, data: str, control: bool):
+        for connection in list(self._connections.get(session_id, ())):
+            connection.send(data, control)
+
+    def stats(self) -> dict:
+        connections = [c for subscribers in self._connections.values() for c in subscribers]
+        return {
+            "backplane": type(self.backplane).__name__,
+            "sessions": len(self._connections),
+            "connections": len(connections),
+            "queued_frames": sum(c.queued() for c in connections),
+            "dropped_frames": self.dropped_frames + sum(c.dropped for c in connections),
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+        }
+
+
+connection_manager = ConnectionManager(create_backplane())
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import uuid
+from typing import Awaitable, Callable, List, Optional
+
+
+class ChunkCoalescer:
+    """
+    Buffers small text chunks and emits them together once `max_bytes` are
+    buffered or `max_delay` seconds have passed since the first buffered chunk.
+    """
+
+    def __init__(self, emit: Callable[[str], Awaitable[None]], max_bytes: int, max_delay: float):
+        self._emit = emit
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self._buffer: List[str] = []
+        self._size = 0
+        self._timer: Optional[asyncio.Task] = None
+
+    async def add(self, text: str):
+        if not text:
+            return
+        self._buffer.append(text)
+        self._size += len(text.encode())
+        if self._size >= self.max_bytes or self.max_delay <= 0:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._size = 0
+        await self._emit(text)
+
+
+class ReplyStream:
+    """
+    One streamed bot reply. Every frame carries the reply's `message_id` and a
+    per-reply `seq` so clients can order frames and detect dropped ones:
+
+        {"type": "chunk", "message_id": ..., "seq": 0, "text": "..."}
+        {"type": "done",  "message_id": ..., "seq": n, ...extra}
+        {"type": "error", "message_id": ..., "seq": n, "error": "..."}
+    """
+
+    def __init__(self, broadcast: Callable[[dict, bool], Awaitable[None]], max_bytes: int, max_delay: float):
+        self.message_id = str(uuid.uuid4())
+        self.started_at = time.perf_counter()
+        self._broadcast = broadcast
+        self._seq = 0
+        self._coalescer = ChunkCoalescer(self._emit_chunk, max_bytes, max_delay)
+
+    def _next_seq(self) -> int:
+        seq = self._seq
+        self._seq += 1
+        return seq
+
+    async def _emit_chunk(self, text: str):
+        await self._broadcast(
+            {"type": "chunk", "message_id": self.message_id, "seq": self._next_seq(), "text": text},
+            False
+        )
+
+    async def write(self, text: str):
+        await self._coalescer.add(text)
+
+    async def finish(self, **extra):
+        await self._coalescer.flush()
+        await self._broadcast({"type": "done", "message_id": self.message_id, "seq": self._next_seq(), **extra}, True)
+
+    async def fail(self, error: str):
+        await self._coalescer.flush()
+        await self._broadcast({"type": "error", "message_id": self.message_id, "seq": self._next_seq(), "error": error}, True)
@@ -1,7 +1,7 @@
 from uuid import UUID
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class ChatSessionBase(BaseModel):
@@ -15,6 +15,43 @@ class ChatSessionOut(ChatSessionBase):
     user_id: Optional[UUID]
     started_at: datetime
     ended_at: Optional[datetime] = None
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ChatSessionPage(BaseModel):
+    # summary is only filled in when the list is requested with include_summary
+    items: List[ChatSessionOut]
+    # pass as `before` to load the next (less recently active) page
+    next_before: Optional[str] = None
+
+class SearchHit(BaseModel):
+    # "message": a message matched; "session": the session summary matched
+    kind: Literal["message", "session"]
+    session_id: UUID
+    message_id: Optional[UUID] = None
+    sender: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    rank: float
+    # matched fragments, terms wrapped in <mark></mark>
+    snippet: str
+
+class SearchPage(BaseModel):
+    # best match first
+    items: List[SearchHit]
+    # pass as `before` to load the next (lower ranked) page
+    next_before: Optional[str] = None
+
+class ArchiveSession(ChatSessionBase):
+    """A "session" line of a conversation archive"""
+    id: UUID
+    started_at: Optional[datetime] = None
+    ended_at: Optional[datetime] = None
+    summarized_until: Optional[datetime] = None
+    last_summarized_message_id: Optional[UUID] = None
+    message_count: int = Field(0, ge=0)
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
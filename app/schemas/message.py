@@ -1,7 +1,7 @@
 from uuid import UUID
 from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 class MessageContent(BaseModel):
     text: str
@@ -16,4 +16,16 @@ class MessageOut(MessageCreate):
     timestamp: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+class MessagePage(BaseModel):
+    items: List[MessageOut]
+    # pass as `before` to load the previous (older) page; null when there is none
+    next_before: Optional[str] = None
+    # pass as `after` to poll for newer messages
+    next_after: Optional[str] = None
+
+class ArchiveMessage(MessageCreate):
+    """A "message" line of a conversation archive"""
+    id: UUID
+    session_id: UUID
+    timestamp: datetime
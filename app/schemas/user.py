@@ -24,6 +24,17 @@ class UserOut(BaseModel):
         }
 
 
+class CurrentUser(BaseModel):
+    """Lightweight authenticated user, cached per access token"""
+    id: UUID
+    username: str
+    email: str
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
+
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
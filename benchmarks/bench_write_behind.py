@@ -0,0 +1,115 @@
+"""
+Turn persistence throughput: one transaction per turn vs write-behind batches.
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_write_behind \\
+        [--sessions 200] [--turns 20] [--concurrency 20]
+
+Needs a Postgres with the app schema. A throwaway user with `--sessions` chat
+sessions is created; every session then saves `--turns` turns through
+`_save_turn`, first with WRITE_BEHIND_ENABLED off and then on. The script
+reports turns/sec as the client sees them (a write-behind turn counts once it
+is queued, the run ends when everything is committed), transactions committed
+according to pg_stat_database, and the server execution time reported by
+pg_stat_statements as a DB CPU proxy when that extension is installed.
+Everything the run created is deleted at the end.
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+from sqlalchemy import delete, text  # noqa: E402
+from app.main import app  # noqa: E402,F401  (configures every mapper)
+from app.core.config import settings  # noqa: E402
+from app.db.session import AsyncSessionLocal, engine  # noqa: E402
+from app.db.write_behind import message_writer  # noqa: E402
+from app.models.chat_session import ChatSession  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.chatbot.memory import SummaryHistory  # noqa: E402
+from app.crud.chat_session import _save_turn  # noqa: E402
+
+
+async def _db_counters() -> dict:
+    async with engine.connect() as conn:
+        commits = (await conn.execute(text(
+            "SELECT xact_commit FROM pg_stat_database WHERE datname = current_database()"
+        ))).scalar()
+        try:
+            exec_ms = (await conn.execute(text(
+                "SELECT coalesce(sum(total_exec_time), 0) FROM pg_stat_statements"
+            ))).scalar()
+        except Exception:
+            exec_ms = None
+    return {"commits": commits, "exec_ms": exec_ms}
+
+
+async def _session_turns(session_id: uuid.UUID, turns: int, gate: asyncio.Semaphore):
+    memory = SummaryHistory(llm=None, max_token_limit=10 ** 9)
+    for n in range(turns):
+        async with gate:
+            async with AsyncSessionLocal() as db:
+                await _save_turn(db, session_id, memory, f"question {n}", f"answer {n} " * 20)
+
+
+async def _run(label: str, session_ids, turns: int, concurrency: int):
+    gate = asyncio.Semaphore(concurrency)
+    before = await _db_counters()
+    start = time.perf_counter()
+    await asyncio.gather(*(_session_turns(sid, turns, gate) for sid in session_ids))
+    queued = time.perf_counter() - start
+    await message_writer.flush()
+    elapsed = time.perf_counter() - start
+    # pg_stat_database is updated asynchronously by the stats collector
+    await asyncio.sleep(1.0)
+    after = await _db_counters()
+
+    total = len(session_ids) * turns
+    commits = after["commits"] - before["commits"]
+    line = (f"{label:12s} {total / queued:8.0f} turns/s seen by clients, {total / elapsed:8.0f} turns/s committed, "
+            f"{commits:6d} transactions ({commits / elapsed:7.0f}/s)")
+    if before["exec_ms"] is not None:
+        line += f", {after['exec_ms'] - before['exec_ms']:8.0f} ms DB execution time"
+    print(line)
+
+
+async def main(args):
+    async with AsyncSessionLocal() as db:
+        user = User(username="bench-write-behind", email=f"bench-{uuid.uuid4().hex[:8]}@example.com", hash_password="x")
+        db.add(user)
+        await db.flush()
+        sessions = [ChatSession(user_id=user.id) for _ in range(args.sessions)]
+        db.add_all(sessions)
+        await db.commit()
+        session_ids = [s.id for s in sessions]
+
+    try:
+        settings.WRITE_BEHIND_ENABLED = False
+        await _run("per-turn", session_ids, args.turns, args.concurrency)
+
+        settings.WRITE_BEHIND_ENABLED = True
+        message_writer.start()
+        await _run("write-behind", session_ids, args.turns, args.concurrency)
+        await message_writer.stop()
+        print(f"write-behind batches: {message_writer.stats()['batches']}, "
+              f"max batch {message_writer.stats()['max_batch_size']} turns")
+    finally:
+        async with AsyncSessionLocal() as db:
+            # messages go with their sessions (ON DELETE CASCADE)
+            await db.execute(delete(ChatSession).where(ChatSession.id.in_(session_ids)))
+            await db.execute(delete(User).where(User.id == user.id))
+            await db.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20,
+                        help="turns being saved at once; keep within DB_POOL_SIZE + DB_MAX_OVERFLOW")
+    asyncio.run(main(parser.parse_args()))
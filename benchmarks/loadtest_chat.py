@@ -0,0 +1,191 @@
+"""
+End-to-end chat load test: many simulated users each open a chat session and
+send turns over the websocket and/or the REST message endpoint.
+
+    LLM_BACKEND=fake FAKE_LLM_TTFT_MS=300 FAKE_LLM_TOKENS_PER_SECOND=50 RATE_LIMIT_ENABLED=false \\
+        uvicorn app.main:app
+    python -m benchmarks.loadtest_chat --users 1000 --turns 5 [--mode ws|rest|mixed] [--sse] \\
+        [--url http://localhost:8000]
+
+With the fake backend the model's own latency is known, so whatever the report
+shows on top of FAKE_LLM_TTFT_MS (and reply_tokens / tokens_per_second) is
+server overhead. Users share --accounts logins so registration and bcrypt do
+not dominate the run; every user still gets its own chat session. TTFT is the
+time to the first chunk (websocket frame or SSE event); plain REST turns only
+report latency unless --sse is given. Raise `ulimit -n` on both sides for large
+--users. The server's rate limits are per IP and per account, so turn them
+off as above unless the limiter itself is what is being measured.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import List, Optional
+import httpx
+from websockets.asyncio.client import connect
+
+
+class Results:
+    def __init__(self):
+        self.ttft: List[float] = []
+        self.latency: List[float] = []
+        self.errors: List[str] = []
+
+    def summary(self, label: str, elapsed: float) -> str:
+        turns = len(self.latency)
+        lines = [
+            f"{label}: {turns} turns, {len(self.errors)} errors, "
+            f"{turns / elapsed if elapsed else 0:.1f} turns/s",
+            f"  turn latency p50 {_percentile(self.latency, 50):.0f} ms, p99 {_percentile(self.latency, 99):.0f} ms",
+        ]
+        if self.ttft:
+            lines.append(f"  TTFT         p50 {_percentile(self.ttft, 50):.0f} ms, p99 {_percentile(self.ttft, 99):.0f} ms")
+        if self.errors:
+            lines.append(f"  first error: {self.errors[0]}")
+        return "\n".join(lines)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index] * 1e3
+
+
+async def _login(client: httpx.AsyncClient, run_id: str, n: int) -> str:
+    email = f"load-{run_id}-{n}@example.com"
+    password = "load-test-password"
+    response = await client.post("/user/users", json={"username": f"load-{run_id}-{n}", "email": email, "password": password})
+    if response.status_code not in (201, 400, 409):
+        response.raise_for_status()
+    response = await client.post("/user/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def _create_session(client: httpx.AsyncClient, token: str) -> str:
+    response = await client.post("/chat-session/create-chat-session", headers={"Authorization": f"Bearer {token}"})
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def _prompt(user: int, turn: int, repeat: bool) -> str:
+    if repeat:
+        return "Say something about the sea"
+    return f"User {user}, turn {turn}: say something about the sea"
+
+
+async def _ws_user(args, token: str, session_id: str, user: int, results: Results):
+    url = f"{args.ws_url}/chat-session/ws/{session_id}/?token={token}"
+    async with connect(url, open_timeout=args.timeout) as ws:
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            first: Optional[float] = None
+            await ws.send(json.dumps({"text": _prompt(user, turn, args.repeat_prompts)}))
+            while True:
+                frame = json.loads(await asyncio.wait_for(ws.recv(), args.timeout))
+                if frame["type"] == "chunk" and first is None:
+                    first = time.perf_counter()
+                elif frame["type"] == "done":
+                    results.latency.append(time.perf_counter() - start)
+                    if first is not None:
+                        results.ttft.append(first - start)
+                    break
+                elif frame["type"] == "error":
+                    results.errors.append(frame["error"])
+                    break
+            await asyncio.sleep(args.think)
+
+
+async def _sse_turn(client: httpx.AsyncClient, url: str, body: dict, headers: dict, results: Results):
+    start = time.perf_counter()
+    first: Optional[float] = None
+    event = None
+    async with client.stream("POST", url, json=body, headers={**headers, "Accept": "text/event-stream"}) as response:
+        if response.status_code != 200:
+            results.errors.append(f"HTTP {response.status_code}: {(await response.aread())[:200]!r}")
+            return
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                if event == "chunk" and first is None:
+                    first = time.perf_counter()
+                elif event == "done":
+                    results.latency.append(time.perf_counter() - start)
+                    if first is not None:
+                        results.ttft.append(first - start)
+                    return
+                elif event == "error":
+                    results.errors.append(json.loads(line[len("data: "):])["error"])
+                    return
+
+
+async def _rest_user(args, client: httpx.AsyncClient, token: str, session_id: str, user: int, results: Results):
+    headers = {"Authorization": f"Bearer {token}"}
+    url = f"/chat-session/{session_id}/messages"
+    for turn in range(args.turns):
+        body = {"sender": "user", "content": {"text": _prompt(user, turn, args.repeat_prompts)}}
+        if args.sse:
+            await _sse_turn(client, url, body, headers, results)
+        else:
+            start = time.perf_counter()
+            response = await client.post(url, json=body, headers=headers)
+            if response.status_code == 201:
+                results.latency.append(time.perf_counter() - start)
+            else:
+                results.errors.append(f"HTTP {response.status_code}: {response.text[:200]}")
+        await asyncio.sleep(args.think)
+
+
+async def _run_user(args, client: httpx.AsyncClient, tokens: List[str], user: int, ws: Results, rest: Results):
+    await asyncio.sleep(args.ramp * user / args.users)
+    token = tokens[user % len(tokens)]
+    use_ws = args.mode == "ws" or (args.mode == "mixed" and user % 2 == 0)
+    results = ws if use_ws else rest
+    try:
+        session_id = await _create_session(client, token)
+        if use_ws:
+            await _ws_user(args, token, session_id, user, results)
+        else:
+            await _rest_user(args, client, token, session_id, user, results)
+    except Exception as e:
+        results.errors.append(repr(e))
+
+
+async def main(args):
+    args.ws_url = args.url.replace("http", "ws", 1)
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        tokens = await asyncio.gather(*(_login(client, run_id, n) for n in range(min(args.accounts, args.users))))
+        print(f"logged in {len(tokens)} accounts, starting {args.users} users ({args.mode})")
+
+        ws, rest = Results(), Results()
+        start = time.perf_counter()
+        await asyncio.gather(*(_run_user(args, client, tokens, user, ws, rest) for user in range(args.users)))
+        elapsed = time.perf_counter() - start
+
+    print(f"{args.users} users x {args.turns} turns in {elapsed:.1f}s")
+    if args.mode in ("ws", "mixed"):
+        print(ws.summary("websocket", elapsed))
+    if args.mode in ("rest", "mixed"):
+        print(rest.summary("rest", elapsed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--mode", choices=("ws", "rest", "mixed"), default="ws")
+    parser.add_argument("--sse", action="store_true", help="stream REST turns as Server-Sent Events")
+    parser.add_argument("--accounts", type=int, default=20, help="logins shared by the simulated users")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which users start")
+    parser.add_argument("--think", type=float, default=0.0, help="pause between a user's turns")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--repeat-prompts", action="store_true",
+                        help="every user sends the same prompt, so the response cache can hit")
+    asyncio.run(main(parser.parse_args()))
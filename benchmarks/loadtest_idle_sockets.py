@@ -0,0 +1,68 @@
+"""
+Open thousands of idle chat websockets against a running server.
+
+    python -m benchmarks.loadtest_idle_sockets --token <JWT> --session-id <UUID> \\
+        --connections 2000 [--url ws://localhost:8000]
+
+Run the server with a deliberately small pool to show that idle sockets do not
+hold database connections, e.g. a DATABASE_URL pointing at a Postgres with
+max_connections=20. After all sockets are open, one of them sends a message and
+the script reports how long the turn took; it should not wait for a pooled
+connection. Raise `ulimit -n` on both sides for large --connections.
+"""
+import argparse
+import asyncio
+import time
+from websockets.asyncio.client import connect
+
+
+async def _open(url: str, opened: list, failures: list, stop: asyncio.Event):
+    try:
+        async with connect(url, open_timeout=30) as ws:
+            opened.append(ws)
+            await stop.wait()
+    except Exception as e:
+        failures.append(e)
+
+
+async def main(args):
+    url = f"{args.url}/chat-session/ws/{args.session_id}/?token={args.token}"
+    opened: list = []
+    failures: list = []
+    stop = asyncio.Event()
+
+    start = time.perf_counter()
+    tasks = []
+    for _ in range(args.connections):
+        tasks.append(asyncio.create_task(_open(url, opened, failures, stop)))
+        if len(tasks) % args.batch == 0:
+            await asyncio.sleep(0.05)
+    while len(opened) + len(failures) < args.connections:
+        await asyncio.sleep(0.1)
+    print(f"opened {len(opened)} sockets ({len(failures)} failed) in {time.perf_counter() - start:.1f}s")
+    if failures:
+        print(f"first failure: {failures[0]!r}")
+
+    await asyncio.sleep(args.idle)
+
+    if opened:
+        ws = opened[0]
+        turn_start = time.perf_counter()
+        await ws.send('{"text": "ping"}')
+        first = await ws.recv()
+        print(f"turn on socket #0 with all others idle: first frame after "
+              f"{(time.perf_counter() - turn_start) * 1e3:.0f} ms: {first[:80]!r}")
+
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://localhost:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--session-id", required=True)
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=200, help="sockets opened per 50 ms")
+    parser.add_argument("--idle", type=float, default=5.0, help="seconds to stay idle before the probe turn")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+import gzip
+import json
+from uuid import uuid4
+import pytest
+from app.crud.archive import _decompressed_lines, _LineSplitter, _message_row, _session_row
+
+pytestmark = pytest.mark.anyio
+
+
+async def _chunks(data: bytes, size: int = 1000):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def _lines(data: bytes, size: int = 1000, **limits):
+    return [line async for line in _decompressed_lines(_chunks(data, size), **limits)]
+
+
+NDJSON = b"".join(json.dumps({"n": n}).encode() + b"\n" for n in range(2000)) + b'{"n": "last"}'
+
+
+@pytest.mark.parametrize("size", [1, 7, 4096])
+async def test_plain_and_gzip_input_give_the_same_lines(size):
+    plain = await _lines(NDJSON, size)
+    assert len(plain) == 2001
+    assert plain[-1] == '{"n": "last"}'
+    assert await _lines(gzip.compress(NDJSON), size) == plain
+
+
+async def test_blank_lines_are_skipped():
+    assert await _lines(b'{"a": 1}\n\n  \n{"b": 2}\n') == ['{"a": 1}', '{"b": 2}']
+
+
+async def test_a_line_over_the_limit_is_refused_before_it_is_complete():
+    with pytest.raises(ValueError, match="line longer"):
+        await _lines(gzip.compress(b"a" * (10 << 20)), max_line=1 << 20)
+
+
+async def test_a_decompression_bomb_is_refused():
+    bomb = gzip.compress(b"a\n" * (20 << 20))
+    assert len(bomb) < 100_000
+    with pytest.raises(ValueError, match="larger than"):
+        await _lines(bomb, max_total=1 << 20)
+
+
+def test_splitter_keeps_the_unterminated_tail():
+    splitter = _LineSplitter(max_line=100, max_total=None)
+    assert splitter.feed(b"ab") == []
+    assert splitter.feed(b"c\nde\nf") == [b"abc", b"de"]
+    assert bytes(splitter.pending) == b"f"
+
+
+def _message(**fields):
+    return {"type": "message", "id": str(uuid4()), "session_id": str(uuid4()), "sender": "user",
+            "content": {"text": "hi"}, "timestamp": "2024-05-01T10:00:00", **fields}
+
+
+def test_records_are_converted_to_rows():
+    row = _message_row(_message(timestamp="2024-05-01T12:00:00+02:00"))
+    assert row["content"] == {"text": "hi"}
+    # stored as naive UTC
+    assert row["timestamp"].isoformat() == "2024-05-01T10:00:00"
+
+    user_id = uuid4()
+    session = _session_row({"type": "session", "id": str(uuid4()), "started_at": "2024-05-01T10:00:00"}, user_id)
+    assert session["user_id"] == user_id
+    assert session["message_count"] == 0
+    assert session["last_message_at"] == session["started_at"]
+
+
+@pytest.mark.parametrize("fields", [{"sender": "admin"}, {"content": {"body": "hi"}}, {"id": "42"}, {"timestamp": None}])
+def test_invalid_records_are_refused(fields):
+    with pytest.raises(ValueError):
+        _message_row(_message(**fields))
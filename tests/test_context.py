@@ -0,0 +1,74 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from app.chatbot.context import ContextBuilder
+from app.chatbot.memory import SummaryHistory
+from app.chatbot.tokens import TokenCounter
+
+
+class WordCounter(TokenCounter):
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+
+def _memory(turns=3, segments=()):
+    memory = SummaryHistory(llm=None, token_counter=WordCounter(), initial_segments=list(segments))
+    for n in range(1, turns + 1):
+        # 2 + 3 tokens per turn
+        memory.save_context(f"u{n} u{n}", f"b{n} b{n} b{n}")
+    return memory
+
+
+def _builder(max_prompt_tokens):
+    return ContextBuilder("system", max_prompt_tokens, token_counter=WordCounter())
+
+
+def test_whole_history_is_sent_when_it_fits():
+    context = _builder(1 + 2 + 15).build(_memory(), "hi there")
+    assert len(context.history) == 6
+    assert context.dropped_messages == 0
+    assert context.prompt_tokens == 18
+
+
+def test_oldest_turns_are_dropped_first():
+    context = _builder(1 + 2 + 10).build(_memory(), "hi there")
+    assert [m.content for m in context.history] == ["u2 u2", "b2 b2 b2", "u3 u3", "b3 b3 b3"]
+    assert context.dropped_messages == 2
+    assert context.prompt_tokens <= 13
+
+
+def test_kept_history_never_starts_with_a_bot_reply():
+    context = _builder(1 + 2 + 8).build(_memory(), "hi there")
+    assert isinstance(context.history[0], HumanMessage)
+    assert [m.content for m in context.history] == ["u3 u3", "b3 b3 b3"]
+    assert context.dropped_messages == 4
+
+
+def test_system_prompt_and_input_are_sent_even_over_budget():
+    context = _builder(2).build(_memory(), "a much longer question")
+    assert context.history == []
+    assert context.summary == []
+    assert context.input_tokens == 4
+    assert context.prompt_tokens == 5
+
+
+def test_oldest_summary_lines_are_dropped_when_the_summary_does_not_fit():
+    segments = [{"level": 0, "from_n": n, "to_n": n, "text": "w " * 10, "tokens": None} for n in (1, 2, 3)]
+    full = _builder(1 + 2 + 100).build(_memory(turns=0, segments=segments), "hi there")
+    assert full.dropped_summary_lines == 0
+    assert isinstance(full.summary[0], SystemMessage)
+
+    tight = _builder(1 + 2 + full.summary_tokens - 1).build(_memory(turns=0, segments=segments), "hi there")
+    assert tight.dropped_summary_lines == 1
+    assert "lần 1]" not in tight.summary[0].content
+    assert "lần 3]" in tight.summary[0].content
+    assert tight.prompt_tokens <= 1 + 2 + full.summary_tokens - 1
+
+
+def test_stats_report_prompt_sizes_in_tokens():
+    builder = _builder(13)
+    builder.build(_memory(), "hi there")
+    builder.build(_memory(turns=1), "hi there")
+    stats = builder.stats()
+    assert (stats["turns"], stats["truncated_turns"], stats["dropped_messages"]) == (2, 1, 2)
+    assert stats["prompt_tokens"]["count"] == 2
+    assert stats["prompt_tokens"]["max"] == 13
+    assert stats["prompt_tokens"]["avg"] == (13 + 8) / 2
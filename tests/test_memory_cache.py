@@ -0,0 +1,34 @@
+from uuid import uuid4
+from app.chatbot.memory_cache import SessionMemoryCache
+
+
+def test_hits_and_misses_are_counted():
+    cache = SessionMemoryCache(maxsize=10, ttl=60)
+    session_id = uuid4()
+    assert cache.get(session_id) is None
+    cache.put(session_id, "memory")
+    assert cache.get(session_id) == "memory"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_least_recently_used_session_is_evicted():
+    cache = SessionMemoryCache(maxsize=2, ttl=60)
+    first, second, third = uuid4(), uuid4(), uuid4()
+    cache.put(first, 1)
+    cache.put(second, 2)
+    cache.get(first)
+    cache.put(third, 3)
+    assert cache.get(second) is None
+    assert cache.get(first) == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_counts_only_stale_drops_of_cached_sessions():
+    cache = SessionMemoryCache(maxsize=10, ttl=60)
+    session_id = uuid4()
+    cache.put(session_id, "memory")
+    cache.invalidate(session_id, stale=True)
+    cache.invalidate(uuid4(), stale=True)
+    assert cache.get(session_id) is None
+    assert cache.stats()["stale"] == 1
@@ -0,0 +1,34 @@
+from datetime import datetime
+from uuid import uuid4
+import pytest
+from fastapi import HTTPException
+from app.crud.pagination import decode_cursor, decode_rank_cursor, encode_cursor, encode_rank_cursor
+
+
+def test_cursor_round_trips():
+    position = (datetime(2024, 5, 1, 12, 30, 15, 123456), uuid4())
+    assert decode_cursor(encode_cursor(*position)) == position
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(datetime(2024, 5, 1), uuid4())
+    assert "=" not in cursor
+    assert "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "!!!", encode_cursor(datetime(2024, 5, 1), uuid4())[:-4]])
+def test_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor)
+    assert exc_info.value.status_code == 400
+
+
+def test_rank_cursor_round_trips_the_exact_float():
+    position = (0.1 + 0.2, uuid4())
+    assert decode_rank_cursor(encode_rank_cursor(*position)) == position
+
+
+def test_malformed_rank_cursor_is_a_400():
+    with pytest.raises(HTTPException) as exc_info:
+        decode_rank_cursor(encode_cursor(datetime(2024, 5, 1), uuid4()))
+    assert exc_info.value.status_code == 400
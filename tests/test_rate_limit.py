@@ -0,0 +1,94 @@
+import pytest
+from app.core import rate_limit
+from app.core.config import settings
+from app.core.rate_limit import (
+    DiskRateLimitBackend, MemoryRateLimitBackend, RateLimitExceeded, RateLimiter, client_ip
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    for name, value in {
+        "RATE_LIMIT_IP_PER_MINUTE": 60, "RATE_LIMIT_IP_BURST": 3,
+        "RATE_LIMIT_USER_PER_MINUTE": 60, "RATE_LIMIT_USER_BURST": 2,
+        "RATE_LIMIT_TURNS_PER_MINUTE": 60, "RATE_LIMIT_TURN_BURST": 1,
+        "RATE_LIMIT_DAILY_TOKENS": 100, "RATE_LIMIT_TRUST_FORWARDED_FOR": False,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+
+
+@pytest.fixture(params=["memory", "disk"])
+def limiter(request, limits, tmp_path):
+    if request.param == "memory":
+        backend = MemoryRateLimitBackend(max_keys=100, ttl=60)
+    else:
+        backend = DiskRateLimitBackend(str(tmp_path / "limits.sqlite3"))
+    return RateLimiter(backend)
+
+
+async def test_bucket_allows_a_burst_then_reports_when_to_retry(limiter):
+    for _ in range(3):
+        await limiter.check_request("10.0.0.1", None)
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        await limiter.check_request("10.0.0.1", None)
+    assert exc_info.value.scope == "ip"
+    # 1 token per second
+    assert 0 < exc_info.value.retry_after <= 1
+    assert exc_info.value.retry_after_header == "1"
+    # other clients have buckets of their own
+    await limiter.check_request("10.0.0.2", None)
+
+
+async def test_bucket_refills_over_time(limits, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    limiter = RateLimiter(MemoryRateLimitBackend(max_keys=100, ttl=60))
+    await limiter.check_turn("user")
+    with pytest.raises(RateLimitExceeded):
+        await limiter.check_turn("user")
+    now[0] += 1
+    await limiter.check_turn("user")
+
+
+async def test_user_bucket_applies_across_ips(limiter):
+    await limiter.check_request("10.0.0.1", "user")
+    await limiter.check_request("10.0.0.2", "user")
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        await limiter.check_request("10.0.0.3", "user")
+    assert exc_info.value.scope == "user"
+
+
+async def test_daily_quota_is_checked_before_and_charged_after_a_turn(limiter, limits, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_TURN_BURST", 10)
+    await limiter.check_turn("user")
+    await limiter.charge_tokens("user", 150)
+    assert await limiter.daily_usage("user") == (150, 100)
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        await limiter.check_turn("user")
+    assert exc_info.value.scope == "daily_tokens"
+
+
+async def test_memory_usage_starts_over_on_a_new_day():
+    backend = MemoryRateLimitBackend(max_keys=1, ttl=60)
+    await backend.add_usage("tokens:a", "2024-05-01", 10)
+    await backend.add_usage("tokens:b", "2024-05-01", 10)
+    # more users than max_keys: nobody's usage is evicted
+    assert await backend.usage("tokens:a", "2024-05-01") == 10
+    assert await backend.usage("tokens:a", "2024-05-02") == 0
+
+
+async def test_disabled_limiter_checks_nothing(limits):
+    limiter = RateLimiter(MemoryRateLimitBackend(max_keys=100, ttl=60), enabled=False)
+    for _ in range(10):
+        await limiter.check_request("10.0.0.1", "user")
+        await limiter.check_turn("user")
+    assert limiter.stats()["checked"] == 0
+
+
+def test_client_ip_honours_forwarded_for_only_when_trusted(limits, monkeypatch):
+    scope = {"client": ("10.0.0.1", 1234), "headers": [(b"x-forwarded-for", b"203.0.113.7, 10.0.0.1")]}
+    assert client_ip(scope) == "10.0.0.1"
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUST_FORWARDED_FOR", True)
+    assert client_ip(scope) == "203.0.113.7"
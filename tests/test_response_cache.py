@@ -0,0 +1,47 @@
+import pytest
+from app.chatbot.response_cache import DiskCacheBackend, MemoryCacheBackend, ResponseCache
+
+pytestmark = pytest.mark.anyio
+
+
+def _cache(**limits):
+    return ResponseCache(MemoryCacheBackend(maxsize=10, ttl=60),
+                         max_history_chars=limits.get("history", 100), max_input_chars=limits.get("input", 100))
+
+
+def test_key_ignores_case_and_whitespace():
+    cache = _cache()
+    assert cache.key_for("", "Hello   World", model="m") == cache.key_for("", " hello world\n", model="m")
+
+
+def test_key_depends_on_history_input_and_model_parameters():
+    cache = _cache()
+    base = cache.key_for("User: hi", "hello", model="m", temperature=0.7)
+    assert base != cache.key_for("User: hey", "hello", model="m", temperature=0.7)
+    assert base != cache.key_for("User: hi", "hello there", model="m", temperature=0.7)
+    assert base != cache.key_for("User: hi", "hello", model="m", temperature=0.2)
+
+
+def test_long_prompts_bypass_the_cache():
+    cache = _cache(history=10, input=5)
+    assert cache.key_for("x" * 11, "hi") is None
+    assert cache.key_for("", "x" * 6) is None
+    assert cache.stats()["bypassed"] == 2
+
+
+async def test_hits_replay_the_stored_chunks():
+    cache = _cache()
+    key = cache.key_for("", "hello")
+    assert await cache.get(key) is None
+    await cache.set(key, ["Hi", " there"], latency=1.5)
+    entry = await cache.get(key)
+    assert entry.chunks == ["Hi", " there"]
+    assert cache.stats()["saved_latency_seconds"] == 1.5
+
+
+async def test_disk_backend_is_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "cache" / "responses.sqlite3")
+    cache = ResponseCache(DiskCacheBackend(path, ttl=60), max_history_chars=100, max_input_chars=100)
+    key = cache.key_for("", "hello")
+    await cache.set(key, ["Hi"], latency=0.5)
+    assert (await DiskCacheBackend(path, ttl=60).get(key)).chunks == ["Hi"]
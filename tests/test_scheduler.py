@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+from app.chatbot.scheduler import (
+    BACKGROUND, INTERACTIVE, LLMQueueTimeout, LLMScheduler, _FairQueue, _Waiter, is_rate_limited
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def _scheduler(**overrides):
+    options = dict(max_concurrency=1, tokens_per_minute=0, queue_timeout=1, max_retries=2,
+                   retry_base_delay=0, retry_max_delay=0)
+    return LLMScheduler(**{**options, **overrides})
+
+
+async def test_fair_queue_serves_users_round_robin():
+    queue = _FairQueue()
+    for user, n in [("a", 1), ("a", 2), ("a", 3), ("b", 1), ("c", 1)]:
+        waiter = _Waiter(user, INTERACTIVE, 0)
+        waiter.name = f"{user}{n}"
+        queue.push(waiter)
+    order = [queue.pop().name for _ in range(queue.depth)]
+    assert order == ["a1", "b1", "c1", "a2", "a3"]
+    assert queue.peek() is None
+
+
+async def test_fair_queue_remove_forgets_users_without_waiters():
+    queue = _FairQueue()
+    waiter = _Waiter("a", INTERACTIVE, 0)
+    queue.push(waiter)
+    queue.remove(waiter)
+    queue.remove(waiter)
+    assert (queue.depth, queue.waiting_users()) == (0, 0)
+
+
+async def test_interactive_calls_are_granted_before_background_ones():
+    scheduler = _scheduler()
+    granted = []
+    release = asyncio.Event()
+
+    async def call(name, priority):
+        async with scheduler.slot(name, priority):
+            granted.append(name)
+            await release.wait()
+
+    holder = asyncio.create_task(call("holder", INTERACTIVE))
+    await asyncio.sleep(0)
+    background = asyncio.create_task(call("background", BACKGROUND))
+    interactive = asyncio.create_task(call("interactive", INTERACTIVE))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, background, interactive)
+    assert granted == ["holder", "interactive", "background"]
+
+
+async def test_cancelled_waiter_does_not_block_the_queue():
+    scheduler = _scheduler()
+    async with scheduler.slot("a"):
+        waiting = asyncio.create_task(scheduler._acquire("b", INTERACTIVE, 0))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+    async with scheduler.slot("c"):
+        assert scheduler.in_flight == 1
+    assert scheduler.stats()["classes"]["interactive"]["queue_depth"] == 0
+
+
+async def test_waiting_past_the_queue_timeout_raises():
+    scheduler = _scheduler(queue_timeout=0.01)
+    async with scheduler.slot("a"):
+        with pytest.raises(LLMQueueTimeout):
+            async with scheduler.slot("b"):
+                pass
+    assert scheduler.stats()["classes"]["interactive"]["timeouts"] == 1
+
+
+async def test_token_budget_holds_back_calls_until_refilled():
+    scheduler = _scheduler(max_concurrency=10, tokens_per_minute=60_000, queue_timeout=0.05)
+    async with scheduler.slot("a", estimated_tokens=60_000):
+        pass
+    with pytest.raises(LLMQueueTimeout):
+        async with scheduler.slot("b", estimated_tokens=60_000):
+            pass
+
+
+class _RateLimited(Exception):
+    status_code = 429
+
+
+async def test_call_retries_rate_limited_errors_only():
+    scheduler = _scheduler()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _RateLimited()
+        return "ok"
+
+    assert await scheduler.call("a", INTERACTIVE, 0, flaky) == "ok"
+    assert scheduler.retries == 2
+
+    async def broken():
+        raise ValueError("429 in the message is not a rate limit")
+
+    with pytest.raises(ValueError):
+        await scheduler.call("a", INTERACTIVE, 0, broken)
+    assert scheduler.retries == 2
+    assert scheduler.in_flight == 0
+
+
+def test_is_rate_limited_follows_the_cause_chain():
+    class ResourceExhausted(Exception):
+        pass
+
+    try:
+        try:
+            raise ResourceExhausted()
+        except ResourceExhausted as e:
+            raise RuntimeError("wrapped") from e
+    except RuntimeError as wrapped:
+        assert is_rate_limited(wrapped)
+    assert is_rate_limited(_RateLimited())
+    assert not is_rate_limited(RuntimeError("HTTP 429"))
@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from app.realtime.connection import SLOW_CONSUMER_CLOSE_CODE, Connection
+from app.realtime.stream import ChunkCoalescer, ReplyStream
+
+pytestmark = pytest.mark.anyio
+
+
+def _collector():
+    emitted = []
+
+    async def emit(text):
+        emitted.append(text)
+
+    return emitted, emit
+
+
+async def test_chunks_are_emitted_together_once_max_bytes_are_buffered():
+    emitted, emit = _collector()
+    coalescer = ChunkCoalescer(emit, max_bytes=5, max_delay=60)
+    await coalescer.add("ab")
+    await coalescer.add("cd")
+    assert emitted == []
+    await coalescer.add("ef")
+    assert emitted == ["abcdef"]
+
+
+async def test_buffered_chunks_are_emitted_after_max_delay():
+    emitted, emit = _collector()
+    coalescer = ChunkCoalescer(emit, max_bytes=1000, max_delay=0.01)
+    await coalescer.add("ab")
+    await coalescer.add("cd")
+    await asyncio.sleep(0.05)
+    assert emitted == ["abcd"]
+
+
+async def test_zero_delay_emits_every_chunk_and_empty_chunks_are_ignored():
+    emitted, emit = _collector()
+    coalescer = ChunkCoalescer(emit, max_bytes=1000, max_delay=0)
+    await coalescer.add("a")
+    await coalescer.add("")
+    await coalescer.add("b")
+    assert emitted == ["a", "b"]
+
+
+async def test_reply_frames_carry_the_message_id_and_consecutive_seq():
+    frames = []
+
+    async def broadcast(frame, control):
+        frames.append((frame, control))
+
+    reply = ReplyStream(broadcast, max_bytes=3, max_delay=60)
+    await reply.write("abc")
+    await reply.write("d")
+    await reply.finish(tokens=2)
+    assert [(f["type"], f["seq"], f.get("text"), control) for f, control in frames] == [
+        ("chunk", 0, "abc", False),
+        ("chunk", 1, "d", False),
+        ("done", 2, None, True),
+    ]
+    assert {f["message_id"] for f, _ in frames} == {reply.message_id}
+    assert frames[-1][0]["tokens"] == 2
+
+
+class _StalledWebSocket:
+    client_state = None
+
+    async def send_text(self, data):
+        await asyncio.sleep(60)
+
+
+def _connection(policy):
+    closed = []
+
+    async def on_close(connection):
+        closed.append(connection)
+
+    return Connection(_StalledWebSocket(), max_queue=2, slow_consumer_policy=policy, on_close=on_close), closed
+
+
+async def test_drop_policy_discards_data_frames_but_not_control_frames():
+    connection, closed = _connection("drop")
+    assert [connection.send("x") for _ in range(4)] == [True, True, False, False]
+    assert connection.send("done", control=True)
+    assert connection.dropped == 2
+    assert connection.queued() == 3
+    assert not closed
+
+
+async def test_disconnect_policy_closes_once():
+    connection, closed = _connection("disconnect")
+    results = [connection.send("x") for _ in range(50)]
+    await asyncio.sleep(0)
+    assert results.count(True) == 2
+    assert connection.dropped == 1
+    assert closed == [connection]
+    assert connection.close_code == SLOW_CONSUMER_CLOSE_CODE
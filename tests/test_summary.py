@@ -0,0 +1,64 @@
+import pytest
+from app.chatbot.memory import SummaryHistory
+from app.core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+class _Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    """Answers every prompt with `reply`; raises on the calls listed in `fail_on`"""
+
+    def __init__(self, reply="tóm tắt", fail_on=()):
+        self.reply = reply
+        self.fail_on = set(fail_on)
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        if self.calls in self.fail_on:
+            raise RuntimeError("rate limited")
+        return _Reply(self.reply)
+
+
+def _segments(count, words=50):
+    return [{"level": 0, "from_n": n, "to_n": n, "text": "x " * words, "tokens": None} for n in range(1, count + 1)]
+
+
+async def test_summarizing_appends_a_segment_and_moves_the_watermark():
+    memory = SummaryHistory(FakeLLM(), max_summary_tokens=10_000)
+    memory.save_context("hi", "hello", timestamp="t1", message_id="m1")
+    assert not await memory.asummarize()
+    assert memory.summary_count == 1
+    assert memory.chat_history == [] and memory.token_count == 0
+    assert (memory.summarized_until, memory.last_summarized_message_id) == ("t1", "m1")
+    assert "tóm tắt" in memory.summary
+
+
+async def test_old_segments_are_rolled_up_past_the_budget(monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_ROLLUP_KEEP", 1)
+    memory = SummaryHistory(FakeLLM(), max_summary_tokens=100, initial_segments=_segments(3))
+    memory.save_context("hi", "hello")
+    assert await memory.asummarize()
+    assert [(s["level"], s["from_n"], s["to_n"]) for s in memory.summary_segments] == [(1, 1, 3), (0, 4, 4)]
+
+
+async def test_a_failed_roll_up_leaves_the_memory_unchanged(monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_ROLLUP_KEEP", 1)
+    llm = FakeLLM(fail_on={2})
+    memory = SummaryHistory(llm, max_summary_tokens=100, initial_segments=_segments(3))
+    memory.save_context("hi", "hello", timestamp="t1", message_id="m1")
+    with pytest.raises(RuntimeError):
+        await memory.asummarize()
+    assert memory.summary_count == 3
+    assert len(memory.chat_history) == 2
+    assert memory.summarized_until is None
+
+    # the scheduler's retry starts from the same state
+    assert await memory.asummarize()
+    assert memory.summary_count == 4
+    assert [(s["from_n"], s["to_n"]) for s in memory.summary_segments] == [(1, 3), (4, 4)]
@@ -0,0 +1,48 @@
+import pytest
+from app.chatbot.memory import SummaryHistory
+from app.chatbot.tokens import RegexTokenCounter, TokenCounter, get_token_counter, message_text
+
+
+def test_punctuation_is_one_token_each():
+    assert RegexTokenCounter().count("?!.") == 3
+
+
+def test_ascii_words_take_one_token_per_four_characters():
+    counter = RegexTokenCounter()
+    assert counter.count("cat") == 1
+    assert counter.count("elephant") == 2
+    assert counter.count("hello, world") == 2 + 1 + 2
+
+
+def test_non_ascii_words_split_into_more_tokens():
+    counter = RegexTokenCounter()
+    assert counter.count("nghiêng") == 3
+    assert counter.count("nghieng") == 2
+
+
+def test_empty_text_has_no_tokens():
+    assert RegexTokenCounter().count("   ") == 0
+
+
+def test_unknown_counter_name_is_rejected():
+    with pytest.raises(ValueError):
+        get_token_counter("nope")
+
+
+def test_token_counter_is_abstract():
+    with pytest.raises(TypeError):
+        TokenCounter()
+
+
+def test_message_text_joins_content_parts():
+    assert message_text(["a", {"type": "text", "text": "b"}, {"type": "image_url"}]) == "ab"
+
+
+def test_summary_history_keeps_a_running_token_count():
+    counter = RegexTokenCounter()
+    memory = SummaryHistory(llm=None, max_token_limit=5, token_counter=counter)
+    memory.save_context("hello there", "general kenobi")
+    expected = counter.count("hello there") + counter.count("general kenobi")
+    assert memory.token_count == expected
+    assert memory.message_token_counts() == [counter.count("hello there"), counter.count("general kenobi")]
+    assert memory.needs_summary() == (expected > 5)